@@ -1,77 +1,119 @@
-import torch
-from transformers import LayoutLMv2ForTokenClassification, LayoutLMv2FeatureExtractor, LayoutLMv2Tokenizer
-from PIL import Image
 import io
 import sys
+import argparse
 
-# Adding the path to your custom module
-sys.path.append("F:/repogit/XseLLer8/Category_Transformer/category_transformer")
+# torch and transformers take seconds to import, so they are imported inside
+# the functions that need them. Importing this module is cheap.
 
-from model import GPT  # Import the custom model from model.py
-from tabular_config import TabularConfig  # Import the configuration class
+# Folder of the custom category transformer (model.py, tabular_config.py)
+CATEGORY_TRANSFORMER_PATH = "F:/repogit/XseLLer8/Category_Transformer/category_transformer"
+
+# Pretrained LayoutLMv2 checkpoint
+LAYOUTLMV2_CHECKPOINT = "microsoft/layoutlmv2-base"
+
+# Number of values of each categorical input of the tabular model
+# (vendor index, booking year, document year)
+CATEGORY_FEATURE_SIZES = (4751, 4, 4)
+
+# Function to make the custom model modules importable
+def add_category_transformer_path(path=CATEGORY_TRANSFORMER_PATH):
+    if path not in sys.path:
+        sys.path.append(path)
 
 # Function to load the image
 def load_image(image_path):
+    from PIL import Image
     with open(image_path, "rb") as f:
         image = Image.open(io.BytesIO(f.read()))
     return image
 
-# Load the image
-image_path = "F:/repogit/XseLLer8/uploads/BEK.png"
-image = load_image(image_path)
-
-# LayoutLMv2 part for extracting text features
-layoutlmv2_feature_extractor = LayoutLMv2FeatureExtractor()
-layoutlmv2_tokenizer = LayoutLMv2Tokenizer.from_pretrained("microsoft/layoutlmv2-base")
-inputs = layoutlmv2_feature_extractor(image, return_tensors="pt")
-tokenized_inputs = layoutlmv2_tokenizer(image, truncation=True, padding=True, return_tensors="pt")
-layoutlmv2_model = LayoutLMv2ForTokenClassification.from_pretrained("microsoft/layoutlmv2-base", num_labels=10)
-
-# Forward pass through LayoutLMv2
-outputs = layoutlmv2_model(**inputs)
-layoutlmv2_predictions = outputs.logits.argmax(-1)
-predicted_text = layoutlmv2_tokenizer.decode(layoutlmv2_predictions[0])
-
-# Set up the custom tabular model configuration
-config = TabularConfig(
-    output_size=12,  # Adjust based on your classification task
-    n_layer=8,
-    n_head=32,
-    n_embd=128,
-    n_features=14,
-    dropout=0.2,
-    bias=True,
-    classification_weights=torch.tensor([1.0, 1.0, 1.0, 1.0])
-)
-
-# Initialize the custom GPT model
-custom_model = GPT(config)
-
-# Load the pretrained weights for the custom model if available
-model_path = "path/to/your/saved_model.pth"  # Replace with actual path
-custom_model.load_state_dict(torch.load(model_path))
-custom_model.eval()
-
-# Prepare the inputs for the custom model
+# Function to load the LayoutLMv2 feature extractor, tokenizer and model
+def load_layoutlmv2(checkpoint=LAYOUTLMV2_CHECKPOINT, num_labels=10):
+    from transformers import LayoutLMv2ForTokenClassification, LayoutLMv2FeatureExtractor, LayoutLMv2Tokenizer
+    feature_extractor = LayoutLMv2FeatureExtractor()
+    tokenizer = LayoutLMv2Tokenizer.from_pretrained(checkpoint)
+    model = LayoutLMv2ForTokenClassification.from_pretrained(checkpoint, num_labels=num_labels)
+    return feature_extractor, tokenizer, model
+
+# Function to run LayoutLMv2 over an image and decode the predicted tokens
+def extract_layout_text(image, feature_extractor, tokenizer, model):
+    inputs = feature_extractor(image, return_tensors="pt")
+    outputs = model(**inputs)
+    layoutlmv2_predictions = outputs.logits.argmax(-1)
+    return tokenizer.decode(layoutlmv2_predictions[0])
+
+# Function to build the custom tabular model configuration
+def build_tabular_config():
+    import torch
+    add_category_transformer_path()
+    from tabular_config import TabularConfig  # Import the configuration class
+
+    return TabularConfig(
+        output_size=12,  # Adjust based on your classification task
+        n_layer=8,
+        n_head=32,
+        n_embd=128,
+        n_features=14,
+        dropout=0.2,
+        bias=True,
+        classification_weights=torch.tensor([1.0, 1.0, 1.0, 1.0])
+    )
+
+# Function to initialize the custom GPT model and load its pretrained weights
+def load_tabular_model(model_path, config=None):
+    import torch
+    add_category_transformer_path()
+    from model import GPT  # Import the custom model from model.py
+
+    config = config or build_tabular_config()
+    custom_model = GPT(config)
+    custom_model.load_state_dict(torch.load(model_path))
+    custom_model.eval()
+    return custom_model, config
+
+# Function to prepare the inputs for the custom model
 # Assuming the predicted_text from LayoutLMv2 can be tokenized into features
 # You need to preprocess predicted_text into the format required by your model
 # For simplicity, let's assume `features` and `category_features` are derived from predicted_text
 # Here you should implement the actual preprocessing based on your use case
+def prepare_tabular_inputs(predicted_text, config):
+    import torch
+
+    # Example feature preparation (replace with actual data processing logic)
+    features = torch.randn(1, config.n_features)  # Replace with actual numerical features
+    category_features = [
+        torch.randint(0, size, (1,))  # Example vendor index, booking year, document year
+        for size in CATEGORY_FEATURE_SIZES
+    ]
+    return features, category_features
+
+# Function to run inference and get the predicted class
+def classify(custom_model, features, category_features):
+    import torch
+    with torch.inference_mode():
+        logits, _ = custom_model(features, category_features)
+    return logits.argmax(-1).item()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classify a document image with LayoutLMv2 and the tabular category model")
+    parser.add_argument('image', nargs='?', default="F:/repogit/XseLLer8/uploads/BEK.png", help="image to classify")
+    parser.add_argument('--model-path', default="path/to/your/saved_model.pth",
+                        help="state dict of the trained tabular model")
+    parser.add_argument('--category-transformer-path', default=CATEGORY_TRANSFORMER_PATH,
+                        help="folder containing model.py and tabular_config.py")
+    args = parser.parse_args(argv)
+    add_category_transformer_path(args.category_transformer_path)
 
-# Example feature preparation (replace with actual data processing logic)
-features = torch.randn(1, config.n_features)  # Replace with actual numerical features
-category_features = [
-    torch.randint(0, 4751, (1,)),  # Example vendor index
-    torch.randint(0, 4, (1,)),     # Example booking year
-    torch.randint(0, 4, (1,))      # Example document year
-]
+    image = load_image(args.image)
+    feature_extractor, tokenizer, layoutlmv2_model = load_layoutlmv2()
+    predicted_text = extract_layout_text(image, feature_extractor, tokenizer, layoutlmv2_model)
 
-# Run inference
-with torch.no_grad():
-    logits, _ = custom_model(features, category_features)
+    custom_model, config = load_tabular_model(args.model_path)
+    features, category_features = prepare_tabular_inputs(predicted_text, config)
+    predicted_class = classify(custom_model, features, category_features)
 
-# Get the predicted class
-predicted_class = logits.argmax(-1).item()
+    # Print the predicted class
+    print("Predicted class:", predicted_class)
 
-# Print the predicted class
-print("Predicted class:", predicted_class)
+if __name__ == "__main__":
+    main()
@@ -2,138 +2,316 @@ import os
 import re
 import csv
 import json
-import shutil
-from pdfminer.high_level import extract_text
-import pytesseract
-from PIL import Image, UnidentifiedImageError
-import pandas as pd
-import docx2txt
-import openpyxl
+import time
+import argparse
+import multiprocessing
+from collections import deque
+from extraction_cache import ExtractionCache, hash_file, DEFAULT_MAX_BYTES
+from manifest import load_manifest, save_manifest, scan_folder
+from inventory_store import InventoryStore, DEFAULT_INVENTORY_PATH
+import ocr
+import pdf_extract
+import excel_extract
+import instrument
+import report_export
 
+# pandas, pdfminer, pytesseract, PIL and docx2txt are slow to import, so they
+# are imported inside the functions that use them. Importing this module and
+# extracting plain text or CSV files does not load any of them.
 
-# Set up Tesseract OCR
-pytesseract.pytesseract.tesseract_cmd = r"C:/Users/wonde/AppData/Local/Programs/Tesseract-OCR/tesseract.exe"  # Replace with your Tesseract path
+# Repository root, used for the default input and output paths
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Size of the blocks plain text files are read in
+TEXT_CHUNK_SIZE = 1024 * 1024
+
+# Characters stripped from the extracted text before it is saved
+PUNCTUATION_PATTERN = re.compile(r'[^\w\s]')
+
+# The iter_*_text extractors below yield the text of a file in chunks
+# (a page, a row, a block) so callers can write it out as it is produced.
+# The extract_*_text functions return the same text as one string.
+
+# Number of worker processes pdf_extract uses for the pages of one PDF.
+# Only used outside pool workers (--pdf-workers).
+PDF_WORKERS = 1
+
+# Function to extract text from PDF files, one page at a time. Pages without a
+# text layer are OCR'd, and with a cache every page is cached on its own.
+def iter_pdf_text(pdf_file, cache=None):
+    return pdf_extract.iter_pdf_pages(pdf_file, workers=PDF_WORKERS, cache=cache)
 
-# Function to extract text from PDF files
 def extract_pdf_text(pdf_file):
-    text = extract_text(pdf_file)
-    return text
+    return ''.join(iter_pdf_text(pdf_file))
+
+# Function to extract text from image files using OCR, one page at a time.
+# Pages are preprocessed and sent to Tesseract in batches by ocr.py.
+def iter_image_text(image_file):
+    for i, text in enumerate(ocr.iter_ocr_pages(image_file)):
+        yield ('\n' if i else '') + text
 
-# Function to extract text from image files using OCR
 def extract_image_text(image_file):
-    img = Image.open(image_file)
-    text = pytesseract.image_to_string(img)
-    return text
+    return ''.join(iter_image_text(image_file))
 
 # Function to extract text from .docx files
+def iter_docx_text(docx_file):
+    import docx2txt
+    yield docx2txt.process(docx_file)
+
 def extract_docx_text(docx_file):
-    text = docx2txt.process(docx_file)
-    return text
+    return ''.join(iter_docx_text(docx_file))
+
+# Function to extract text from workbooks, every sheet, one row at a time.
+# excel_extract.iter_workbook_records gives the same rows as records.
+def iter_excel_text(excel_file):
+    return excel_extract.iter_workbook_text(excel_file)
 
 def extract_excel_text(excel_file):
-    xlsx_data = pd.read_excel(excel_file, engine='openpyxl')
-    text = xlsx_data.to_string(index=True, header=True)
-    return text
+    return ''.join(iter_excel_text(excel_file))
 
 # Function to extract text from .txt files
-def extract_txt_text(txt_file):
+def iter_txt_text(txt_file):
     with open(txt_file, 'r') as file:
-        text = file.read()
-    return text
+        while True:
+            chunk = file.read(TEXT_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
 
-# Function to extract text from CSV files
-def extract_csv_text(csv_file):
+def extract_txt_text(txt_file):
+    return ''.join(iter_txt_text(txt_file))
+
+# Function to extract text from CSV files, one row at a time
+def iter_csv_text(csv_file):
     with open(csv_file, 'r') as file:
         csv_reader = csv.reader(file)
-        text = '\n'.join([' '.join(row) for row in csv_reader])
-    return text
+        for i, row in enumerate(csv_reader):
+            yield ('\n' if i else '') + ' '.join(row)
+
+def extract_csv_text(csv_file):
+    return ''.join(iter_csv_text(csv_file))
 
 # Function to extract text from JSON files
-def extract_json_text(json_file):
+def iter_json_text(json_file):
     with open(json_file, 'r') as file:
         json_data = json.load(file)
-        text = json.dumps(json_data, sort_keys=True)
+    yield json.dumps(json_data, sort_keys=True)
+
+def extract_json_text(json_file):
+    return ''.join(iter_json_text(json_file))
+
+# Extractors by name, with their version number. Bump an extractor's version
+# whenever its output changes so text cached by the old version is re-extracted.
+EXTRACTORS = {
+    'pdf': (iter_pdf_text, 2),
+    'image': (iter_image_text, 2),
+    'docx': (iter_docx_text, 1),
+    'excel': (iter_excel_text, 2),
+    'txt': (iter_txt_text, 1),
+    'csv': (iter_csv_text, 1),
+    'json': (iter_json_text, 1),
+}
+
+# Extractors that take the cache themselves to cache parts of a file (PDF pages)
+PARTIAL_CACHE_EXTRACTORS = {'pdf'}
+
+# File extensions and the extractor that handles them
+EXTENSION_EXTRACTORS = {
+    '.pdf': 'pdf',
+    '.jpg': 'image', '.jpeg': 'image', '.png': 'image', '.gif': 'image',
+    '.bmp': 'image', '.tiff': 'image', '.img': 'image',
+    '.docx': 'docx',
+    '.xlsx': 'excel', '.xls': 'excel',
+    '.txt': 'txt',
+    '.csv': 'csv',
+    '.json': 'json',
+}
+
+# Function to pick the extractor for a file based on its extension
+def get_extractor_name(file_path):
+    file_name, file_extension = os.path.splitext(file_path)
+    return EXTENSION_EXTRACTORS.get(file_extension.lower())
+
+# Function to build the extraction cache key for a file
+def get_cache_key(file_path, cache, name=None):
+    name = name or get_extractor_name(file_path)
+    extractor, version = EXTRACTORS[name]
+    return cache.make_key(hash_file(file_path), name, version)
+
+# Function to get the text of a file as a generator of chunks, or None for
+# unsupported files. With a cache, unchanged files are read back from it.
+# extractor names the extractor to use for files without a usable extension.
+def iter_file_text(file_path, cache=None, extractor=None):
+    name = extractor or get_extractor_name(file_path)
+    if name is None:
+        return None
+    iter_text, version = EXTRACTORS[name]
+    if cache is None:
+        return iter_text(file_path)
+    if name in PARTIAL_CACHE_EXTRACTORS:
+        produce = lambda: iter_text(file_path, cache=cache)
+    else:
+        produce = lambda: iter_text(file_path)
+    return cache.iter_cached(get_cache_key(file_path, cache, name), produce)
+
+# Function to extract a whole file as one string, or None if unsupported
+def extract_file(file_path, cache=None, extractor=None):
+    with instrument.span('extract', file=file_path) as span:
+        chunks = iter_file_text(file_path, cache=cache, extractor=extractor)
+        if chunks is None:
+            return None
+        text = ''.join(chunks)
+        span.add(rows=text.count('\n'), bytes=os.path.getsize(file_path))
     return text
 
-# Main function to process files
-def process_files(input_folder, output_file):
-    all_text = ""
+# Function to write the cleaned chunks of one file to an open output file.
+# Returns the number of lines of extracted text, as extract_file counts them.
+def write_cleaned_text(chunks, out):
+    rows = 0
+    for chunk in chunks:
+        rows += chunk.count('\n')
+        out.write(PUNCTUATION_PATTERN.sub('', chunk))
+    out.write("\n")
+    return rows
+
+# Function to list the files under a folder in a stable (sorted) order.
+# A path to a single file is returned as a one-item list.
+def list_input_files(input_folder):
+    if os.path.isfile(input_folder):
+        return [input_folder]
+    file_paths = []
     for root, dirs, files in os.walk(input_folder):
-        for file in files:
-            file_path = os.path.join(root, file)
-            file_name, file_extension = os.path.splitext(file_path)
-            
-            # Check file extension and call appropriate function
-            if file_extension.lower() in ['.pdf']:
-                text = extract_pdf_text(file_path)
-            elif file_extension.lower() in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.img']:
-                text = extract_image_text(file_path)
-            elif file_extension.lower() == '.docx':
-                text = extract_docx_text(file_path)
-            elif file_extension.lower() in ['.xlsx', '.xls']:
-                text = extract_excel_text(file_path)
-            elif file_extension.lower() == '.txt':
-                text = extract_txt_text(file_path)
-            elif file_extension.lower() == '.csv':
-                text = extract_csv_text(file_path)
-            elif file_extension.lower() == '.json':
-                text = extract_json_text(file_path)
-            else:
-                print(f"Skipping unsupported file: {file_path}")
-                continue
-            
-            # Clean up text and append to all_text
-            text = re.sub(r'[^\w\s]', '', text)
-            all_text += text + "\n"
-    
-import os
-import re
-import json
-import pandas as pd
-import openpyxl
-
-def process_files(input_folder, output_file):
-    # Example processing of files to extract text
-    all_text = ""
-    for root, _, files in os.walk(input_folder):
-        for file_name in files:
-            file_path = os.path.join(root, file_name)
-            with open(file_path, 'r') as f:
-                all_text += f.read() + "\n"
-
-    # Save extracted text to the specified output file
-    with open(output_file, 'w') as file:
-        file.write(all_text)
+        dirs.sort()
+        for file in sorted(files):
+            file_paths.append(os.path.join(root, file))
+    return file_paths
+
+# Main function to process files. Text is cleaned and written out chunk by
+# chunk, so memory use does not grow with the size of the folder.
+def process_files(input_folder, output_file, cache=None):
+    with open(output_file, 'w') as out:
+        for file_path in list_input_files(input_folder):
+            with instrument.span('extract', file=file_path) as span:
+                chunks = iter_file_text(file_path, cache=cache)
+                if chunks is None:
+                    print(f"Skipping unsupported file: {file_path}")
+                    continue
+                rows = write_cleaned_text(chunks, out)
+                span.add(rows=rows, bytes=os.path.getsize(file_path))
     print(f"Text data saved to {output_file}")
 
-def ensure_inventory_json_exists(file_path):
-    # Check if inventory_data.json exists, if not create an empty file
-    if not os.path.exists(file_path):
-        with open(file_path, 'w') as file:
-            json.dump([], file)  # Initialize with an empty list
-        print(f"Created {file_path} as it did not exist.")
+# Default number of seconds a single file may spend in a pool worker
+DEFAULT_FILE_TIMEOUT = 600
 
-def load_inventory_data(file_path):
-    # Ensure the inventory file exists
-    ensure_inventory_json_exists(file_path)
+# Pool worker: extract one file and report errors instead of raising,
+# so one bad file never stops the rest of the batch. The worker's
+# instrumentation totals go back with the result.
+def _extract_worker(file_path):
+    try:
+        return extract_file(file_path), None, instrument.collect()
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}", instrument.collect()
 
-    # Read the inventory data from the file
+# Function to extract many files on a process pool sized to the cores.
+# Yields one result dict per file ({'path', 'text', 'error'}) in the same
+# order as file_paths, as soon as each result is ready. With a cache, hits
+# are answered without going to the pool and new results are stored in it.
+def iter_extract_parallel(file_paths, workers=None, timeout=DEFAULT_FILE_TIMEOUT, cache=None):
+    file_paths = list(file_paths)
+    workers = max(1, workers or os.cpu_count() or 1)
+    results = {}
+    pending = deque(range(len(file_paths)))
+    in_flight = {}  # index -> (AsyncResult, start time)
+    cache_keys = {}
+    next_index = 0
+
+    pool = multiprocessing.Pool(processes=workers)
     try:
-        with open(file_path, 'r') as file:
-            data = json.load(file)
-            return data
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from {file_path}: {e}")
-        return []  # Return an empty list if JSON is invalid
-
-def save_inventory_data(data, file_path):
-    # Save data to inventory_data.json
+        while next_index < len(file_paths):
+            # Only hand the pool as many files as it has workers, so the
+            # submit time is also the time the file starts extracting
+            while pending and len(in_flight) < workers:
+                index = pending.popleft()
+                file_path = file_paths[index]
+                if get_extractor_name(file_path) is None:
+                    results[index] = {'path': file_path, 'text': None, 'error': None}
+                    continue
+                if cache is not None:
+                    if index not in cache_keys:
+                        cache_keys[index] = get_cache_key(file_path, cache)
+                    text = cache.get(cache_keys[index])
+                    if text is not None:
+                        results[index] = {'path': file_path, 'text': text, 'error': None}
+                        continue
+                async_result = pool.apply_async(_extract_worker, (file_paths[index],))
+                in_flight[index] = (async_result, time.monotonic())
+
+            if in_flight:
+                oldest_index = min(in_flight, key=lambda i: in_flight[i][1])
+                in_flight[oldest_index][0].wait(0.1)
+
+            timed_out = []
+            for index, (async_result, started) in list(in_flight.items()):
+                if async_result.ready():
+                    text, error, metrics = async_result.get()
+                    instrument.merge(metrics)
+                    results[index] = {'path': file_paths[index], 'text': text, 'error': error}
+                    if cache is not None and text is not None:
+                        cache.put(cache_keys[index], text)
+                    del in_flight[index]
+                elif timeout and time.monotonic() - started > timeout:
+                    timed_out.append(index)
+
+            if timed_out:
+                for index in timed_out:
+                    results[index] = {
+                        'path': file_paths[index],
+                        'text': None,
+                        'error': f"TimeoutError: extraction took longer than {timeout}s",
+                    }
+                    del in_flight[index]
+                # A stuck worker cannot be interrupted, so replace the pool and
+                # requeue the files that were running next to it
+                pool.terminate()
+                pool.join()
+                pending.extendleft(sorted(in_flight, reverse=True))
+                in_flight.clear()
+                pool = multiprocessing.Pool(processes=workers)
+
+            while next_index in results:
+                yield results.pop(next_index)
+                next_index += 1
+    finally:
+        pool.terminate()
+        pool.join()
+
+# Function to extract many files in parallel and return the results as a list
+def extract_files_parallel(file_paths, workers=None, timeout=DEFAULT_FILE_TIMEOUT, cache=None):
+    return list(iter_extract_parallel(file_paths, workers=workers, timeout=timeout, cache=cache))
+
+# Sequential counterpart of _extract_worker that can use the extraction cache
+def _extract_worker_cached(file_path, cache=None):
     try:
-        with open(file_path, 'w') as file:
-            json.dump(data, file, indent=4)
-        print(f"Data successfully saved to {file_path}")
+        return {'path': file_path, 'text': extract_file(file_path, cache=cache), 'error': None}
     except Exception as e:
-        print(f"Error saving data to {file_path}: {e}")
+        return {'path': file_path, 'text': None, 'error': f"{type(e).__name__}: {e}"}
+
+# Parallel version of process_files. Returns the list of files that failed.
+def process_files_parallel(input_folder, output_file, workers=None, timeout=DEFAULT_FILE_TIMEOUT, cache=None):
+    failed = []
+    with open(output_file, 'w') as out:
+        for result in iter_extract_parallel(list_input_files(input_folder), workers=workers,
+                                            timeout=timeout, cache=cache):
+            if result['error']:
+                print(f"Failed to process {result['path']}: {result['error']}")
+                failed.append(result)
+                continue
+            if result['text'] is None:
+                print(f"Skipping unsupported file: {result['path']}")
+                continue
+            write_cleaned_text([result['text']], out)
+    print(f"Text data saved to {output_file}")
+    return failed
 
 def find_headers(text):
     text = re.sub(r'[^\w\s]', '', text).lower()
@@ -141,6 +319,13 @@ def find_headers(text):
     return headers
 
 def extract_data_with_headers(text):
+    with instrument.span('parse') as span:
+        df = _extract_data_with_headers(text)
+        span.add(rows=len(df), bytes=len(text))
+    return df
+
+def _extract_data_with_headers(text):
+    import pandas as pd
     headers = find_headers(text)
     text_blocks = re.split(r'\n{2,}', text)
     data_rows = []
@@ -160,43 +345,179 @@ def extract_data_with_headers(text):
     return df
 
 def generate_excel(data, file_path):
-    # Generate an Excel file from the DataFrame
-    df = pd.DataFrame(data)
-    df.to_excel(file_path, index=False)
-    return file_path
-
-def save_to_inventory_excel(df, file_name):
-    # Save DataFrame to an Excel file
-    output_file = file_name + '.xlsx'
-    writer = pd.ExcelWriter(output_file, engine='openpyxl')
-    df.to_excel(writer, index=False, header=True, startcol=0, startrow=0)
-    writer.save()
-    print(f"Data successfully saved to {output_file}")
-    return output_file
+    # Generate an Excel file from a list of records
+    return report_export.export_records(data, file_path, formats=('xlsx',), category_sheets=False)['xlsx']
+
+# Function to save the inventory DataFrame as reports (report_export.py).
+# file_name may end in .xlsx or not; each format gets its own extension.
+# Returns the xlsx path, or the first report written if xlsx is not asked for.
+def save_to_inventory_excel(df, file_name, formats=('xlsx',), category_sheets=True):
+    paths = report_export.export_frame(df, file_name, formats=formats, category_sheets=category_sheets)
+    for path in paths.values():
+        print(f"Data successfully saved to {path}")
+    return paths.get('xlsx') or next(iter(paths.values()))
+
+# Function to process only the files that changed since the last run.
+# The manifest records the mtime, size and hash of every processed file. New and
+# changed files are extracted and parsed on their own, and their rows replace
+# the rows of the same source file in the inventory store; rows of deleted
+# files are removed. Only the text of the processed files is written to
+# output_file. Returns the inventory rows and the scan result.
+def process_files_incremental(input_folder, output_file, store, manifest_path,
+                              cache=None, parallel=False, workers=None, timeout=DEFAULT_FILE_TIMEOUT):
+    manifest = load_manifest(manifest_path)
+    changes = scan_folder(input_folder, manifest)
+    to_process = changes['new'] + changes['changed']
+    print(f"Incremental run: {len(changes['new'])} new, {len(changes['changed'])} changed, "
+          f"{len(changes['deleted'])} deleted, {len(changes['unchanged'])} unchanged")
+
+    file_paths = [os.path.join(input_folder, rel_path) for rel_path in to_process]
+    if parallel:
+        results = iter_extract_parallel(file_paths, workers=workers, timeout=timeout, cache=cache)
+    else:
+        results = (_extract_worker_cached(file_path, cache) for file_path in file_paths)
+
+    new_rows = []
+    processed = set()
+    failed = set()
+    with open(output_file, 'w') as out:
+        for rel_path, result in zip(to_process, results):
+            if result['error']:
+                print(f"Failed to process {result['path']}: {result['error']}")
+                failed.add(rel_path)
+                continue
+            processed.add(rel_path)
+            if result['text'] is None:
+                print(f"Skipping unsupported file: {result['path']}")
+                continue
+            text = PUNCTUATION_PATTERN.sub('', result['text'])
+            out.write(text + "\n")
+            for row in extract_data_with_headers(text).to_dict(orient='records'):
+                row['source_file'] = rel_path
+                new_rows.append(row)
+
+    # Failed files keep their old rows and manifest entry so they are retried next run.
+    # Without a manifest the rows come from a full run and carry no source file,
+    # so they are replaced as a whole.
+    replaced = processed | set(changes['deleted'])
+    if not manifest:
+        replaced.add('')
+    store.replace_source_files(sorted(replaced), new_rows)
+    print(f"Inventory store: {len(new_rows)} rows written, {store.count()} rows in total")
+    inventory_data = store.all_rows()
+
+    new_manifest = {}
+    for rel_path, entry in changes['entries'].items():
+        if rel_path in failed:
+            if rel_path in manifest:
+                new_manifest[rel_path] = manifest[rel_path]
+            continue
+        new_manifest[rel_path] = entry
+    save_manifest(new_manifest, manifest_path)
+    return inventory_data, changes
+
+# Function to build the command-line parser
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Extract text from input files and build the inventory data")
+    parser.add_argument('input', nargs='?', default=os.path.join(REPO_ROOT, 'testfiles'),
+                        help="file or folder to process (default: testfiles)")
+    parser.add_argument('-o', '--output', default=os.path.join(REPO_ROOT, 'output', 'newextracted.txt'),
+                        help="file the extracted text is written to (default: output/newextracted.txt)")
+    parser.add_argument('--inventory', default=DEFAULT_INVENTORY_PATH,
+                        help="inventory store database (default: inventory.sqlite3)")
+    parser.add_argument('--excel', default=os.path.join(REPO_ROOT, 'output', 'Inventory.xlsx'),
+                        help="Excel file the inventory is exported to (default: output/Inventory.xlsx)")
+    parser.add_argument('--report-formats', nargs='+', choices=report_export.FORMATS, default=['xlsx'],
+                        help="formats of the inventory report, written in one pass (default: xlsx)")
+    parser.add_argument('--no-category-sheets', action='store_true',
+                        help="do not add a sheet per category to the xlsx report")
+    parser.add_argument('--extract-only', action='store_true',
+                        help="only write the extracted text; skip parsing, the inventory and the Excel export")
+    parser.add_argument('--tesseract-cmd', default=None, help="path to the Tesseract executable")
+    parser.add_argument('--parallel', action='store_true', help="extract files on a process pool")
+    parser.add_argument('--workers', type=int, default=None, help="number of pool workers (default: number of cores)")
+    parser.add_argument('--pdf-workers', type=int, default=PDF_WORKERS,
+                        help="worker processes for the pages of each PDF (without --parallel)")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_FILE_TIMEOUT, help="per-file timeout in seconds for --parallel")
+    parser.add_argument('--cache-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'extraction'),
+                        help="directory of the extraction cache")
+    parser.add_argument('--cache-size-mb', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="size limit of the extraction cache in MB")
+    parser.add_argument('--no-cache', action='store_true', help="always re-extract every file")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only process files that changed since the last run and merge their rows into the inventory")
+    parser.add_argument('--manifest', default=None, help="manifest file for --incremental (default: next to the inventory file)")
+    instrument.add_arguments(parser)
+    return parser
 
 # Main processing
-input_folder = "F:/repogit/XseLLer8/testfiles"
-output_file = "F:/repogit/XseLLer8/output/newextracted.txt"
-inventory_data_path = "F:/repogit/XseLLer8/inventory_data.json"
-
-# Step 1: Process input files to extract text
-process_files(input_folder, output_file)
-
-# Step 2: Load the extracted text
-try:
-    with open(output_file, 'r') as file:
-        text = file.read()
-except FileNotFoundError:
-    print(f"Error: {output_file} not found.")
-    text = ""
-
-# Step 3: Extract data from the text using headers
-df = extract_data_with_headers(text)
-
-# Step 4: Save the extracted data to inventory_data.json
-inventory_data = df.to_dict(orient='records')
-save_inventory_data(inventory_data, inventory_data_path)
-
-# Step 5: Create an Excel file and copy data
-excel_output_file = "F:/repogit/XseLLer8/output/Inventory.xlsx"
-save_to_inventory_excel(df, excel_output_file)
+def main(argv=None):
+    global PDF_WORKERS
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if args.incremental and not os.path.isdir(args.input):
+        parser.error("--incremental needs a folder as input")
+    if args.incremental and args.extract_only:
+        parser.error("--incremental cannot be combined with --extract-only")
+    instrument.configure_from_args(args)
+    if args.tesseract_cmd:
+        ocr.set_tesseract_cmd(args.tesseract_cmd)
+    PDF_WORKERS = args.pdf_workers
+
+    cache = None
+    if not args.no_cache:
+        cache = ExtractionCache(args.cache_dir, max_bytes=args.cache_size_mb * 1024 * 1024)
+
+    input_folder = args.input
+    output_file = args.output
+    inventory_path = args.inventory
+    os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+
+    if args.incremental:
+        # Steps 1-4 for new and changed files only
+        manifest_path = args.manifest or os.path.splitext(inventory_path)[0] + '_manifest.json'
+        store = InventoryStore(inventory_path)
+        inventory_data, changes = process_files_incremental(
+            input_folder, output_file, store, manifest_path,
+            cache=cache, parallel=args.parallel, workers=args.workers, timeout=args.timeout)
+        store.close()
+        import pandas as pd
+        df = pd.DataFrame(inventory_data)
+    else:
+        # Step 1: Process input files to extract text
+        if args.parallel:
+            process_files_parallel(input_folder, output_file, workers=args.workers, timeout=args.timeout, cache=cache)
+        else:
+            process_files(input_folder, output_file, cache=cache)
+        if args.extract_only:
+            if cache is not None:
+                print(f"Extraction cache: {cache.stats()}")
+            return
+
+        # Step 2: Load the extracted text
+        try:
+            with open(output_file, 'r') as file:
+                text = file.read()
+        except FileNotFoundError:
+            print(f"Error: {output_file} not found.")
+            text = ""
+
+        # Step 3: Extract data from the text using headers
+        df = extract_data_with_headers(text)
+
+        # Step 4: Save the extracted data to the inventory store
+        inventory_data = df.to_dict(orient='records')
+        store = InventoryStore(inventory_path)
+        with instrument.span('save', target='inventory') as span:
+            span.add(rows=store.replace_all(inventory_data))
+        print(f"Data successfully saved to {inventory_path}")
+        store.close()
+
+    if cache is not None:
+        print(f"Extraction cache: {cache.stats()}")
+
+    # Step 5: Create an Excel file and copy data
+    save_to_inventory_excel(df, args.excel, args.report_formats, category_sheets=not args.no_category_sheets)
+
+if __name__ == "__main__":
+    main()
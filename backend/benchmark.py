@@ -0,0 +1,597 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import contextlib
+import multiprocessing
+from statistics import median
+
+try:
+    import resource
+except ImportError:
+    # Windows has no resource module; see peak_rss_mb
+    resource = None
+
+# Benchmark harness for the extraction pipeline.
+#
+# Synthetic corpora are generated at a chosen scale, and the pipeline stages
+# that process them are timed: extract, clean, parse, categorise, group and
+# save. The corpora are:
+#   - text:     text invoices (category headers and item lines, as read by
+#               App.py and output/prepdata.py);
+#   - export:   a tab-delimited inventory export, as read by cleanup.py;
+#   - workbook: a multi-sheet .xlsx;
+#   - pdf:      text-layer PDF invoices;
+#   - image:    invoice text rendered to PNG (needs the tesseract binary).
+# Every corpus runs in a fresh process, so peak RSS is that corpus's own. Each
+# stage records seconds, rows in (text lines for extraction), bytes in,
+# throughput and the peak RSS so far.
+# A run is saved as JSON; 'compare' sets two runs side by side and flags stages
+# that got slower than a threshold, so regressions show up between commits.
+# 'prepdata' times output/prepdata.py against the parser it replaced.
+#
+# The data is seeded, so the same scale always produces the same corpora.
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BACKEND_DIR)
+
+# Make output/prepdata.py importable
+sys.path.append(os.path.join(REPO_ROOT, 'output'))
+
+CORPORA = ('text', 'export', 'workbook', 'pdf', 'image')
+
+# Corpus sizes per scale
+SCALES = {
+    'small': {'invoices': 20, 'invoice_lines': 200, 'export_rows': 20000, 'sheets': 3, 'sheet_rows': 5000,
+              'pdf_pages': 10, 'images': 3},
+    'medium': {'invoices': 100, 'invoice_lines': 400, 'export_rows': 200000, 'sheets': 5, 'sheet_rows': 20000,
+               'pdf_pages': 50, 'images': 10},
+    'large': {'invoices': 500, 'invoice_lines': 800, 'export_rows': 1000000, 'sheets': 8, 'sheet_rows': 100000,
+              'pdf_pages': 250, 'images': 40},
+}
+
+# Slowdown (as a fraction) reported as a regression by 'compare'
+DEFAULT_THRESHOLD = 0.10
+
+# Differences smaller than this many seconds are timer noise, never a regression
+MIN_DELTA_SECONDS = 0.01
+
+DEFAULT_RESULTS_DIR = os.path.join(REPO_ROOT, 'benchmarks')
+
+# Words the synthetic product names are made of
+BRANDS = ['Titos', 'Absolut', 'Smirnoff', 'Grey Goose', 'Jack Daniels', 'Jameson', 'Crown Royal', 'Makers Mark',
+          'Jim Beam', 'Bacardi', 'Captain Morgan', 'Malibu', 'Patron', 'Jose Cuervo', 'Don Julio', 'Tanqueray',
+          'Bombay Sapphire', 'Hennessy', 'Baileys', 'Kahlua', 'Fireball', 'Johnnie Walker', 'Glenlivet',
+          'Bud Light', 'Coors Light', 'Miller Lite', 'Michelob Ultra', 'Corona', 'Modelo', 'Heineken', 'Stella Artois',
+          'Red Bull', 'Coca Cola', 'Sprite', 'Topo Chico', 'Barefoot', 'Kendall Jackson', 'La Marca']
+KINDS = ['Vodka', 'Whiskey', 'Bourbon', 'Rum', 'Tequila', 'Gin', 'Cognac', 'Liqueur', 'Scotch', 'Lager', 'IPA',
+         'Seltzer', 'Chardonnay', 'Cabernet', 'Prosecco', 'Soda', 'Energy Drink', 'Napkins', 'Straws']
+SECTIONS = ['LIQUORS', 'DOMESTIC BEER', 'IMPORT BEER', 'NA BEV', 'WINE', 'BEVERAGE SUPPLIES']
+UNITS = ['oz', 'ml', 'ltr', 'gal', 'can', 'btl']
+SIZES = ['50ML', '375ML', '750ML', '1L', '1.75L', '12OZ', '16OZ']
+STATUSES = ['Delivered', 'Backordered', 'Substituted']
+
+# Columns of the synthetic export; 13 columns, so cleanup.clean_parsed_frame keeps these names
+EXPORT_COLUMNS = ['Index', 'Brand', 'Bin', 'Size', 'Unit', 'Location', 'Quantity', 'Unit Cost', 'Ext Value',
+                  'Date', 'Status', 'Category', 'Additional Info']
+
+# Function to make a product name
+def _product(rng):
+    return f"{rng.choice(BRANDS)} {rng.choice(KINDS)}"
+
+# Function to make the lines of one text invoice: a header block, then
+# sections of item lines separated by blank lines
+def invoice_lines(rng, number, line_count):
+    lines = [f"INVOICE {number}", f"DATE {rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/2024", '']
+    while line_count > 0:
+        lines.append(rng.choice(SECTIONS))
+        for _ in range(min(line_count, rng.randint(5, 30))):
+            lines.append(f"{_product(rng)} {rng.randint(1, 48)} {rng.choice(UNITS)}")
+            line_count -= 1
+        lines.append(f"TOTAL {rng.randint(100, 5000)}")
+        lines.append('')
+    return lines
+
+# Function to write the text invoice corpus
+def write_text_invoices(directory, count, line_count, rng):
+    os.makedirs(directory, exist_ok=True)
+    for number in range(count):
+        with open(os.path.join(directory, f"invoice_{number:05d}.txt"), 'w') as file:
+            file.write('\n'.join(invoice_lines(rng, 10000 + number, line_count)) + '\n')
+
+# Function to write a tab-delimited inventory export
+def write_export(path, rows, rng):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='ISO-8859-1') as file:
+        file.write('\t'.join(EXPORT_COLUMNS) + '\n')
+        for index in range(rows):
+            quantity = rng.randint(0, 120)
+            cost = round(rng.uniform(0.5, 90), 2)
+            file.write('\t'.join([
+                str(index), _product(rng), f"B{rng.randint(1, 400)}", rng.choice(SIZES), rng.choice(UNITS),
+                f"Bar {rng.randint(1, 9)}", str(quantity), f"{cost:.2f}", f"{quantity * cost:.2f}",
+                f"{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/2024", rng.choice(STATUSES),
+                rng.choice(SECTIONS).title(), rng.choice(['', '', 'Recount', 'Damaged']),
+            ]) + '\n')
+
+# Function to write a multi-sheet workbook with openpyxl's streaming writer
+def write_workbook(path, sheets, rows, rng):
+    import openpyxl
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    workbook = openpyxl.Workbook(write_only=True)
+    for sheet_number in range(sheets):
+        sheet = workbook.create_sheet(f"Sheet {sheet_number + 1}")
+        sheet.append(['Inventory Report'])
+        sheet.append([])
+        sheet.append(['Item #', 'Brand', 'Size', 'Quantity', 'Unit Cost', 'Ext Value'])
+        for index in range(rows):
+            quantity = rng.randint(0, 120)
+            cost = round(rng.uniform(0.5, 90), 2)
+            sheet.append([f"SKU{index:06d}", _product(rng), rng.choice(SIZES), quantity, cost, round(quantity * cost, 2)])
+    workbook.save(path)
+
+# Function to escape text for a PDF string literal
+def _pdf_string(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+# Function to write a PDF with a text layer, one page per list of lines.
+# No PDF library is needed: the file is a catalog, a page tree, one Helvetica
+# font and a content stream per page.
+def write_text_pdf(path, pages):
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page objects are numbered
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for lines in pages:
+        content = "BT /F1 9 Tf 11 TL 40 800 Td " + ' '.join(f"({_pdf_string(line)}) Tj T*" for line in lines) + " ET"
+        content = content.encode('latin-1', 'replace')
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        page_ids.append(len(objects))
+    kids = ' '.join(f"{page_id} 0 R" for page_id in page_ids).encode('ascii')
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b''.join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, 'wb') as file:
+        file.write(output)
+
+# Function to write the PDF corpus: one invoice of pdf_pages pages
+def write_pdf_invoices(directory, page_count, rng):
+    os.makedirs(directory, exist_ok=True)
+    pages = [invoice_lines(rng, 20000 + page, 60)[:70] for page in range(page_count)]
+    write_text_pdf(os.path.join(directory, "invoice.pdf"), pages)
+
+# Function to write the image corpus: invoice text rendered to PNG at about 300 dpi
+def write_image_invoices(directory, count, rng):
+    from PIL import Image, ImageDraw, ImageFont
+    os.makedirs(directory, exist_ok=True)
+    try:
+        font = ImageFont.load_default(size=28)
+    except TypeError:
+        font = ImageFont.load_default()
+    for number in range(count):
+        image = Image.new('L', (2480, 3508), 255)
+        draw = ImageDraw.Draw(image)
+        for row, line in enumerate(invoice_lines(rng, 30000 + number, 60)[:80]):
+            draw.text((120, 120 + row * 40), line, fill=0, font=font)
+        image.save(os.path.join(directory, f"invoice_{number:05d}.png"), dpi=(300, 300))
+
+# Function to generate the corpora that are missing under corpus_dir.
+# Returns {corpus: path}.
+def generate_corpora(corpus_dir, scale, corpora=CORPORA, seed=0):
+    sizes = SCALES[scale]
+    base = os.path.join(corpus_dir, scale)
+    paths = {
+        'text': os.path.join(base, 'text'),
+        'export': os.path.join(base, 'export', 'export.txt'),
+        'workbook': os.path.join(base, 'workbook', 'workbook.xlsx'),
+        'pdf': os.path.join(base, 'pdf'),
+        'image': os.path.join(base, 'image'),
+    }
+    writers = {
+        'text': lambda path, rng: write_text_invoices(path, sizes['invoices'], sizes['invoice_lines'], rng),
+        'export': lambda path, rng: write_export(path, sizes['export_rows'], rng),
+        'workbook': lambda path, rng: write_workbook(path, sizes['sheets'], sizes['sheet_rows'], rng),
+        'pdf': lambda path, rng: write_pdf_invoices(path, sizes['pdf_pages'], rng),
+        'image': lambda path, rng: write_image_invoices(path, sizes['images'], rng),
+    }
+    for corpus in corpora:
+        if not os.path.exists(paths[corpus]):
+            started = time.perf_counter()
+            # Each corpus has its own seed, so adding one does not change the others
+            writers[corpus](paths[corpus], random.Random(f"{seed}:{corpus}"))
+            print(f"Generated {corpus} corpus in {time.perf_counter() - started:.1f}s: {paths[corpus]}")
+    return {corpus: paths[corpus] for corpus in corpora}
+
+# Function to get the size in bytes of a file or of every file under a folder
+def _size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, dirs, files in os.walk(path) for name in files)
+
+# Function to get the peak RSS of this process in MB, or None where it
+# cannot be read (no resource module and no psutil)
+def peak_rss_mb():
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    try:
+        import psutil
+    except ImportError:
+        return None
+    # On Windows psutil reports the peak working set
+    peak = getattr(psutil.Process().memory_info(), 'peak_wset', None)
+    return round(peak / (1024 * 1024), 1) if peak else None
+
+# Function to pair extracted texts with their total line count, the rows of an extract stage
+def _with_lines(texts):
+    return texts, sum(text.count('\n') for text in texts)
+
+# Times the stages of one corpus run
+class StageTimer:
+    def __init__(self, corpus):
+        self.corpus = corpus
+        self.stages = []
+
+    # Function to run one stage. func returns (value, rows); the value is
+    # handed to the next stage.
+    def run(self, stage, func, bytes_in=None):
+        started = time.perf_counter()
+        try:
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                value, rows = func()
+            error = None
+        except Exception as e:
+            value, rows, error = None, None, f"{type(e).__name__}: {e}"
+        seconds = time.perf_counter() - started
+        record = {
+            'corpus': self.corpus,
+            'stage': stage,
+            'seconds': round(seconds, 4),
+            'rows': rows,
+            'bytes': bytes_in,
+            'rows_per_second': round(rows / seconds, 1) if rows and seconds else None,
+            'mb_per_second': round(bytes_in / (1024 * 1024) / seconds, 2) if bytes_in and seconds else None,
+            'peak_rss_mb': peak_rss_mb(),
+        }
+        if error:
+            record['error'] = error
+        self.stages.append(record)
+        return value
+
+# Function to benchmark the text invoice corpus
+def bench_text(timer, path, workdir):
+    import App
+    import pandas as pd
+    import prepdata
+    from categorizer import Categorizer
+    from inventory_store import InventoryStore
+
+    file_paths = App.list_input_files(path)
+    texts = timer.run('extract', lambda: _with_lines([App.extract_file(file_path) for file_path in file_paths]),
+                      _size(path))
+    if texts is None:
+        return
+    cleaned = '\n\n'.join(App.PUNCTUATION_PATTERN.sub('', text) for text in texts)
+    timer.run('clean', lambda: (None, len(App.extract_data_with_headers(cleaned))), len(cleaned))
+
+    def parse():
+        df = pd.DataFrame(list(prepdata.iter_items(file_paths)), columns=prepdata.COLUMNS)
+        df['Section'] = df['Category'].fillna('Miscellaneous')
+        return df, len(df)
+    df = timer.run('parse', parse, _size(path))
+    if df is None:
+        return
+
+    def categorise():
+        # A new categoriser, so its memo starts empty
+        df['Category'] = Categorizer.from_file().categorize_series(df['Section'] + ' ' + df['Product Name'])
+        return df, len(df)
+    timer.run('categorise', categorise)
+    timer.run('group', lambda: (df.groupby('Category')['Quantity'].sum(), len(df)))
+
+    def save():
+        df.to_csv(os.path.join(workdir, 'text_items.csv'), index=False)
+        store = InventoryStore(os.path.join(workdir, 'inventory.sqlite3'))
+        rows = df.rename(columns={'Product Name': 'brand', 'Source File': 'source_file'}).to_dict('records')
+        count = store.replace_all(rows)
+        store.close()
+        return None, count
+    timer.run('save', save)
+
+# Function to benchmark the tab-delimited export
+def bench_export(timer, path, workdir):
+    import pandas as pd
+    import cleanup
+    from categorizer import load_categorizer
+
+    def read():
+        df = pd.read_csv(path, **cleanup.READ_OPTIONS)
+        df = df.dropna(how='all').dropna(axis=1, how='all')
+        return df, len(df)
+    df = timer.run('extract', read, _size(path))
+    if df is None:
+        return
+    # Categorising first warms the shared categoriser, so 'clean' times the
+    # rest of clean_parsed_frame
+    timer.run('categorise', lambda: (None, len(load_categorizer().categorize_series(df['Brand']))))
+    df = timer.run('clean', lambda: (lambda cleaned: (cleaned, len(cleaned)))(cleanup.clean_parsed_frame(df, verbose=False)))
+    if df is None:
+        return
+    grouped = timer.run('group', lambda: (cleanup.group_by_category(df), len(df)))
+
+    def save():
+        df.to_csv(os.path.join(workdir, '1cleaned_data.csv'), index=True)
+        if grouped is not None:
+            grouped.to_csv(os.path.join(workdir, '1grouped_data.csv'), index=True)
+        return None, len(df)
+    timer.run('save', save)
+
+# Function to benchmark the workbook
+def bench_workbook(timer, path, workdir):
+    import App
+    import excel_extract
+
+    timer.run('extract', lambda: (None, App.extract_file(path).count('\n')), _size(path))
+    records = timer.run('parse', lambda: (lambda records: (records, len(records)))(
+        [record['values'] for record in excel_extract.iter_workbook_records(path)]), _size(path))
+    if records is None:
+        return
+    timer.run('save', lambda: (App.generate_excel(records, os.path.join(workdir, 'workbook_out.xlsx')), len(records)))
+
+# Function to benchmark the PDF or image corpus (extraction only)
+def bench_documents(timer, path, workdir):
+    import App
+    file_paths = App.list_input_files(path)
+    texts = timer.run('extract', lambda: _with_lines([App.extract_file(file_path) for file_path in file_paths]),
+                      _size(path))
+    if texts is not None:
+        text = '\n'.join(texts)
+        timer.run('clean', lambda: (None, len(App.extract_data_with_headers(App.PUNCTUATION_PATTERN.sub('', text)))),
+                  len(text))
+
+BENCHMARKS = {
+    'text': bench_text,
+    'export': bench_export,
+    'workbook': bench_workbook,
+    'pdf': bench_documents,
+    'image': bench_documents,
+}
+
+# Function run in a fresh process for one corpus; returns its stage records
+def run_corpus(corpus, path):
+    sys.path.insert(0, BACKEND_DIR)
+    workdir = tempfile.mkdtemp(prefix=f"bench_{corpus}_")
+    try:
+        timer = StageTimer(corpus)
+        BENCHMARKS[corpus](timer, path, workdir)
+        return timer.stages
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+# Function to take the median time of each stage over the repeats.
+# Throughput follows the median time; peak RSS is the highest seen (None
+# if it could not be read).
+def summarize(runs):
+    summary = []
+    for records in zip(*runs):
+        record = dict(records[0])
+        record['seconds'] = round(median(r['seconds'] for r in records), 4)
+        record['seconds_all'] = [r['seconds'] for r in records]
+        record['peak_rss_mb'] = max((r['peak_rss_mb'] for r in records if r['peak_rss_mb'] is not None), default=None)
+        seconds = record['seconds']
+        record['rows_per_second'] = round(record['rows'] / seconds, 1) if record['rows'] and seconds else None
+        record['mb_per_second'] = (round(record['bytes'] / (1024 * 1024) / seconds, 2)
+                                   if record['bytes'] and seconds else None)
+        summary.append(record)
+    return summary
+
+# Function to get the current commit, if the repository is a git checkout
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+# Function to run the benchmarks and return the results document
+def run_benchmarks(scale='small', corpora=CORPORA, repeat=3, corpus_dir=None, seed=0):
+    corpus_dir = corpus_dir or os.path.join(tempfile.gettempdir(), 'inventory_bench')
+    paths = generate_corpora(corpus_dir, scale, corpora, seed)
+    # A fresh interpreter per run, so no corpus inherits another's memory or caches
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for corpus in corpora:
+        runs = []
+        for _ in range(repeat):
+            with context.Pool(1) as pool:
+                runs.append(pool.apply(run_corpus, (corpus, paths[corpus])))
+        for record in summarize(runs):
+            results.append(record)
+            status = f" ({record['error']})" if record.get('error') else ''
+            print(f"{corpus:<9}{record['stage']:<11}{record['seconds']:>9.3f}s  {record['rows_per_second'] or '-':>12} rows/s"
+                  f"  {record['peak_rss_mb'] or '-':>8} MB{status}")
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'scale': scale,
+        'sizes': SCALES[scale],
+        'repeat': repeat,
+        'seed': seed,
+        'results': results,
+    }
+
+# The original output/prepdata.py parser (readlines, uncompiled re.match, a
+# dict per row), kept as the baseline of the 'prepdata' command and of the
+# parser tests
+def parse_data_readlines(file_path):
+    import re
+    import pandas as pd
+
+    with open(file_path, 'r') as file:
+        lines = file.readlines()
+
+    current_category = None
+    data = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.isupper() and 'TOTAL' not in line:
+            current_category = line
+            continue
+        match = re.match(r'^(.*?)(\d+)\s*(oz|ml|ltr|gal|can|btl)?$', line, re.IGNORECASE)
+        if match:
+            data.append({
+                'Category': current_category,
+                'Product Name': match.group(1).strip(),
+                'Quantity': int(match.group(2).strip()),
+                'Size': match.group(3) if match.group(3) else 'unknown'
+            })
+
+    df = pd.DataFrame(data)
+    df['Category'] = df['Category'].fillna('Miscellaneous')
+    df['Size'] = df['Size'].str.lower().replace('unknown', pd.NA)
+    return df
+
+# Function to time a parser (best of `repeat` runs) and measure the peak
+# Python memory of one run
+def _measure_parser(parse, repeat):
+    import tracemalloc
+
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    parse()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+# Function to compare prepdata.parse_data with the original parser. The
+# headline is end to end: both sides turn the same files into the categorised
+# DataFrame (the original parser is followed by the same categorisation step).
+# The 'item columns only' row times the line parsing without the DataFrame.
+def compare_prepdata(file_paths, repeat=5):
+    import pandas as pd
+    import prepdata
+    from categorizer import load_categorizer
+
+    def run_original():
+        frames = []
+        for file_path in file_paths:
+            df = parse_data_readlines(file_path)
+            df['Source File'] = file_path
+            frames.append(df)
+        df = pd.concat(frames, ignore_index=True)
+        df['Section'] = df['Category']
+        df['Category'] = load_categorizer().categorize_series(df['Section'] + ' ' + df['Product Name'])
+        return df
+
+    def run_columns():
+        for _ in prepdata.iter_item_columns(file_paths):
+            pass
+
+    # Compile the categorisation rules before timing either side
+    load_categorizer()
+    results = {}
+    for name, parse in [('original', run_original), ('parse_data', lambda: prepdata.parse_data(file_paths)),
+                        ('item columns only', run_columns)]:
+        results[name] = _measure_parser(parse, repeat)
+
+    base_time, base_peak = results['original']
+    for name, (elapsed, peak) in results.items():
+        print(f"{name:>20}: {elapsed * 1000:9.1f} ms  peak {peak / 1024 / 1024:8.2f} MB  "
+              f"speed-up x{base_time / elapsed:5.2f}")
+    print(f"parse_data end to end: x{base_time / results['parse_data'][0]:.2f} the speed of the original")
+    return results
+
+# Function to compare two result documents stage by stage.
+# Returns [(corpus, stage, old seconds, new seconds, ratio, verdict)].
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD):
+    old = {(r['corpus'], r['stage']): r for r in baseline['results']}
+    rows = []
+    for record in current['results']:
+        key = (record['corpus'], record['stage'])
+        before = old.get(key)
+        if before is None or before.get('error') or record.get('error') or not before['seconds']:
+            rows.append(key + (before and before['seconds'], record['seconds'], None, 'n/a'))
+            continue
+        ratio = record['seconds'] / before['seconds']
+        if abs(record['seconds'] - before['seconds']) < MIN_DELTA_SECONDS:
+            verdict = 'same'
+        else:
+            verdict = 'slower' if ratio > 1 + threshold else 'faster' if ratio < 1 - threshold else 'same'
+        rows.append(key + (before['seconds'], record['seconds'], round(ratio, 3), verdict))
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic corpora")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="generate the corpora and time every stage")
+    run_parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    run_parser.add_argument('--corpora', nargs='+', choices=CORPORA, default=list(CORPORA))
+    run_parser.add_argument('--repeat', type=int, default=3, help="runs per corpus; the median time is kept")
+    run_parser.add_argument('--corpus-dir', default=None, help="where the corpora are generated and reused")
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('-o', '--output', default=None,
+                            help="results file (default: benchmarks/<scale>-<timestamp>.json)")
+
+    prepdata_parser = subparsers.add_parser('prepdata', help="compare output/prepdata.py with the original parser")
+    prepdata_parser.add_argument('files', nargs='*', default=[os.path.join(REPO_ROOT, 'output', 'extracted.txt')],
+                                 help="extracted text files (default: output/extracted.txt)")
+    prepdata_parser.add_argument('--repeat', type=int, default=5, help="runs per parser; the best time is kept")
+
+    compare_parser = subparsers.add_parser('compare', help="compare two results files")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                                help="slowdown reported as a regression (0.1 = 10%%)")
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        document = run_benchmarks(args.scale, args.corpora, args.repeat, args.corpus_dir, args.seed)
+        output = args.output or os.path.join(DEFAULT_RESULTS_DIR, f"{args.scale}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as file:
+            json.dump(document, file, indent=2)
+        print(f"Results saved to {output}")
+    elif args.command == 'prepdata':
+        compare_prepdata(args.files, args.repeat)
+    else:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        with open(args.current) as file:
+            current = json.load(file)
+        print(f"{baseline.get('commit')} -> {current.get('commit')} (scale {current.get('scale')})")
+        rows = compare_results(baseline, current, args.threshold)
+        for corpus, stage, before, after, ratio, verdict in rows:
+            print(f"{corpus:<9}{stage:<11}{before if before is not None else '-':>10}{after:>10}"
+                  f"{ratio if ratio is not None else '-':>8}  {verdict}")
+        # A non-zero exit lets a CI job fail on a regression
+        sys.exit(1 if any(row[5] == 'slower' for row in rows) else 0)
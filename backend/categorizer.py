@@ -0,0 +1,83 @@
+import os
+import re
+import json
+
+# Default rules file: an ordered list of {"category", "keywords"} plus a default category
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'category_rules.json')
+
+# Number of distinct strings remembered before the memo is cleared
+MEMO_SIZE = 100000
+
+# Keyword-based item categoriser shared by cleanup.py and prepdata.py.
+# A string gets the category of the first rule (in file order) that has any of
+# its keywords as a case-insensitive substring, or the default category.
+# All keywords are compiled into one regex; a lookahead at every position finds
+# the highest-priority keyword starting there, so a single scan of the string is
+# enough to pick the winning rule. Results are memoised per distinct string.
+class Categorizer:
+    def __init__(self, rules, default='Miscellaneous'):
+        self.rules = rules
+        self.default = default
+        self._memo = {}
+
+        # Alternatives are listed in rule order so the first one that matches at a
+        # position is the one with the highest priority
+        alternatives = []
+        self._priority = {}
+        for priority, rule in enumerate(rules):
+            for keyword in rule['keywords']:
+                keyword = keyword.lower()
+                if keyword and keyword not in self._priority:
+                    self._priority[keyword] = priority
+                    alternatives.append(re.escape(keyword))
+        self._pattern = re.compile('(?=(' + '|'.join(alternatives) + '))') if alternatives else None
+
+    @classmethod
+    def from_file(cls, rules_path=DEFAULT_RULES_PATH):
+        with open(rules_path, 'r') as file:
+            config = json.load(file)
+        return cls(config['rules'], default=config.get('default', 'Miscellaneous'))
+
+    def _match(self, text):
+        if self._pattern is None:
+            return self.default
+        best = None
+        for match in self._pattern.finditer(text.lower()):
+            priority = self._priority[match.group(1)]
+            if best is None or priority < best:
+                best = priority
+                if best == 0:
+                    break
+        return self.default if best is None else self.rules[best]['category']
+
+    # Function to categorise one string (None/NaN gets the default category)
+    def categorize(self, text):
+        if text is None or text != text:
+            return self.default
+        text = str(text)
+        category = self._memo.get(text)
+        if category is None:
+            if len(self._memo) >= MEMO_SIZE:
+                self._memo.clear()
+            category = self._memo[text] = self._match(text)
+        return category
+
+    # Function to categorise a whole column. Each distinct value is matched once
+    # and the results are spread back over the column.
+    def categorize_series(self, series):
+        import numpy as np
+        import pandas as pd
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        # Missing values have code -1, which picks the trailing default
+        categories = np.array([self.categorize(value) for value in uniques] + [self.default], dtype=object)
+        return pd.Series(categories[codes], index=series.index, dtype=object)
+
+# Shared categorisers by rules file
+_categorizers = {}
+
+# Function to get the categoriser for a rules file, compiling it only once
+def load_categorizer(rules_path=DEFAULT_RULES_PATH):
+    categorizer = _categorizers.get(rules_path)
+    if categorizer is None:
+        categorizer = _categorizers[rules_path] = Categorizer.from_file(rules_path)
+    return categorizer
@@ -1,45 +1,39 @@
 import pandas as pd
+import numpy as np
 import re
 import os
+import sys
+import argparse
 
-def parse_data(file_path, output_dir="output"):
-    # Step 1: Read the file content using pandas
-    print(f"Reading file: {file_path}")
-    try:
-        df = pd.read_csv(file_path, delimiter='\t', skip_blank_lines=True, encoding='ISO-8859-1')
-        print("File read successfully.")
-    except Exception as e:
-        print(f"Error reading file: {e}")
-        return None
+from categorizer import load_categorizer
+import instrument
+import report_export
+from extraction_cache import hash_file
+from rollups import Rollups, contributions_from_frame, merge_contributions
 
-    # Show initial DataFrame structure
-    print("\nInitial DataFrame structure:")
-    print(df.head())
-    print(f"Columns: {df.columns.tolist()}")
-    print(f"Number of columns: {len(df.columns)}\n")
-
-    # Drop rows and columns that are completely empty
-    df = df.dropna(how='all').dropna(axis=1, how='all')
-    print("Dropped completely empty rows and columns.")
-
-    # If the DataFrame has only one column, try splitting it
-    if len(df.columns) == 1:
-        print("Single-column DataFrame detected, attempting to split based on whitespace.")
-        df = df.iloc[:, 0].str.split(r'\s{2,}', expand=True)
-        print("Split operation completed.")
-
-    # Show DataFrame structure after possible split
-    print("\nDataFrame structure after cleaning:")
-    print(df.head())
-    print(f"Columns: {df.columns.tolist()}")
-    print(f"Number of columns: {len(df.columns)}\n")
+# Repository root, used for the default input and output paths
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Options used to read tab-delimited exports
+READ_OPTIONS = {'delimiter': '\t', 'skip_blank_lines': True, 'encoding': 'ISO-8859-1'}
+
+# Default number of rows per chunk for parse_data_chunked
+DEFAULT_CHUNKSIZE = 100000
+
+# Pattern used to split single-column exports into fields
+FIELD_SPLIT_PATTERN = r'\s{2,}'
+
+# Function to name, categorise and convert the columns of a parsed frame
+# (everything between reading/splitting the file and grouping it)
+def clean_parsed_frame(df, verbose=True):
+    log = print if verbose else (lambda *args, **kwargs: None)
 
     # Check if the number of columns matches the expected number (13 in this case)
     expected_columns = 13
     actual_columns = len(df.columns)
 
     if actual_columns != expected_columns:
-        print(f"Warning: Expected {expected_columns} columns, but got {actual_columns}. Adjusting column names dynamically.")
+        log(f"Warning: Expected {expected_columns} columns, but got {actual_columns}. Adjusting column names dynamically.")
         
         # Basic column names up to the expected number
         column_names = ['Index', 'Brand', 'Bin', 'Size', 'Unit', 'Location', 'Stock', 
@@ -56,85 +50,116 @@ def parse_data(file_path, output_dir="output"):
         
         # Assign the adjusted column names
         df.columns = column_names
-        print(f"New column names: {df.columns.tolist()}\n")
+        log(f"New column names: {df.columns.tolist()}\n")
 
     # Drop unwanted columns if they exist
     columns_to_drop = ['Index', 'Location', 'Additional Info']
     df = df.drop([col for col in columns_to_drop if col in df.columns], axis=1)
-    print(f"Columns after dropping unwanted columns: {df.columns.tolist()}\n")
+    log(f"Columns after dropping unwanted columns: {df.columns.tolist()}\n")
 
     # Step 2: Data Parsing and Cleaning
     # Ensure 'Ordered' column exists
     if 'Ordered' not in df.columns:
         df['Ordered'] = 0  # Create 'Ordered' column with default value
-        print("'Ordered' column not found. Created with default value 0.")
+        log("'Ordered' column not found. Created with default value 0.")
 
     # Ensure 'Quantity' column exists
     if 'Quantity' not in df.columns:
         df['Quantity'] = 0  # Create 'Quantity' column with default value
-        print("'Quantity' column not found. Created with default value 0.")
+        log("'Quantity' column not found. Created with default value 0.")
 
     # Ensure 'Unit Cost' column exists
     if 'Unit Cost' not in df.columns:
         df['Unit Cost'] = 0  # Create 'Unit Cost' column with default value
-        print("'Unit Cost' column not found. Created with default value 0.")
-
-    # Function to categorize items
-    def categorize_item(brand):
-        if pd.isna(brand):
-            return 'Miscellaneous'
-        brand_lower = brand.lower()
-        if 'beer' in brand_lower:
-            return 'Beer'
-        elif 'wine' in brand_lower:
-            return 'Wine'
-        elif 'liquor' in brand_lower or 'vodka' in brand_lower:
-            return 'Liquor'
-        else:
-            return 'Miscellaneous'
+        log("'Unit Cost' column not found. Created with default value 0.")
 
     # Apply categorization if 'Brand' column exists
     if 'Brand' in df.columns:
-        df['Name'] = df['Brand'].apply(categorize_item)
-        print("Categorization applied based on 'Brand' column.")
+        df['Name'] = load_categorizer().categorize_series(df['Brand'])
+        log("Categorization applied based on 'Brand' column.")
     else:
         df['Name'] = 'Item'  # Default category if 'Brand' is missing
-        print("'Brand' column not found. All items categorized as 'Name'.")
+        log("'Brand' column not found. All items categorized as 'Name'.")
 
     # Standardize units (convert ounces to liters, etc., if needed)
     unit_conversion = {'oz': 0.0295735, 'ml': 0.001, 'ltr': 1, 'gal': 3.78541}
     if 'Ordered' in df.columns:
         df['Ordered'] = df['Unit'].str.lower().map(unit_conversion).fillna(1)
-        print("Unit conversion applied.")
+        log("Unit conversion applied.")
     else:
         df['Unit'] = 1  # Default unit conversion factor
-        print("'Unit' column not found. Set to default conversion factor of 1.")
+        log("'Unit' column not found. Set to default conversion factor of 1.")
 
     # Convert 'Quantity' to numeric, handling errors
     df['Ordered'] = pd.to_numeric(df['Quantity'], errors='coerce').fillna(0)
-    print("Converted 'Ordered' to numeric.")
+    log("Converted 'Ordered' to numeric.")
 
     # Convert 'Ordered' to numeric, handling errors
     df['Ordered'] = pd.to_numeric(df['Ordered'], errors='coerce').fillna(0)
-    print("Converted 'Ordered' to numeric.")
+    log("Converted 'Ordered' to numeric.")
 
     # Calculate total value if 'Unit Cost' exists
     if 'Unit Cost' in df.columns:
         df['Price'] = pd.to_numeric(df['Unit Cost'], errors='coerce').fillna(0)
         df['Price'] = df['Quantity'] * df['Ordered']
-        print("Calculated 'Ext Value' based on 'Quantity' and 'Unit Cost'.")
+        log("Calculated 'Ext Value' based on 'Quantity' and 'Unit Cost'.")
     else:
         df['Ext Value'] = 0  # If 'Unit Cost' is missing, set 'Ext Value' to 0
-        print("'Unit Cost' column not found. Set 'Ext Value' to 0.")
+        log("'Unit Cost' column not found. Set 'Ext Value' to 0.")
 
-    # Step 3: Data Structuring
-    # Group and aggregate by Category
-    grouped_df = df.groupby('Category').agg({
+    return df
+
+# Function to group and aggregate the cleaned data by Category
+def group_by_category(df):
+    return df.groupby('Category').agg({
         'Quantity': 'sum',
         'Ordered': 'sum',
         'Ext Value': 'sum'
     }).reset_index()
-    print("\nData grouped and aggregated by 'Category'.\n")
+
+def parse_data(file_path, output_dir="output"):
+    # Step 1: Read the file content using pandas
+    print(f"Reading file: {file_path}")
+    try:
+        with instrument.span('read', file=file_path) as span:
+            df = pd.read_csv(file_path, **READ_OPTIONS)
+            span.add(rows=len(df), bytes=os.path.getsize(file_path))
+    except Exception as e:
+        print(f"Error reading file: {e}")
+        return None
+
+    # Show initial DataFrame structure
+    instrument.debug("\nInitial DataFrame structure:")
+    instrument.debug(df.head())
+    instrument.debug(f"Columns: {df.columns.tolist()}")
+    instrument.debug(f"Number of columns: {len(df.columns)}\n")
+
+    with instrument.span('clean', file=file_path) as span:
+        # Drop rows and columns that are completely empty
+        df = df.dropna(how='all').dropna(axis=1, how='all')
+        instrument.debug("Dropped completely empty rows and columns.")
+
+        # If the DataFrame has only one column, try splitting it
+        if len(df.columns) == 1:
+            instrument.debug("Single-column DataFrame detected, attempting to split based on whitespace.")
+            df = df.iloc[:, 0].str.split(FIELD_SPLIT_PATTERN, expand=True)
+            instrument.debug("Split operation completed.")
+
+        # Show DataFrame structure after possible split
+        instrument.debug("\nDataFrame structure after cleaning:")
+        instrument.debug(df.head())
+        instrument.debug(f"Columns: {df.columns.tolist()}")
+        instrument.debug(f"Number of columns: {len(df.columns)}\n")
+
+        df = clean_parsed_frame(df, verbose=instrument.debug_enabled())
+        span.add(rows=len(df))
+
+    # Step 3: Data Structuring
+    # Group and aggregate by Category
+    with instrument.span('group', file=file_path) as span:
+        grouped_df = group_by_category(df)
+        span.add(rows=len(grouped_df))
+    instrument.debug("\nData grouped and aggregated by 'Category'.\n")
 
     # Step 4: Save the cleaned data for review
     # Ensure the output directory exists
@@ -143,65 +168,175 @@ def parse_data(file_path, output_dir="output"):
     cleaned_file_path = os.path.join(output_dir, "1cleaned_data.csv")
     grouped_file_path = os.path.join(output_dir, "1grouped_data.csv")
     
-    # Save cleaned data
-    df.to_csv(cleaned_file_path, index=True)
+    with instrument.span('save', target='csv') as span:
+        # Save cleaned data
+        df.to_csv(cleaned_file_path, index=True)
+        # Save grouped data
+        grouped_df.to_csv(grouped_file_path, index=True)
+        span.add(rows=len(df) + len(grouped_df))
     print(f"Cleaned data saved to {cleaned_file_path}")
-
-    # Save grouped data
-    grouped_df.to_csv(grouped_file_path, index=True)
     print(f"Grouped data saved to {grouped_file_path}")
 
     return df, grouped_df
 
-# Example usage
-file_path = "F:/repogit/XseLLer8/output/newextracted.txt"
-df, grouped_df = parse_data(file_path)
-
-if df is not None:
-    # Output the modified DataFrame
-    print("\nParsed DataFrame:")
-    print(df.head())
-    
-    # Output the grouped DataFrame
-    print("\nGrouped DataFrame:")
-    print(grouped_df.head())
-    
-import pandas as pd
-
-# Load the uploaded CSV file
-file_path = "F:/repogit/XseLLer8/output/1cleaned_data.csv"
-df = pd.read_csv(file_path)
-
-# Display the first few rows to understand the data structure
-df.head()
-
-# Step 1: Replace NaN values with empty strings for easier processing
-df = df.fillna('')
+# Function to scan a file chunk by chunk for the layout a single read would see:
+# the columns that are not completely empty, the dtype pandas would infer for
+# each of them over the whole file, and (for single-column files) the number of
+# fields the whitespace split produces.
+def scan_layout(file_path, chunksize=DEFAULT_CHUNKSIZE):
+    present = {}
+    kinds = {}
+    for chunk in pd.read_csv(file_path, chunksize=chunksize, **READ_OPTIONS):
+        chunk = chunk.dropna(how='all')
+        for col in chunk.columns:
+            present[col] = present.get(col, False) or bool(chunk[col].notna().any())
+            kinds.setdefault(col, set()).add(chunk[col].dtype.kind)
+
+    columns = [col for col, has_values in present.items() if has_values]
+    dtypes = {}
+    for col in columns:
+        col_kinds = kinds[col]
+        if col_kinds <= {'i', 'u'}:
+            dtypes[col] = 'int64'
+        elif col_kinds <= {'i', 'u', 'f'}:
+            dtypes[col] = 'float64'
+        elif col_kinds != {'b'}:
+            dtypes[col] = str
+
+    split_width = None
+    if len(columns) == 1:
+        split_width = 0
+        for chunk in pd.read_csv(file_path, chunksize=chunksize, usecols=columns, dtype=dtypes, **READ_OPTIONS):
+            fields = chunk.iloc[:, 0].dropna().str.split(FIELD_SPLIT_PATTERN).str.len()
+            if len(fields):
+                split_width = max(split_width, int(fields.max()))
+    return {'columns': columns, 'dtypes': dtypes, 'split_width': split_width}
+
+# Chunked version of parse_data for exports too large to load at once.
+# The file is read twice: once by scan_layout, then chunk by chunk to clean and
+# categorise each chunk, append it to 1cleaned_data.csv and add its per-Category
+# sums to the running totals. Memory is bounded by the chunk size and the output
+# matches a single-pass parse_data run. Returns the grouped DataFrame.
+# chunk_callback, if given, is called with every cleaned chunk.
+def parse_data_chunked(file_path, output_dir="output", chunksize=DEFAULT_CHUNKSIZE, chunk_callback=None):
+    print(f"Reading file in chunks of {chunksize} rows: {file_path}")
+    try:
+        layout = scan_layout(file_path, chunksize)
+    except Exception as e:
+        print(f"Error reading file: {e}")
+        return None
 
-# Step 2: Identify rows with all-uppercase text in the 'Brand' or 'Stock' columns (potential headers)
-uppercase_rows = df[(df['Brand'].str.isupper()) | (df['Stock'].str.isupper())]
+    os.makedirs(output_dir, exist_ok=True)
+    cleaned_file_path = os.path.join(output_dir, "1cleaned_data.csv")
+    grouped_file_path = os.path.join(output_dir, "1grouped_data.csv")
 
-# Step 3: Remove rows that appear to be irrelevant information (e.g., "Inventory Report")
-# Define a list of keywords that signify non-relevant rows
-irrelevant_keywords = [
+    grouped_parts = []
+    rows = 0
+    header_written = False
+    chunks = pd.read_csv(file_path, chunksize=chunksize, usecols=layout['columns'],
+                         dtype=layout['dtypes'], **READ_OPTIONS)
+    for chunk in chunks:
+        with instrument.span('clean', file=file_path) as span:
+            # Keep the column order of the file, as a single read would
+            chunk = chunk[layout['columns']].dropna(how='all')
+            if chunk.empty:
+                continue
+            if layout['split_width'] is not None:
+                chunk = chunk.iloc[:, 0].str.split(FIELD_SPLIT_PATTERN, expand=True)
+                chunk = chunk.reindex(columns=range(layout['split_width']))
+
+            chunk = clean_parsed_frame(chunk, verbose=False)
+            if chunk_callback is not None:
+                chunk_callback(chunk)
+            grouped_parts.append(group_by_category(chunk))
+            chunk.to_csv(cleaned_file_path, index=True, mode='a' if header_written else 'w', header=not header_written)
+            span.add(rows=len(chunk))
+        header_written = True
+        rows += len(chunk)
+        instrument.debug(f"Processed {rows} rows")
+
+    # Combine the per-chunk sums into the per-Category totals
+    grouped_df = pd.concat(grouped_parts).groupby('Category', sort=True).sum().reset_index()
+    print(f"Cleaned data saved to {cleaned_file_path}")
+    grouped_df.to_csv(grouped_file_path, index=True)
+    print(f"Grouped data saved to {grouped_file_path}")
+    return grouped_df
+
+# Function to fold one file into the running rollups (rollups.py) and rewrite
+# the grouped reports from the totals over every file rolled up so far.
+# Only the difference to the file's previous contribution is applied, and a
+# file whose content is unchanged is not parsed at all. Returns True if the
+# file was parsed (and 1cleaned_data.csv rewritten).
+def update_rollups(file_path, rollups, output_dir="output", chunksize=None, vendor=None):
+    source_id = os.path.abspath(file_path)
+    content_hash = hash_file(file_path)
+    if rollups.is_current(source_id, content_hash):
+        print(f"{file_path} is unchanged; the rollups are current.")
+        parsed = False
+    else:
+        if chunksize:
+            contributions = {}
+            def collect(chunk):
+                merge_contributions(contributions, contributions_from_frame(chunk, vendor))
+            if parse_data_chunked(file_path, output_dir, chunksize, chunk_callback=collect) is None:
+                return False
+        else:
+            result = parse_data(file_path, output_dir)
+            if result is None:
+                return False
+            contributions = contributions_from_frame(result[0], vendor)
+        touched = rollups.apply(source_id, contributions, content_hash)
+        rollups.save()
+        print(f"Rollups updated: {touched} groups changed, {len(rollups.sources)} files rolled up")
+        parsed = True
+
+    for path in rollups.write_reports(output_dir).values():
+        print(f"Rollup report saved to {path}")
+    return parsed
+
+# Keywords marking report rows that are not inventory data (e.g. "Inventory Report")
+IRRELEVANT_KEYWORDS = [
     'INVENTORY REPORT', 'SCANNED ON'
 ]
-# Filter out rows containing these keywords
-df_cleaned = df[~df['Brand'].str.upper().isin(irrelevant_keywords) &
-                ~df['Stock'].str.upper().isin(irrelevant_keywords)]
-
-# Step 4: Set any remaining 'Brand' rows that are all-uppercase as column headers if needed
-if not uppercase_rows.empty:
-    new_headers = uppercase_rows.iloc[0].tolist()  # Use the first uppercase row as headers
-    df_cleaned.columns = [col if not new else new for col, new in zip(df_cleaned.columns, new_headers)]
-
-# Step 5: Replace remaining empty strings with actual empty spaces
-df_cleaned = df_cleaned.replace('', ' ')
-
-# Display the cleaned DataFrame's structure
-df_cleaned.head()
-print(df_cleaned.head())
-# Step 1: Realign data in rows that seem shifted based on the presence of numeric values
+
+# Column names given to the realigned data; extra columns become Extra_0, Extra_1, ...
+ADVANCED_COLUMNS = [
+    'Brand', 'Date', 'Day', 'Index', 'Beverage', 'Beer', 'Wine', 'Liquor',
+    'Price', 'Item #', 'Pack Size', 'Labor', 'Cash Flow',
+    'Ordered', 'Quantity', 'Unit Cost', 'Ext Value'
+]
+
+# Numeric columns and the type they are coerced to
+NUMERIC_COLUMNS = {'Quantity': int, 'Unit Cost': float, 'Ext Value': float}
+
+# Function to load a cleaned CSV (1cleaned_data.csv) for the advanced cleaning
+def load_cleaned_data(file_path):
+    df = pd.read_csv(file_path)
+
+    # Step 1: Replace NaN values with empty strings for easier processing
+    df = df.fillna('')
+
+    # Step 2: Identify rows with all-uppercase text in the 'Brand' or 'Stock' columns (potential headers)
+    text_columns = [col for col in ['Brand', 'Stock'] if col in df.columns]
+    uppercase = pd.Series(False, index=df.index)
+    irrelevant = pd.Series(False, index=df.index)
+    for col in text_columns:
+        values = df[col].astype(str)
+        uppercase |= values.str.isupper()
+        # Step 3: Remove rows that appear to be irrelevant information (e.g., "Inventory Report")
+        irrelevant |= values.str.upper().isin(IRRELEVANT_KEYWORDS)
+    uppercase_rows = df[uppercase]
+    df_cleaned = df[~irrelevant]
+
+    # Step 4: Set any remaining 'Brand' rows that are all-uppercase as column headers if needed
+    if not uppercase_rows.empty:
+        new_headers = uppercase_rows.iloc[0].tolist()  # Use the first uppercase row as headers
+        df_cleaned.columns = [col if not new else new for col, new in zip(df_cleaned.columns, new_headers)]
+
+    # Step 5: Replace remaining empty strings with actual empty spaces
+    return df_cleaned.replace('', ' ')
+
+# Per-row realignment, kept as the reference implementation for the tests (tests/test_cleanup.py)
 def realign_row(row):
     # Check if 'Brand' column is empty and the subsequent columns have values
     if row['Brand'].strip() == '' and any(str(row[col]).strip() for col in row.index[1:]):
@@ -211,44 +346,118 @@ def realign_row(row):
         return pd.Series(values, index=row.index)
     return row
 
-# Apply the realignment function to each row
-df_realigned = df_cleaned.apply(realign_row, axis=1)
-
-# Step 2: Consolidate redundant columns by merging related fields
-# Identify related fields for merging based on similarities in column names or types
-df_realigned['Quantity'] = pd.to_numeric(df_realigned['Quantity'], errors='coerce').fillna(0).astype(int)
-df_realigned['Unit Cost'] = pd.to_numeric(df_realigned['Unit Cost'], errors='coerce').fillna(0).astype(float)
-df_realigned['Ext Value'] = pd.to_numeric(df_realigned['Ext Value'], errors='coerce').fillna(0).astype(float)
-
-# Step 3: Replace any remaining empty strings with spaces for uniformity
-df_realigned = df_realigned.replace('', ' ')
-
-# Display the fully cleaned DataFrame's structure
-df_realigned.head()
-print(df_realigned.head())
-# Step 1: Rename columns to better reflect their intended content
-df_realigned.columns = [
-    'Brand', 'Date', 'Day', 'Index', 'Beverage', 'Beer', 'Wine', 'Liquor',
-    'Price', 'Item #', 'Pack Size', 'Labor', 'Cash Flow',
-    'Ordered', 'Quantity', 'Unit Cost', 'Ext Value'
-] + [f'Extra_{i}' for i in range(len(df_realigned.columns) - 17)]
-
-# Step 2: Drop redundant or non-informative columns that contain only zeros or empty spaces
-columns_to_drop = [col for col in df_realigned.columns if df_realigned[col].replace(' ', '').eq(0).all()]
-df_final = df_realigned.drop(columns=columns_to_drop)
-
-# Step 3: Remove any rows that still don't contain meaningful information
-df_final = df_final[df_final['Brand'].str.strip().ne('') | df_final['Beverage'].str.strip().ne('')]
-
-# Step 4: Reorganize rows with meaningful data and reset the index for clarity
-df_final = df_final.reset_index(drop=True)
-
-# Display the final cleaned DataFrame
-df_final.head()
-print(df_final.head())
-# Save the final cleaned DataFrame to a new CSV file for further review
-output_file_path = 'F:/repogit/XseLLer8/output/1advanced_cleaned_data.csv'
-df_final.to_csv(output_file_path, index=False)
-
-# Provide the path to the saved file for download
-output_file_path
+# Function to realign rows that seem shifted: rows with an empty 'Brand' and
+# values in later columns have their non-empty cells moved to the left, padded
+# with ''. Same result as df.apply(realign_row, axis=1), done on whole arrays.
+def realign_rows(df):
+    if df.empty:
+        return df.copy()
+    non_empty = df.astype(str).apply(lambda col: col.str.strip().ne('')).to_numpy()
+    brand_empty = ~non_empty[:, df.columns.get_loc('Brand')]
+    shift = brand_empty & non_empty[:, 1:].any(axis=1)
+    if not shift.any():
+        return df.copy()
+
+    values = df.to_numpy(dtype=object, copy=True)
+    rows = values[shift]
+    keep = non_empty[shift]
+    # A stable sort on "is empty" puts the non-empty cells first, in their original order
+    order = np.argsort(~keep, axis=1, kind='stable')
+    rows = np.take_along_axis(rows, order, axis=1)
+    rows[np.arange(rows.shape[1]) >= keep.sum(axis=1)[:, None]] = ''
+    values[shift] = rows
+
+    # Rebuild the frame the way DataFrame.apply does, so the column dtypes match:
+    # rows of a frame of only string columns stay strings, other rows are inferred
+    result = pd.DataFrame(values, index=df.index, columns=df.columns, dtype=object)
+    if all(isinstance(dtype, pd.StringDtype) for dtype in df.dtypes):
+        return result.astype(df.dtypes.to_dict())
+    return result.infer_objects()
+
+# Function to convert the numeric columns in one batch, with invalid values as 0
+def coerce_numeric_columns(df):
+    columns = [col for col in NUMERIC_COLUMNS if col in df.columns]
+    df = df.copy()
+    df[columns] = df[columns].apply(pd.to_numeric, errors='coerce').fillna(0).astype(
+        {col: NUMERIC_COLUMNS[col] for col in columns})
+    return df
+
+# Function to find the columns that only contain zeros (ignoring ' ' cells), in a single pass
+def find_dead_columns(df):
+    dead = df.replace(' ', '').eq(0).all(axis=0)
+    return dead.index[dead.to_numpy()].tolist()
+
+# Function to run the advanced cleaning on the output of load_cleaned_data
+def advanced_clean(df_cleaned):
+    # Step 1: Realign data in rows that seem shifted based on the presence of numeric values
+    with instrument.span('realign') as span:
+        df_realigned = realign_rows(df_cleaned)
+        span.add(rows=len(df_realigned))
+
+    # Step 2: Consolidate redundant columns by merging related fields
+    df_realigned = coerce_numeric_columns(df_realigned)
+
+    # Step 3: Replace any remaining empty strings with spaces for uniformity
+    df_realigned = df_realigned.replace('', ' ')
+
+    # Step 4: Rename columns to better reflect their intended content
+    df_realigned.columns = ADVANCED_COLUMNS + [f'Extra_{i}' for i in range(len(df_realigned.columns) - len(ADVANCED_COLUMNS))]
+
+    # Step 5: Drop redundant or non-informative columns that contain only zeros
+    df_final = df_realigned.drop(columns=find_dead_columns(df_realigned))
+
+    # Step 6: Remove any rows that still don't contain meaningful information
+    df_final = df_final[df_final['Brand'].str.strip().ne('') | df_final['Beverage'].str.strip().ne('')]
+
+    # Step 7: Reorganize rows with meaningful data and reset the index for clarity
+    return df_final.reset_index(drop=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clean extracted inventory text into CSV files")
+    parser.add_argument('file_path', nargs='?', default=os.path.join(REPO_ROOT, 'output', 'newextracted.txt'),
+                        help="tab-delimited extracted text (default: output/newextracted.txt)")
+    parser.add_argument('--output-dir', default=os.path.join(REPO_ROOT, 'output'), help="folder for the CSV outputs")
+    parser.add_argument('--skip-parse', action='store_true', help="only run the advanced cleaning of 1cleaned_data.csv")
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help="parse the file in chunks of this many rows to bound memory use")
+    parser.add_argument('--rollups', default=None,
+                        help="rollup snapshot file; fold the file into the running category/vendor/month totals "
+                             "and write the grouped reports from them")
+    parser.add_argument('--vendor', default=None, help="vendor of the file's rows, for the vendor rollup")
+    parser.add_argument('--report-formats', nargs='+', choices=report_export.FORMATS, default=['csv'],
+                        help="formats of the advanced cleaned report, written in one pass (default: csv)")
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+    instrument.configure_from_args(args)
+
+    cleaned_path = os.path.join(args.output_dir, "1cleaned_data.csv")
+    if not args.skip_parse and args.rollups:
+        if not update_rollups(args.file_path, Rollups(args.rollups), args.output_dir,
+                              chunksize=args.chunksize, vendor=args.vendor):
+            # Nothing was parsed, so 1cleaned_data.csv is not this file's
+            sys.exit(0)
+    elif not args.skip_parse and args.chunksize:
+        grouped_df = parse_data_chunked(args.file_path, args.output_dir, args.chunksize)
+        if grouped_df is not None:
+            instrument.debug("\nGrouped DataFrame:")
+            instrument.debug(grouped_df.head())
+    elif not args.skip_parse:
+        result = parse_data(args.file_path, args.output_dir)
+        if result is not None:
+            df, grouped_df = result
+            # Output the modified DataFrame
+            instrument.debug("\nParsed DataFrame:")
+            instrument.debug(df.head())
+
+            # Output the grouped DataFrame
+            instrument.debug("\nGrouped DataFrame:")
+            instrument.debug(grouped_df.head())
+
+    df_final = advanced_clean(load_cleaned_data(cleaned_path))
+
+    # Display the final cleaned DataFrame
+    instrument.debug(df_final.head())
+    # Save the final cleaned DataFrame to a new CSV file for further review
+    output_file_path = os.path.join(args.output_dir, '1advanced_cleaned_data.csv')
+    for path in report_export.export_frame(df_final, output_file_path, args.report_formats).values():
+        print(f"Advanced cleaned data saved to {path}")
@@ -0,0 +1,162 @@
+import os
+import sys
+import json
+import argparse
+
+import instrument
+
+# Streaming workbook extraction.
+#
+# Every sheet of a workbook is read with openpyxl in read-only, values-only
+# mode, one row at a time, so memory use follows the widest row instead of the
+# largest sheet. Empty rows are skipped and only the non-empty cells of a row
+# are kept, so wide, sparse layouts cost nothing for their empty columns.
+#
+# Rows come out as records:
+#   {'sheet': 'Inventory', 'row': 12, 'values': {'Item': 'Vodka 750ml', 'Qty': 4}}
+# Cells are named by the sheet's header row once one has been seen, and by
+# their column letter before that or where the header is blank. A header row is
+# a row of at least MIN_HEADER_CELLS text cells and no numbers; a later row like
+# that with more cells replaces it (a banner row such as "SALES  EXPENSES  COSTS"
+# above the real column names). Headers are only looked for above the first
+# data row of a sheet: the first row after the header that does not replace it,
+# or a row with numbers before any header. Text-only rows below it (all-text
+# items) are data, not new headers.
+#
+# Legacy .xls files are read with xlrd, one sheet at a time, if it is installed.
+
+# Minimum number of text cells for a row to be taken as the header row
+MIN_HEADER_CELLS = 3
+
+# Separator between the cells of a row in the text output
+CELL_SEPARATOR = '  '
+
+# Function to turn a zero-based column index into its letter (0 -> A, 27 -> AB)
+def column_letter(index):
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+# Function to check whether a cell value is empty
+def _is_empty(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+# Function to check whether the non-empty cells of a row are all text
+def _is_text_row(cells):
+    return all(isinstance(value, str) for index, value in cells)
+
+# Function to check whether the non-empty cells of a row look like a header
+# (or, with a header already seen, like the column names below a banner row)
+def _is_header(cells, header):
+    if len(cells) < MIN_HEADER_CELLS or len(cells) <= len(header or ()):
+        return False
+    return _is_text_row(cells)
+
+# Function to build the cell names of a header row
+def _header_names(cells):
+    names = {}
+    seen = set()
+    for index, value in cells:
+        name = ' '.join(value.split())
+        if name in seen:
+            name = f"{name} ({column_letter(index)})"
+        seen.add(name)
+        names[index] = name
+    return names
+
+# Function to turn the rows of one sheet into records
+def iter_sheet_records(sheet_name, rows):
+    header = None
+    in_data = False
+    for row_number, row in enumerate(rows, start=1):
+        cells = [(index, value) for index, value in enumerate(row) if not _is_empty(value)]
+        if not cells:
+            continue
+        if not in_data:
+            if _is_header(cells, header):
+                header = _header_names(cells)
+            elif header is not None or not _is_text_row(cells):
+                # The first data row; the header stays as it is for the rest of the sheet
+                in_data = True
+        names = header or {}
+        yield {
+            'sheet': sheet_name,
+            'row': row_number,
+            'values': {names.get(index) or column_letter(index): value for index, value in cells},
+        }
+
+# Function to read the rows of every sheet of an .xlsx workbook
+def _iter_xlsx_sheets(workbook_file):
+    import openpyxl
+    workbook = openpyxl.load_workbook(workbook_file, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            # Some writers store a wrong sheet size; without it openpyxl reads
+            # the rows that are actually there
+            sheet.reset_dimensions()
+            yield sheet.title, sheet.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+# Function to read the rows of every sheet of a legacy .xls workbook
+def _iter_xls_sheets(workbook_file):
+    try:
+        import xlrd
+    except ImportError:
+        raise ImportError("Reading .xls workbooks needs the xlrd package") from None
+    workbook = xlrd.open_workbook(workbook_file, on_demand=True)
+    try:
+        for index in range(workbook.nsheets):
+            sheet = workbook.sheet_by_index(index)
+            yield sheet.name, (sheet.row_values(row) for row in range(sheet.nrows))
+            workbook.unload_sheet(index)
+    finally:
+        workbook.release_resources()
+
+# Function to yield the records of every sheet of a workbook, sheet by sheet
+def iter_workbook_records(workbook_file):
+    if os.path.splitext(workbook_file)[1].lower() == '.xls':
+        sheets = _iter_xls_sheets(workbook_file)
+    else:
+        sheets = _iter_xlsx_sheets(workbook_file)
+    for sheet_name, rows in sheets:
+        count = 0
+        for record in iter_sheet_records(sheet_name, rows):
+            count += 1
+            yield record
+        instrument.count('excel_rows', count)
+
+# Function to render a cell value as text
+def format_value(value):
+    if isinstance(value, float):
+        # Drop float noise such as 54.339999999999996
+        return str(int(value)) if value.is_integer() else repr(round(value, 10))
+    if hasattr(value, 'isoformat'):
+        return value.isoformat(sep=' ') if hasattr(value, 'hour') else value.isoformat()
+    return ' '.join(str(value).split())
+
+# Function to yield a workbook as text: the sheet name, then one line per
+# non-empty row with its cells separated by CELL_SEPARATOR
+def iter_workbook_text(workbook_file):
+    current_sheet = None
+    for record in iter_workbook_records(workbook_file):
+        if record['sheet'] != current_sheet:
+            yield ('\n' if current_sheet is not None else '') + record['sheet'] + '\n'
+            current_sheet = record['sheet']
+        yield CELL_SEPARATOR.join(format_value(value) for value in record['values'].values()) + '\n'
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream the rows of every sheet of a workbook")
+    parser.add_argument('workbook_file', help=".xlsx or .xls workbook")
+    parser.add_argument('--json', action='store_true', help="write one JSON record per line instead of text")
+    args = parser.parse_args()
+
+    if args.json:
+        for record in iter_workbook_records(args.workbook_file):
+            sys.stdout.write(json.dumps(record, default=format_value) + '\n')
+    else:
+        for chunk in iter_workbook_text(args.workbook_file):
+            sys.stdout.write(chunk)
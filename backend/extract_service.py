@@ -0,0 +1,365 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import App
+import instrument
+from extraction_cache import ExtractionCache
+from inventory_store import InventoryStore, DEFAULT_INVENTORY_PATH
+from inventory_query import InventoryIndex, run_query
+from item_resolver import ItemResolver, DEFAULT_RESOLVER_PATH
+from job_queue import JobQueue, QueueFull, DEFAULT_QUEUE_PATH, DEFAULT_MAX_QUEUED, FINISHED_STATUSES
+
+# Long-lived extraction service used by server.js instead of starting a new
+# Python process per upload. The extractor modules are imported once, and jobs
+# run on a fixed pool of worker processes.
+#
+# Extract requests go through the job queue (job_queue.py): the same file
+# content is extracted once, interactive requests run before bulk imports, and
+# failed jobs are retried. A dispatcher thread hands due jobs to the pool, never
+# more than there are workers, and also picks up jobs queued by other
+# processes (the job_queue.py CLI). When the queue is full, requests fail with
+# "code": "queue_full" instead of queueing more work.
+#
+# Protocol: one JSON object per line on stdin, one JSON response per line on
+# stdout, matched by "id".
+#   {"id": 1, "op": "extract", "path": "uploads/abc", "extractor": "image"}
+#       -> {"id": 1, "ok": true, "text": "...", "rows": [...]}
+#       -> {"id": 1, "ok": false, "error": "..."}
+#   {"id": 2, "op": "health"}   -> {"id": 2, "ok": true, "status": "ok", ...}
+#   {"id": 3, "op": "shutdown"} -> {"id": 3, "ok": true}
+#   {"id": 4, "op": "inventory", "item_number": "BB4043", "category": null, "limit": 100}
+#       -> {"id": 4, "ok": true, "rows": [...]}
+#   {"id": 5, "op": "update_inventory", "rows": [{"id": 41, ...}, ...]}
+#       -> {"id": 5, "ok": true, "count": 12}
+#   {"id": 5, "op": "replace_inventory", "rows": [...], "source_file": "invoice.txt"}
+#       -> {"id": 5, "ok": true, "count": 12}
+#   {"id": 6, "op": "query", "name": "category_totals", "params": {"date_from": "2024-03-01", "vendor": "..."}}
+#       -> {"id": 6, "ok": true, "result": ...}
+#   {"id": 7, "op": "resolve_items", "rows": [...], "source_file": "invoice.txt"}
+#       -> {"id": 7, "ok": true, "results": [{"item_id": "BB4043", "score": 0.93, "key": "...", "method": "match"}, ...]}
+#   {"id": 8, "op": "review_items", "limit": 50}
+#       -> {"id": 8, "ok": true, "queue": [...]}
+#   {"id": 9, "op": "enqueue", "path": "uploads/abc", "name": "invoice.pdf", "priority": "bulk", "delete_after": true}
+#       -> {"id": 9, "ok": true, "job": {"id": 42, "status": "queued", ...}, "duplicate": false}
+#   {"id": 10, "op": "enqueue_folder", "path": "imports/march", "priority": "bulk"}
+#       -> {"id": 10, "ok": true, "jobs": [...], "duplicates": 3, "skipped": [...]}
+#   {"id": 11, "op": "job", "job_id": 42}
+#       -> {"id": 11, "ok": true, "job": {"id": 42, "status": "done", "result": {"text": "...", "rows": [...]}, ...}}
+#   {"id": 12, "op": "jobs", "status": "failed", "limit": 100}
+#       -> {"id": 12, "ok": true, "jobs": [...], "stats": {"queued": 4, "running": 2, ...}}
+# "extract" answers once the job is finished; "enqueue" answers right away and
+# the job is polled with "job".
+# "extractor" is optional and names one of App.EXTRACTORS for files saved
+# without an extension (multer upload names); "name", the original file name,
+# picks the extractor by its extension instead. Requests the queue refuses
+# (unknown extractor or priority, unsupported file type) fail with
+# "code": "bad_request" and are never queued. Inventory requests are answered
+# by the service process itself from the inventory store and its in-memory
+# query index (inventory_query.py); they are lookups and do not need a worker.
+# Item resolution requests are answered the same way by the item resolver
+# (item_resolver.py).
+
+# Cache used by each worker process (set up by _init_worker)
+_worker_cache = None
+
+def _init_worker(cache_dir):
+    global _worker_cache
+    # Workers share the parent's stdout, which is reserved for responses
+    sys.stdout = sys.stderr
+    if cache_dir:
+        _worker_cache = ExtractionCache(cache_dir)
+
+# Function run in a worker process for one extract job. The worker's
+# instrumentation totals go back under 'metrics' (on the exception if it fails).
+def run_extract_job(file_path, extractor=None):
+    try:
+        text = App.extract_file(file_path, cache=_worker_cache, extractor=extractor)
+        if text is None:
+            raise ValueError(f"Unsupported file type: {file_path}")
+        cleaned = App.PUNCTUATION_PATTERN.sub('', text)
+        df = App.extract_data_with_headers(cleaned)
+    except Exception as e:
+        e.metrics = instrument.collect()
+        raise
+    # to_json writes missing values as null, which the Node side can parse
+    rows = json.loads(df.to_json(orient='records')) if not df.empty else []
+    return {'text': text, 'rows': rows, 'metrics': instrument.collect()}
+
+# Function to get the extractor of a request: the one it names, else the one
+# for the extension of its original file name
+def request_extractor(request):
+    if request.get('extractor'):
+        return request['extractor']
+    if request.get('name'):
+        return App.get_extractor_name(request['name'])
+    return None
+
+# Seconds the dispatcher waits between checks for jobs queued by other
+# processes or retries that became due
+POLL_INTERVAL = 0.5
+
+# Errors that a retry cannot fix
+PERMANENT_ERRORS = (ValueError, FileNotFoundError)
+
+class ExtractionService:
+    def __init__(self, workers, max_queued=DEFAULT_MAX_QUEUED, cache_dir=None, out=None,
+                 inventory_path=DEFAULT_INVENTORY_PATH, resolver_path=DEFAULT_RESOLVER_PATH,
+                 queue_path=DEFAULT_QUEUE_PATH):
+        self.workers = workers
+        self.out = out or sys.stdout
+        self.started = time.time()
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cache_dir,))
+        self._queue = JobQueue(queue_path, max_queued=max_queued)
+        recovered = self._queue.recover()
+        if recovered:
+            print(f"Queued {recovered} jobs again that were running when the service stopped", file=sys.stderr)
+        # Request ids waiting for each job, answered when the job is finished
+        self._waiters = {}
+        self._wake = threading.Event()
+        self._stopping = False
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name='job-dispatcher', daemon=True)
+        self._dispatcher.start()
+        self.inventory_path = inventory_path
+        self._store = None
+        self._index = None
+        self.resolver_path = resolver_path
+        self._resolver = None
+
+    # Function to open the inventory store on first use
+    def store(self):
+        if self._store is None:
+            self._store = InventoryStore(self.inventory_path)
+        return self._store
+
+    # Function to answer an inventory request from the store or the query index
+    def handle_inventory(self, request):
+        store = self.store()
+        if request['op'] == 'query':
+            if self._index is None:
+                self._index = InventoryIndex(store)
+            return {'result': run_query(self._index, request.get('name'), request.get('params'))}
+        if request['op'] == 'inventory':
+            filters = {name: request.get(name) for name in
+                       ('item_number', 'category', 'source_file', 'vendor', 'status', 'date_from', 'date_to', 'limit')}
+            return {'rows': store.find(offset=request.get('offset') or 0, **filters)}
+        rows = request.get('rows') or []
+        if isinstance(rows, dict):
+            rows = [row for row in rows.values() if isinstance(row, dict)]
+        if request['op'] == 'replace_inventory':
+            return {'count': store.replace_source_files([request.get('source_file') or ''], rows)}
+        return {'count': store.update_rows(rows, source_file=request.get('source_file'))}
+
+    # Function to answer an item resolution request
+    def handle_items(self, request):
+        if self._resolver is None:
+            self._resolver = ItemResolver(self.resolver_path)
+        if request['op'] == 'review_items':
+            return {'queue': self._resolver.review_queue(request.get('limit') or 50, request.get('offset') or 0)}
+        rows = request.get('rows') or []
+        if isinstance(rows, dict):
+            rows = [row for row in rows.values() if isinstance(row, dict)]
+        return {'results': self._resolver.resolve_rows(rows, source_file=request.get('source_file'))}
+
+    def send(self, message):
+        line = json.dumps(message)
+        with self._lock:
+            self.out.write(line + '\n')
+            self.out.flush()
+
+    def health(self):
+        return {
+            'status': 'ok',
+            'pid': os.getpid(),
+            'uptime': round(time.time() - self.started, 3),
+            'workers': self.workers,
+            'active': self.active,
+            'completed': self.completed,
+            'failed': self.failed,
+            'queue': self._queue.stats(),
+        }
+
+    # Function to queue one extract request. The request is answered when its
+    # job (possibly an earlier job for the same content) is finished.
+    def submit(self, request_id, file_path, extractor=None, priority='interactive'):
+        with self._lock:
+            job, _ = self._queue.submit(file_path, extractor, priority)
+            if job['status'] not in FINISHED_STATUSES:
+                self._waiters.setdefault(job['id'], []).append(request_id)
+        if job['status'] in FINISHED_STATUSES:
+            self.send(self._job_response(request_id, job))
+        else:
+            self._wake.set()
+
+    # Function to build the response to an extract request from a finished job
+    @staticmethod
+    def _job_response(request_id, job):
+        if job['status'] == 'failed':
+            return {'id': request_id, 'ok': False, 'error': job['error'], 'job_id': job['id']}
+        response = {'id': request_id, 'ok': True, 'job_id': job['id']}
+        response.update(job['result'])
+        return response
+
+    # Function run by the dispatcher thread: start due jobs while workers are free
+    def _dispatch_loop(self):
+        while not self._stopping:
+            while self.active < self.workers and not self._stopping:
+                job = self._queue.claim()
+                if job is None:
+                    break
+                with self._lock:
+                    self.active += 1
+                future = self._pool.submit(run_extract_job, job['path'], job['extractor'])
+                future.add_done_callback(lambda f, job=job: self._finish(job, f))
+            self._wake.wait(POLL_INTERVAL)
+            self._wake.clear()
+
+    def _finish(self, job, future):
+        try:
+            result = future.result()
+            instrument.merge(result.pop('metrics', None))
+            job = self._queue.complete(job['id'], result)
+            with self._lock:
+                self.completed += 1
+        except Exception as e:
+            instrument.merge(getattr(e, 'metrics', None))
+            job = self._queue.fail(job['id'], f"{type(e).__name__}: {e}", retry=not isinstance(e, PERMANENT_ERRORS))
+            if job['status'] == 'failed':
+                with self._lock:
+                    self.failed += 1
+        with self._lock:
+            self.active -= 1
+            waiters = self._waiters.pop(job['id'], []) if job['status'] in FINISHED_STATUSES else []
+        self._wake.set()
+        for request_id in waiters:
+            self.send(self._job_response(request_id, job))
+
+    # Function to answer a job queue request
+    def handle_jobs(self, request):
+        op = request['op']
+        if op == 'enqueue':
+            job, duplicate = self._queue.submit(request['path'], request_extractor(request),
+                                                request.get('priority') or 'interactive',
+                                                delete_after=bool(request.get('delete_after')))
+            self._wake.set()
+            return {'job': job, 'duplicate': duplicate}
+        if op == 'enqueue_folder':
+            result = self._queue.submit_folder(request['path'], request.get('extractor'),
+                                               request.get('priority') or 'bulk')
+            self._wake.set()
+            return result
+        if op == 'job':
+            job = self._queue.get(request.get('job_id'))
+            if job is None:
+                raise KeyError(f"Unknown job {request.get('job_id')}")
+            return {'job': job}
+        return {'jobs': self._queue.list_jobs(request.get('status'), request.get('limit') or 100,
+                                              request.get('offset') or 0),
+                'stats': self._queue.stats()}
+
+    # Function to handle one request line
+    def handle(self, line):
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            self.send({'id': None, 'ok': False, 'error': f"Invalid request: {e}"})
+            return True
+
+        job_id = request.get('id')
+        op = request.get('op')
+        if op in ('extract', 'enqueue', 'enqueue_folder') and not request.get('path'):
+            self.send({'id': job_id, 'ok': False, 'error': "Missing 'path'"})
+        elif op == 'extract':
+            try:
+                self.submit(job_id, request['path'], request_extractor(request),
+                            request.get('priority') or 'interactive')
+            except QueueFull as e:
+                self.send({'id': job_id, 'ok': False, 'error': f"Queue is full: {e}", 'code': 'queue_full'})
+            except ValueError as e:
+                self.send({'id': job_id, 'ok': False, 'error': str(e), 'code': 'bad_request'})
+            except Exception as e:
+                self.send({'id': job_id, 'ok': False, 'error': f"{type(e).__name__}: {e}"})
+        elif op in ('inventory', 'update_inventory', 'replace_inventory', 'query', 'resolve_items', 'review_items',
+                    'enqueue', 'enqueue_folder', 'job', 'jobs'):
+            try:
+                response = {'id': job_id, 'ok': True}
+                if op in ('resolve_items', 'review_items'):
+                    response.update(self.handle_items(request))
+                elif op in ('enqueue', 'enqueue_folder', 'job', 'jobs'):
+                    response.update(self.handle_jobs(request))
+                else:
+                    response.update(self.handle_inventory(request))
+            except QueueFull as e:
+                response = {'id': job_id, 'ok': False, 'error': f"Queue is full: {e}", 'code': 'queue_full'}
+            except ValueError as e:
+                response = {'id': job_id, 'ok': False, 'error': str(e), 'code': 'bad_request'}
+            except Exception as e:
+                response = {'id': job_id, 'ok': False, 'error': f"{type(e).__name__}: {e}"}
+            self.send(response)
+        elif op == 'health':
+            response = {'id': job_id, 'ok': True}
+            response.update(self.health())
+            self.send(response)
+        elif op == 'shutdown':
+            self.send({'id': job_id, 'ok': True})
+            return False
+        else:
+            self.send({'id': job_id, 'ok': False, 'error': f"Unknown op: {op}"})
+        return True
+
+    # Function to serve requests from a stream until shutdown or end of input
+    def serve(self, stream):
+        try:
+            for line in stream:
+                if line.strip() and not self.handle(line):
+                    break
+        finally:
+            self._stopping = True
+            self._wake.set()
+            self._dispatcher.join()
+            # Running jobs finish and are recorded; queued jobs stay for the next start
+            self._pool.shutdown(wait=True)
+            self._queue.close()
+            if self._store is not None:
+                self._store.close()
+            if self._resolver is not None:
+                self._resolver.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the extraction service over stdin/stdout")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="number of worker processes")
+    parser.add_argument('--max-queued', type=int, default=DEFAULT_MAX_QUEUED,
+                        help="refuse new extract jobs once this many are waiting")
+    parser.add_argument('--queue', default=DEFAULT_QUEUE_PATH, help="job queue database (default: job_queue.sqlite3)")
+    parser.add_argument('--cache-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'extraction'),
+                        help="directory of the extraction cache")
+    parser.add_argument('--no-cache', action='store_true', help="do not use the extraction cache")
+    parser.add_argument('--inventory', default=DEFAULT_INVENTORY_PATH,
+                        help="inventory store database (default: inventory.sqlite3)")
+    parser.add_argument('--resolver', default=DEFAULT_RESOLVER_PATH,
+                        help="item resolver database (default: item_resolver.sqlite3)")
+    args = parser.parse_args()
+
+    # Keep stdout for responses only; anything printed by the pipeline goes to stderr
+    protocol_out = sys.stdout
+    sys.stdout = sys.stderr
+
+    service = ExtractionService(
+        workers=args.workers,
+        max_queued=args.max_queued,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        out=protocol_out,
+        inventory_path=args.inventory,
+        resolver_path=args.resolver,
+        queue_path=args.queue,
+    )
+    print(f"Extraction service ready (pid {os.getpid()}, {args.workers} workers)", file=sys.stderr)
+    service.serve(sys.stdin)
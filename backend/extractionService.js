@@ -0,0 +1,160 @@
+const path = require('path');
+const readline = require('readline');
+const { spawn } = require('child_process');
+
+// Client for the long-lived Python extraction service (extract_service.py).
+// The Python process is started once and reused for every request; requests
+// and responses are single JSON lines matched by id. If the process exits,
+// pending requests are rejected and the next request starts a new one.
+class ExtractionService {
+    constructor({ python = process.env.PYTHON || 'python', workers, logger = console } = {}) {
+        this.python = python;
+        this.workers = workers;
+        this.logger = logger;
+        this.child = null;
+        this.nextId = 1;
+        this.pending = new Map();
+        this.stopping = false;
+    }
+
+    start() {
+        if (this.child) {
+            return this.child;
+        }
+        const args = [path.join(__dirname, 'extract_service.py')];
+        if (this.workers) {
+            args.push('--workers', String(this.workers));
+        }
+        const child = spawn(this.python, args, { cwd: __dirname });
+        this.child = child;
+        this.stopping = false;
+
+        readline.createInterface({ input: child.stdout }).on('line', (line) => {
+            let response;
+            try {
+                response = JSON.parse(line);
+            } catch (error) {
+                this.logger.error(`Invalid response from extraction service: ${line}`);
+                return;
+            }
+            const request = this.pending.get(response.id);
+            if (!request) {
+                return;
+            }
+            this.pending.delete(response.id);
+            if (response.ok) {
+                request.resolve(response);
+            } else {
+                const error = new Error(response.error);
+                // 'queue_full' when the job queue is full, 'bad_request' when it
+                // refused the request (unknown extractor, unsupported file type)
+                error.code = response.code;
+                request.reject(error);
+            }
+        });
+
+        readline.createInterface({ input: child.stderr }).on('line', (line) => {
+            if (line.trim()) {
+                this.logger.info(`Extraction service: ${line}`);
+            }
+        });
+
+        const onExit = (reason) => {
+            if (this.child !== child) {
+                return;
+            }
+            this.child = null;
+            if (this.stopping) {
+                this.logger.info(`Extraction service stopped: ${reason}`);
+            } else {
+                this.logger.error(`Extraction service stopped: ${reason}`);
+            }
+            for (const request of this.pending.values()) {
+                request.reject(new Error(`Extraction service stopped: ${reason}`));
+            }
+            this.pending.clear();
+        };
+        child.on('exit', (code, signal) => onExit(signal || `exit code ${code}`));
+        child.on('error', (error) => onExit(error.message));
+        return child;
+    }
+
+    request(message) {
+        const child = this.start();
+        const id = this.nextId++;
+        return new Promise((resolve, reject) => {
+            this.pending.set(id, { resolve, reject });
+            child.stdin.write(JSON.stringify({ ...message, id }) + '\n');
+        });
+    }
+
+    // Resolves once the file is extracted; the same content uploaded again
+    // shares the first upload's job
+    extract(filePath, extractor) {
+        return this.request({ op: 'extract', path: path.resolve(filePath), extractor });
+    }
+
+    // Queues a file and resolves right away with { job, duplicate }; poll with job().
+    // Without an extractor the service picks one from the extension of name.
+    enqueue(filePath, { extractor, name, priority = 'interactive', deleteAfter = false } = {}) {
+        return this.request({
+            op: 'enqueue', path: path.resolve(filePath), extractor, name, priority, delete_after: deleteAfter
+        });
+    }
+
+    // Queues every supported file of a folder, by default behind interactive uploads
+    enqueueFolder(folder, { extractor, priority = 'bulk' } = {}) {
+        return this.request({ op: 'enqueue_folder', path: path.resolve(folder), extractor, priority });
+    }
+
+    job(jobId) {
+        return this.request({ op: 'job', job_id: jobId }).then((response) => response.job);
+    }
+
+    jobs({ status, limit, offset } = {}) {
+        return this.request({ op: 'jobs', status, limit, offset });
+    }
+
+    inventory(query = {}) {
+        return this.request({ ...query, op: 'inventory' }).then((response) => response.rows);
+    }
+
+    // Saves edited rows by the id the inventory route returned; rows without an id are added
+    updateInventoryRows(rows) {
+        return this.request({ op: 'update_inventory', rows })
+            .then((response) => response.count);
+    }
+
+    // Replaces every row of a source file, one row per parsed line
+    replaceInventory(rows, sourceFile) {
+        return this.request({ op: 'replace_inventory', rows, source_file: sourceFile })
+            .then((response) => response.count);
+    }
+
+    query(name, params = {}) {
+        return this.request({ op: 'query', name, params }).then((response) => response.result);
+    }
+
+    resolveItems(rows, sourceFile) {
+        return this.request({ op: 'resolve_items', rows, source_file: sourceFile })
+            .then((response) => response.results);
+    }
+
+    reviewItems(limit = 50, offset = 0) {
+        return this.request({ op: 'review_items', limit, offset }).then((response) => response.queue);
+    }
+
+    health() {
+        return this.request({ op: 'health' });
+    }
+
+    stop() {
+        if (this.child) {
+            this.stopping = true;
+            this.child.stdin.write(JSON.stringify({ id: this.nextId++, op: 'shutdown' }) + '\n');
+            this.child.stdin.end();
+        }
+    }
+}
+
+module.exports = ExtractionService;
@@ -0,0 +1,164 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+import instrument
+
+# Default cache size limit (bytes) before least recently used entries are evicted
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+# Size of the blocks used when hashing files and reading cached text
+BLOCK_SIZE = 1024 * 1024
+
+# Function to hash the content of a file
+def hash_file(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        while True:
+            block = file.read(BLOCK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+# Persistent on-disk cache of extracted text.
+# Entries are keyed by content hash + extractor name + extractor version, so a
+# renamed or re-uploaded file is still a hit and a changed extractor is a miss.
+# The text lives in plain files under cache_dir; a small SQLite index keeps the
+# size and last access time of every entry for LRU eviction.
+class ExtractionCache:
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(cache_dir, 'index.sqlite3'), timeout=30, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self._db.commit()
+
+    # Function to build the cache key for a file's content and extractor
+    @staticmethod
+    def make_key(content_hash, extractor, version):
+        return hashlib.sha256(f"{extractor}:{version}:{content_hash}".encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.txt')
+
+    def _touch(self, key):
+        with self._lock:
+            self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+
+    # Function to check whether a key is cached without counting a hit or miss
+    def contains(self, key):
+        return os.path.exists(self._entry_path(key))
+
+    # Function to read a cached entry in full. Returns None on a miss.
+    def get(self, key):
+        try:
+            with open(self._entry_path(key), 'r', encoding='utf-8', newline='') as file:
+                text = file.read()
+        except FileNotFoundError:
+            self.misses += 1
+            instrument.count('cache_miss', cache='extraction')
+            return None
+        self.hits += 1
+        instrument.count('cache_hit', cache='extraction')
+        self._touch(key)
+        return text
+
+    # Function to store the text for a key
+    def put(self, key, text):
+        for _ in self._write_entry(key, [text]):
+            pass
+
+    # Function to stream the text for a key. On a hit the cached text is read
+    # back in blocks; on a miss the chunks from produce() are passed through and
+    # written to the cache at the same time, and stored once they are complete.
+    def iter_cached(self, key, produce):
+        path = self._entry_path(key)
+        try:
+            file = open(path, 'r', encoding='utf-8', newline='')
+        except FileNotFoundError:
+            self.misses += 1
+            instrument.count('cache_miss', cache='extraction')
+            yield from self._write_entry(key, produce())
+            return
+        self.hits += 1
+        instrument.count('cache_hit', cache='extraction')
+        self._touch(key)
+        with file:
+            while True:
+                block = file.read(BLOCK_SIZE)
+                if not block:
+                    break
+                yield block
+
+    # Generator that writes chunks to a temporary file, passing each one through,
+    # and moves the file into place once every chunk has been written
+    def _write_entry(self, key, chunks):
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8', newline='') as file:
+                for chunk in chunks:
+                    file.write(chunk)
+                    yield chunk
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, size, last_access) VALUES (?, ?, ?)",
+                (key, size, time.time()),
+            )
+            self._db.commit()
+        self.evict()
+
+    # Function to evict least recently used entries until the cache fits max_bytes
+    def evict(self):
+        with self._lock:
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = self._db.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall()
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(self._entry_path(key))
+                except FileNotFoundError:
+                    pass
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                total -= size
+                self.evictions += 1
+            self._db.commit()
+
+    # Function to report cache counters and size
+    def stats(self):
+        with self._lock:
+            entries, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': entries,
+            'bytes': total,
+            'max_bytes': self.max_bytes,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
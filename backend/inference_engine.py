@@ -0,0 +1,355 @@
+import os
+import time
+import queue
+import argparse
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
+from concurrent.futures import Future
+
+import AiTemplateBuild
+import model_export
+from extraction_cache import ExtractionCache, hash_file
+
+# Long-lived inference engine for the AiTemplateBuild pipeline
+# (LayoutLMv2 -> predicted text -> tabular GPT -> category).
+#
+# The models are loaded once and reused for every document. Pages are run
+# through LayoutLMv2 in batches, and the tabular inputs of a batch are stacked
+# into one forward pass of the GPT model. Everything runs under
+# torch.inference_mode with a fixed number of CPU threads.
+#
+# The LayoutLMv2 output of a page is cached by the hash of its document, in
+# memory and (with a cache_dir) on disk through the extraction cache, so a
+# re-submitted document skips LayoutLMv2 entirely.
+#
+# The tabular model can be the eager state dict or an int8/TorchScript/ONNX
+# artefact exported with model_export.py (serving_model).
+#
+# Two ways in:
+#   - classify_files(paths): offline, a day's invoices in one pass, batched in order;
+#   - submit(path) -> Future: online, requests from several threads are grouped
+#     by a batching thread that waits at most max_wait seconds to fill a batch.
+
+# Version of the cached LayoutLMv2 output; bump it when the model or decoding changes
+LAYOUT_FEATURE_VERSION = 1
+
+# Default largest batch and longest wait for a batch to fill
+DEFAULT_BATCH_SIZE = 8
+DEFAULT_MAX_WAIT = 0.05
+
+# Number of page features kept in memory
+MEMORY_CACHE_SIZE = 4096
+
+# Image file extensions picked up from folders
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp', '.gif'}
+
+# Function to load every page of an image file as an RGB image
+def load_pages(image_path):
+    from PIL import Image, ImageSequence
+    with Image.open(image_path) as img:
+        return [page.convert('RGB') for page in ImageSequence.Iterator(img)]
+
+# Function to compute a latency percentile (0-100) from a sorted list
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(percent / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+# Latency and throughput counters of an engine
+class InferenceStats:
+    def __init__(self):
+        self.documents = 0
+        self.pages = 0
+        self.batches = 0
+        self.feature_hits = 0
+        self.feature_misses = 0
+        self.latencies = []
+        self.busy_seconds = 0.0
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record_batch(self, pages, seconds):
+        with self._lock:
+            self.batches += 1
+            self.pages += pages
+            self.busy_seconds += seconds
+
+    def record_document(self, latency):
+        with self._lock:
+            self.documents += 1
+            self.latencies.append(latency)
+
+    def as_dict(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            elapsed = time.perf_counter() - self.started
+            return {
+                'documents': self.documents,
+                'pages': self.pages,
+                'batches': self.batches,
+                'mean_batch_size': round(self.pages / self.batches, 2) if self.batches else 0,
+                'feature_cache_hits': self.feature_hits,
+                'feature_cache_misses': self.feature_misses,
+                'latency_p50_ms': round(_percentile(latencies, 50) * 1000, 1) if latencies else None,
+                'latency_p95_ms': round(_percentile(latencies, 95) * 1000, 1) if latencies else None,
+                'pages_per_second': round(self.pages / self.busy_seconds, 2) if self.busy_seconds else 0,
+                'documents_per_second': round(self.documents / elapsed, 2) if elapsed else 0,
+            }
+
+class InferenceEngine:
+    def __init__(self, model_path, checkpoint=AiTemplateBuild.LAYOUTLMV2_CHECKPOINT, threads=None,
+                 batch_size=DEFAULT_BATCH_SIZE, max_wait=DEFAULT_MAX_WAIT, cache_dir=None,
+                 category_transformer_path=AiTemplateBuild.CATEGORY_TRANSFORMER_PATH, serving_model=None):
+        import torch
+        self.torch = torch
+        if threads:
+            torch.set_num_threads(threads)
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait
+        self.stats = InferenceStats()
+
+        AiTemplateBuild.add_category_transformer_path(category_transformer_path)
+        started = time.perf_counter()
+        self.feature_extractor, self.tokenizer, self.layout_model = AiTemplateBuild.load_layoutlmv2(checkpoint)
+        self.layout_model.eval()
+        # An exported artefact (model_export.py) replaces the eager tabular model
+        if serving_model:
+            self.tabular_predictor = model_export.load_predictor(serving_model, threads=threads)
+        else:
+            self.tabular_predictor = model_export.load_eager_predictor(model_path)
+        self.config = SimpleNamespace(n_features=self.tabular_predictor.n_features)
+        self.load_seconds = time.perf_counter() - started
+
+        self.cache = ExtractionCache(cache_dir) if cache_dir else None
+        self._features = OrderedDict()
+        self._queue = queue.Queue()
+        self._worker = None
+        self._stopping = False
+        self._model_lock = threading.Lock()
+
+    # Function to get the cache key of a page's LayoutLMv2 output
+    def _feature_key(self, document_hash, page):
+        return ExtractionCache.make_key(f"{document_hash}:{page}", 'layoutlmv2', LAYOUT_FEATURE_VERSION)
+
+    def _cached_feature(self, key):
+        text = self._features.get(key)
+        if text is not None:
+            self._features.move_to_end(key)
+            return text
+        if self.cache is not None:
+            text = self.cache.get(key)
+            if text is not None:
+                self._remember_feature(key, text)
+        return text
+
+    def _remember_feature(self, key, text):
+        self._features[key] = text
+        self._features.move_to_end(key)
+        while len(self._features) > MEMORY_CACHE_SIZE:
+            self._features.popitem(last=False)
+
+    def _store_feature(self, key, text):
+        self._remember_feature(key, text)
+        if self.cache is not None:
+            self.cache.put(key, text)
+
+    # Function to run LayoutLMv2 over a batch of page images and decode each page
+    def _layout_texts(self, images):
+        inputs = self.feature_extractor(images, return_tensors="pt")
+        outputs = self.layout_model(**inputs)
+        predictions = outputs.logits.argmax(-1)
+        return self.tokenizer.batch_decode(predictions)
+
+    # Function to classify the predicted texts of a batch in one forward pass
+    def _classify_texts(self, texts):
+        torch = self.torch
+        prepared = [AiTemplateBuild.prepare_tabular_inputs(text, self.config) for text in texts]
+        features = torch.cat([features for features, category_features in prepared])
+        category_features = [
+            torch.cat([category_features[i] for features, category_features in prepared])
+            for i in range(len(prepared[0][1]))
+        ]
+        return self.tabular_predictor.predict(features, category_features)
+
+    # Function to run one batch of pages: [(document hash, page number, image or None)].
+    # Pages whose LayoutLMv2 output is cached skip the model.
+    def _run_pages(self, pages):
+        started = time.perf_counter()
+        texts = [None] * len(pages)
+        with self._model_lock, self.torch.inference_mode():
+            missing = []
+            for i, (document_hash, page, image) in enumerate(pages):
+                texts[i] = self._cached_feature(self._feature_key(document_hash, page))
+                if texts[i] is None:
+                    missing.append(i)
+            self.stats.feature_hits += len(pages) - len(missing)
+            self.stats.feature_misses += len(missing)
+            if missing:
+                decoded = self._layout_texts([pages[i][2] for i in missing])
+                for i, text in zip(missing, decoded):
+                    texts[i] = text
+                    self._store_feature(self._feature_key(pages[i][0], pages[i][1]), text)
+            classes = self._classify_texts(texts)
+        self.stats.record_batch(len(pages), time.perf_counter() - started)
+        return texts, classes
+
+    # Function to classify many documents in one pass, batching pages across
+    # documents. Yields {'path', 'pages': [{'page', 'class', 'text'}]} per
+    # document, in input order.
+    def classify_files(self, image_paths):
+        batch = []      # (document index, document hash, page number, image)
+        results = {}
+        pending_pages = {}
+        next_index = 0
+        starts = {}
+
+        def flush():
+            texts, classes = self._run_pages([(document_hash, page, image) for _, document_hash, page, image in batch])
+            for (index, _, page, _), text, predicted_class in zip(batch, texts, classes):
+                results[index]['pages'].append({'page': page, 'class': predicted_class, 'text': text})
+                pending_pages[index] -= 1
+            batch.clear()
+
+        def finished():
+            nonlocal next_index
+            while next_index in results and pending_pages[next_index] == 0:
+                result = results.pop(next_index)
+                result['pages'].sort(key=lambda entry: entry['page'])
+                self.stats.record_document(time.perf_counter() - starts.pop(next_index))
+                yield result
+                next_index += 1
+
+        for index, image_path in enumerate(image_paths):
+            starts[index] = time.perf_counter()
+            document_hash = hash_file(image_path)
+            images = load_pages(image_path)
+            results[index] = {'path': image_path, 'pages': []}
+            pending_pages[index] = len(images)
+            for page, image in enumerate(images):
+                batch.append((index, document_hash, page, image))
+                if len(batch) >= self.batch_size:
+                    flush()
+                    yield from finished()
+        if batch:
+            flush()
+        yield from finished()
+
+    # Function to queue one document for classification from any thread.
+    # The returned Future resolves to the same dict classify_files yields.
+    def submit(self, image_path):
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._batch_loop, name='inference-batcher', daemon=True)
+            self._worker.start()
+        future = Future()
+        self._queue.put((image_path, future, time.perf_counter()))
+        return future
+
+    # Batching thread: collect pages from queued documents until the batch is
+    # full or max_wait has passed since the first one, then run the batch
+    def _batch_loop(self):
+        while not self._stopping:
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if first is None:
+                break
+            requests = [first]
+            page_count = 0
+            deadline = time.perf_counter() + self.max_wait
+            documents = []
+            while True:
+                image_path, future, submitted = requests[-1]
+                try:
+                    images = load_pages(image_path)
+                    documents.append((image_path, future, submitted, hash_file(image_path), images))
+                    page_count += len(images)
+                except Exception as e:
+                    future.set_exception(e)
+                remaining = deadline - time.perf_counter()
+                if page_count >= self.batch_size or remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is None:
+                    self._stopping = True
+                    break
+                requests.append(request)
+            if documents:
+                self._run_documents(documents)
+
+    def _run_documents(self, documents):
+        pages = [(document_hash, page, image)
+                 for _, _, _, document_hash, images in documents
+                 for page, image in enumerate(images)]
+        try:
+            texts, classes = [], []
+            for start in range(0, len(pages), self.batch_size):
+                batch_texts, batch_classes = self._run_pages(pages[start:start + self.batch_size])
+                texts.extend(batch_texts)
+                classes.extend(batch_classes)
+        except Exception as e:
+            for _, future, _, _, _ in documents:
+                future.set_exception(e)
+            return
+        position = 0
+        for image_path, future, submitted, _, images in documents:
+            entries = [{'page': page, 'class': classes[position + page], 'text': texts[position + page]}
+                       for page in range(len(images))]
+            position += len(images)
+            self.stats.record_document(time.perf_counter() - submitted)
+            future.set_result({'path': image_path, 'pages': entries})
+
+    def close(self):
+        if self._worker is not None:
+            self._queue.put(None)
+            self._worker.join()
+            self._worker = None
+        if self.cache is not None:
+            self.cache.close()
+
+# Function to expand folders into the image files they contain, in sorted order
+def list_images(paths):
+    image_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                image_paths.extend(os.path.join(root, name) for name in sorted(files)
+                                   if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS)
+        else:
+            image_paths.append(path)
+    return image_paths
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Classify many document images with one loaded model")
+    parser.add_argument('images', nargs='+', help="image files or folders of images")
+    parser.add_argument('--model-path', default="path/to/your/saved_model.pth",
+                        help="state dict of the trained tabular model")
+    parser.add_argument('--category-transformer-path', default=AiTemplateBuild.CATEGORY_TRANSFORMER_PATH,
+                        help="folder containing model.py and tabular_config.py")
+    parser.add_argument('--threads', type=int, default=None, help="torch CPU threads (default: torch's choice)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="pages per forward pass")
+    parser.add_argument('--cache-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'layout'),
+                        help="directory of the LayoutLMv2 feature cache")
+    parser.add_argument('--no-cache', action='store_true', help="do not cache LayoutLMv2 output on disk")
+    parser.add_argument('--serving-model', default=None,
+                        help="exported tabular model (.pt or .onnx from model_export.py) to use instead of --model-path")
+    args = parser.parse_args()
+
+    engine = InferenceEngine(args.model_path, threads=args.threads, batch_size=args.batch_size,
+                             cache_dir=None if args.no_cache else args.cache_dir,
+                             category_transformer_path=args.category_transformer_path,
+                             serving_model=args.serving_model)
+    print(f"Models loaded in {engine.load_seconds:.2f}s")
+    try:
+        for result in engine.classify_files(list_images(args.images)):
+            classes = ', '.join(str(entry['class']) for entry in result['pages'])
+            print(f"{result['path']}: predicted class {classes}")
+    finally:
+        engine.close()
+    print(f"Inference: {engine.stats.as_dict()}")
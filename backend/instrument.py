@@ -0,0 +1,396 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+
+# Stage-level instrumentation for the extraction pipeline.
+#
+#   with instrument.span('extract', file=file_path) as span:
+#       ...
+#       span.add(rows=len(df), bytes=size)
+#   instrument.count('cache_hit', cache='extraction')
+#
+# A span times one stage for one file (or chunk) and adds its seconds, rows
+# and bytes to the per-stage totals; count() adds to a named counter. With
+# json output every finished span is also written as one JSON line. At exit
+# (or on dump()) the totals are written as JSON or as Prometheus text.
+#
+# One stage can be profiled: with profile_stage set, every span of that stage
+# runs under cProfile (stats written to <stage>.<pid>.prof and the top functions
+# printed) or tracemalloc (peak and top allocation sites).
+#
+# Instrumentation is off by default. Then span() returns a shared object that
+# does nothing and count() returns after one check, so the calls can stay in
+# hot paths. It is switched on with configure(), the --instrument options
+# (add_arguments) or the environment, which also reaches pool workers:
+#   PIPELINE_INSTRUMENT=json|prometheus  PIPELINE_METRICS=<file>
+#   PIPELINE_PROFILE=<stage>[:cprofile|:tracemalloc]  PIPELINE_DEBUG=1
+# Only the process that switched instrumentation on writes the totals. Pool
+# workers log their spans and send their totals back with every result: the
+# worker function returns collect() next to its result and the owner passes
+# it to merge(). A forked worker starts with empty totals, so nothing of the
+# owner's is counted twice.
+
+FORMATS = ('json', 'prometheus')
+PROFILERS = ('cprofile', 'tracemalloc')
+
+# Prefix of the Prometheus metric names
+METRIC_PREFIX = 'pipeline'
+
+# Number of functions / allocation sites shown for a profiled stage
+PROFILE_TOP = 20
+
+# Current settings; see configure()
+_enabled = False
+_debug = False
+_format = 'json'
+_metrics_path = None
+_log = None
+_profile_stage = None
+_profiler = 'cprofile'
+
+_lock = threading.Lock()
+_stages = {}
+_counters = {}
+_profile = None
+_profile_depth = 0
+_tracemalloc_peak = 0
+_atexit_registered = False
+
+# Span used while instrumentation is off
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def add(self, rows=0, bytes=0):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+class Span:
+    def __init__(self, stage, labels):
+        self.stage = stage
+        self.labels = labels
+        self.rows = 0
+        self.bytes = 0
+        self.seconds = None
+
+    # Function to record the rows and bytes the stage processed
+    def add(self, rows=0, bytes=0):
+        self.rows += rows or 0
+        self.bytes += bytes or 0
+
+    def __enter__(self):
+        if self.stage == _profile_stage:
+            _start_profile()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self._started
+        if self.stage == _profile_stage:
+            _stop_profile()
+        _record(self, failed=exc_type is not None)
+        return False
+
+# Function to time a stage. Returns a context manager; its add() records rows and bytes.
+def span(stage, **labels):
+    if not _enabled:
+        return _NULL_SPAN
+    return Span(stage, labels)
+
+# Function to add to a named counter (cache hits, pages, retries, ...)
+def count(name, value=1, **labels):
+    if not _enabled:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+# Function to check whether diagnostic output (frame previews, per-step notes) is on
+def debug_enabled():
+    return _debug
+
+# Function to print diagnostic output only when debugging is on
+def debug(*parts):
+    if _debug:
+        print(*parts)
+
+def enabled():
+    return _enabled
+
+# Function to get the totals of a stage, adding empty ones the first time
+def _stage_totals(stage):
+    totals = _stages.get(stage)
+    if totals is None:
+        totals = _stages[stage] = {'calls': 0, 'failures': 0, 'seconds': 0.0, 'max_seconds': 0.0,
+                                   'rows': 0, 'bytes': 0}
+    return totals
+
+def _record(span, failed):
+    with _lock:
+        totals = _stage_totals(span.stage)
+        totals['calls'] += 1
+        totals['failures'] += failed
+        totals['seconds'] += span.seconds
+        totals['max_seconds'] = max(totals['max_seconds'], span.seconds)
+        totals['rows'] += span.rows
+        totals['bytes'] += span.bytes
+    if _format == 'json':
+        event = {'ts': round(time.time(), 3), 'event': 'span', 'stage': span.stage,
+                 'seconds': round(span.seconds, 6), 'rows': span.rows, 'bytes': span.bytes, 'pid': os.getpid()}
+        if failed:
+            event['failed'] = True
+        event.update(span.labels)
+        line = json.dumps(event, default=str)
+        with _lock:
+            _log.write(line + '\n')
+            _log.flush()
+
+# Function to start profiling; nested spans of the profiled stage share one session
+def _start_profile():
+    global _profile, _profile_depth
+    with _lock:
+        _profile_depth += 1
+        if _profile_depth > 1:
+            return
+        if _profiler == 'tracemalloc':
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(10)
+            tracemalloc.reset_peak()
+        else:
+            import cProfile
+            if _profile is None:
+                _profile = cProfile.Profile()
+            _profile.enable()
+
+def _stop_profile():
+    global _profile_depth, _tracemalloc_peak
+    with _lock:
+        _profile_depth -= 1
+        if _profile_depth > 0:
+            return
+        if _profiler == 'tracemalloc':
+            import tracemalloc
+            _tracemalloc_peak = max(_tracemalloc_peak, tracemalloc.get_traced_memory()[1])
+        elif _profile is not None:
+            _profile.disable()
+
+# Function to write the profile of the profiled stage (to stderr and, for
+# cProfile, to <stage>.prof next to the metrics file or in the working folder)
+def write_profile(out=None):
+    out = out or sys.stderr
+    if _profile_stage is None:
+        return
+    if _profiler == 'tracemalloc':
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            return
+        print(f"tracemalloc for stage '{_profile_stage}': peak {_tracemalloc_peak / 1024 / 1024:.2f} MB", file=out)
+        for stat in tracemalloc.take_snapshot().statistics('lineno')[:PROFILE_TOP]:
+            print(f"  {stat}", file=out)
+        return
+    if _profile is None:
+        return
+    import pstats
+    folder = os.path.dirname(os.path.abspath(_metrics_path)) if _metrics_path else os.getcwd()
+    profile_path = os.path.join(folder, f"{_profile_stage}.{os.getpid()}.prof")
+    _profile.dump_stats(profile_path)
+    print(f"cProfile for stage '{_profile_stage}' saved to {profile_path}", file=out)
+    pstats.Stats(_profile, stream=out).sort_stats('cumulative').print_stats(PROFILE_TOP)
+
+# Function to get the totals collected so far
+def snapshot():
+    with _lock:
+        return {
+            'pid': os.getpid(),
+            'stages': {stage: dict(totals, seconds=round(totals['seconds'], 6),
+                                   max_seconds=round(totals['max_seconds'], 6))
+                       for stage, totals in _stages.items()},
+            'counters': [dict(labels, name=name, value=value) for (name, labels), value in _counters.items()],
+        }
+
+# Function to take the totals a pool worker recorded since the last call, to
+# be returned with the worker's result. Returns None in the owning process
+# (its totals are written at exit), with instrumentation off or with nothing
+# recorded.
+def collect():
+    if not _enabled or os.getpid() == _owner_pid:
+        return None
+    with _lock:
+        if not _stages and not _counters:
+            return None
+        totals = {'stages': {stage: dict(stage_totals) for stage, stage_totals in _stages.items()},
+                  'counters': list(_counters.items())}
+        _stages.clear()
+        _counters.clear()
+    return totals
+
+# Function to add the totals a worker returned (from collect()) to this process's totals
+def merge(totals):
+    if not totals or not _enabled:
+        return
+    with _lock:
+        for stage, worker_totals in totals['stages'].items():
+            stage_totals = _stage_totals(stage)
+            for field, value in worker_totals.items():
+                if field == 'max_seconds':
+                    stage_totals[field] = max(stage_totals[field], value)
+                else:
+                    stage_totals[field] += value
+        for key, value in totals['counters']:
+            _counters[key] = _counters.get(key, 0) + value
+
+# Function to drop the totals copied from the parent into a forked child
+def _reset_after_fork():
+    _stages.clear()
+    _counters.clear()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def _prometheus_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for name, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+# Function to render the totals as Prometheus text exposition format
+def prometheus_text():
+    with _lock:
+        stages = {stage: dict(totals) for stage, totals in _stages.items()}
+        counters = dict(_counters)
+    lines = []
+    metrics = [
+        ('stage_calls_total', 'calls', 'counter', "Spans finished per stage"),
+        ('stage_failures_total', 'failures', 'counter', "Spans that raised per stage"),
+        ('stage_seconds_total', 'seconds', 'counter', "Seconds spent per stage"),
+        ('stage_max_seconds', 'max_seconds', 'gauge', "Longest span per stage"),
+        ('stage_rows_total', 'rows', 'counter', "Rows processed per stage"),
+        ('stage_bytes_total', 'bytes', 'counter', "Bytes processed per stage"),
+    ]
+    for metric, field, metric_type, help_text in metrics:
+        lines.append(f"# HELP {METRIC_PREFIX}_{metric} {help_text}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_{metric} {metric_type}")
+        for stage, totals in sorted(stages.items()):
+            lines.append(f"{METRIC_PREFIX}_{metric}{_prometheus_labels([('stage', stage)])} {totals[field]}")
+    for name in sorted({name for name, labels in counters}):
+        lines.append(f"# TYPE {METRIC_PREFIX}_{name}_total counter")
+        for (counter, labels), value in sorted(counters.items()):
+            if counter == name:
+                lines.append(f"{METRIC_PREFIX}_{name}_total{_prometheus_labels(labels)} {value}")
+    return '\n'.join(lines) + '\n'
+
+# Function to write the totals in the configured format to the metrics file (or stderr)
+def dump(path=None, output_format=None):
+    if not _enabled:
+        return
+    path = path or _metrics_path
+    output_format = output_format or _format
+    text = prometheus_text() if output_format == 'prometheus' else json.dumps(snapshot(), indent=2) + '\n'
+    if path:
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as file:
+            file.write(text)
+        os.replace(temp_path, path)
+    else:
+        sys.stderr.write(text)
+
+def _at_exit():
+    # Only the process that configured instrumentation writes the totals;
+    # pool workers inherit the settings and log their spans instead
+    if _enabled and os.getpid() == _owner_pid:
+        write_profile()
+        dump()
+
+_owner_pid = None
+
+# Function to switch instrumentation on or off.
+#   output_format: 'json' (span log lines + JSON totals) or 'prometheus' (totals only)
+#   metrics_path: file the totals are written to at exit (default: stderr)
+#   log_path: file span lines are appended to (default: stderr)
+#   profile_stage / profiler: profile every span of one stage
+# The settings are also put in the environment so worker processes pick them up.
+def configure(enabled=True, output_format='json', metrics_path=None, log_path=None, profile_stage=None,
+              profiler='cprofile', debug=None, export_env=True):
+    global _enabled, _format, _metrics_path, _log, _profile_stage, _profiler, _debug, _owner_pid
+    global _atexit_registered
+    _enabled = enabled
+    _format = output_format
+    _metrics_path = metrics_path
+    _profile_stage = profile_stage
+    _profiler = profiler
+    if debug is not None:
+        _debug = debug
+    _log = open(log_path, 'a') if log_path else sys.stderr
+    if _owner_pid is None:
+        # A worker started with the settings in its environment is not the owner
+        _owner_pid = int(os.environ.get('PIPELINE_INSTRUMENT_OWNER') or os.getpid())
+    if enabled and _owner_pid == os.getpid():
+        # Spawned workers read the owner from the environment, even when the
+        # settings themselves came from it
+        os.environ['PIPELINE_INSTRUMENT_OWNER'] = str(_owner_pid)
+    if enabled and not _atexit_registered:
+        atexit.register(_at_exit)
+        _atexit_registered = True
+    if export_env:
+        if enabled:
+            os.environ['PIPELINE_INSTRUMENT'] = output_format
+            if profile_stage:
+                os.environ['PIPELINE_PROFILE'] = f"{profile_stage}:{profiler}"
+            if metrics_path:
+                os.environ['PIPELINE_METRICS'] = metrics_path
+            else:
+                os.environ.pop('PIPELINE_METRICS', None)
+        else:
+            os.environ.pop('PIPELINE_INSTRUMENT', None)
+            os.environ.pop('PIPELINE_PROFILE', None)
+            os.environ.pop('PIPELINE_METRICS', None)
+            os.environ.pop('PIPELINE_INSTRUMENT_OWNER', None)
+        if _debug:
+            os.environ['PIPELINE_DEBUG'] = '1'
+
+# Function to apply the settings found in the environment
+def configure_from_env():
+    global _debug
+    _debug = os.environ.get('PIPELINE_DEBUG', '') not in ('', '0')
+    output_format = os.environ.get('PIPELINE_INSTRUMENT', '')
+    if not output_format or output_format == '0':
+        return
+    profile_stage, _, profiler = os.environ.get('PIPELINE_PROFILE', '').partition(':')
+    configure(
+        output_format=output_format if output_format in FORMATS else 'json',
+        metrics_path=os.environ.get('PIPELINE_METRICS') or None,
+        profile_stage=profile_stage or None,
+        profiler=profiler if profiler in PROFILERS else 'cprofile',
+        export_env=False,
+    )
+
+# Function to add the instrumentation options to a command-line parser
+def add_arguments(parser):
+    group = parser.add_argument_group('instrumentation')
+    group.add_argument('--instrument', choices=FORMATS, default=None,
+                       help="time every stage; json also logs one line per span")
+    group.add_argument('--metrics-out', default=None, help="file the stage totals are written to (default: stderr)")
+    group.add_argument('--profile-stage', default=None, help="profile every span of this stage")
+    group.add_argument('--profiler', choices=PROFILERS, default='cprofile', help="profiler for --profile-stage")
+    group.add_argument('--verbose', action='store_true', help="print frame previews and per-step notes")
+    return parser
+
+# Function to apply the options added by add_arguments
+def configure_from_args(args):
+    if args.instrument or args.profile_stage:
+        configure(output_format=args.instrument or 'json', metrics_path=args.metrics_out,
+                  profile_stage=args.profile_stage, profiler=args.profiler, debug=args.verbose or None)
+    elif args.verbose:
+        global _debug
+        _debug = True
+        os.environ['PIPELINE_DEBUG'] = '1'
+
+configure_from_env()
@@ -0,0 +1,277 @@
+import sys
+import json
+import time
+import argparse
+import inspect
+from bisect import bisect_left, bisect_right
+
+from inventory_store import InventoryStore, DEFAULT_INVENTORY_PATH, to_iso_date
+
+# In-memory query index over the inventory store for dashboard queries.
+#
+# The index loads the typed columns of every row once and keeps:
+#   - per-category and per-item aggregates (rows, quantity, ordered, spend,
+#     price range, latest price), plus aggregates for every combination of
+#     category, vendor, status and month (a small cube);
+#   - the positions of all dated rows sorted by date, so a date range is two
+#     bisects instead of a scan of the table;
+#   - the positions of every item's rows in date order, for price history.
+# Category totals for whole months, with or without vendor/status filters, are
+# summed from the cube; other date ranges scan only the rows inside the range.
+# The index is rebuilt only when the store's write generation changes, so
+# repeated queries never go back to SQLite.
+#
+# Spend is price x ordered for rows that have both.
+
+# Row fields held by the index, in tuple order
+FIELDS = ('item_number', 'brand', 'size', 'price', 'ordered', 'quantity', 'category', 'vendor', 'status',
+          'source_file', 'date')
+ITEM, BRAND, SIZE, PRICE, ORDERED, QUANTITY, CATEGORY, VENDOR, STATUS, SOURCE_FILE, DATE = range(len(FIELDS))
+
+# Category used for rows without one
+UNCATEGORIZED = 'Uncategorized'
+
+# Function to start an empty aggregate
+def new_aggregate():
+    return {'rows': 0, 'quantity': 0.0, 'ordered': 0.0, 'spend': 0.0,
+            'min_price': None, 'max_price': None, 'last_price': None, 'last_date': None}
+
+# Function to add one row to an aggregate
+def add_to_aggregate(aggregate, row):
+    aggregate['rows'] += 1
+    quantity, ordered, price, row_date = row[QUANTITY], row[ORDERED], row[PRICE], row[DATE]
+    if quantity is not None:
+        aggregate['quantity'] += quantity
+    if ordered is not None:
+        aggregate['ordered'] += ordered
+    if price is not None:
+        if ordered is not None:
+            aggregate['spend'] += price * ordered
+        if aggregate['min_price'] is None or price < aggregate['min_price']:
+            aggregate['min_price'] = price
+        if aggregate['max_price'] is None or price > aggregate['max_price']:
+            aggregate['max_price'] = price
+        # Latest price by date; undated rows only count when nothing is dated
+        if aggregate['last_price'] is None or (row_date or '') >= (aggregate['last_date'] or ''):
+            aggregate['last_price'] = price
+            aggregate['last_date'] = row_date
+
+# Function to add two aggregates together
+def merge_aggregates(target, other):
+    target['rows'] += other['rows']
+    for name in ('quantity', 'ordered', 'spend'):
+        target[name] += other[name]
+    for name, pick in (('min_price', min), ('max_price', max)):
+        if other[name] is not None:
+            target[name] = other[name] if target[name] is None else pick(target[name], other[name])
+    if other['last_price'] is not None and (target['last_price'] is None
+                                            or (other['last_date'] or '') >= (target['last_date'] or '')):
+        target['last_price'] = other['last_price']
+        target['last_date'] = other['last_date']
+    return target
+
+# Function to round the money and quantity fields of an aggregate for output
+def _rounded(aggregate):
+    result = dict(aggregate)
+    for name in ('quantity', 'ordered', 'spend'):
+        result[name] = round(result[name], 4)
+    return result
+
+class InventoryIndex:
+    def __init__(self, store):
+        self.store = store
+        self.generation = None
+        self.build_seconds = 0.0
+        self.refresh()
+
+    # Function to rebuild the index if the store changed since the last build.
+    # Returns True if it was rebuilt.
+    def refresh(self):
+        generation = self.store.generation()
+        if generation == self.generation:
+            return False
+        self._build()
+        self.generation = generation
+        return True
+
+    def _build(self):
+        started = time.perf_counter()
+        rows = list(self.store.iter_columns(FIELDS))
+
+        by_category = {}
+        by_item = {}
+        cube = {}
+        item_positions = {}
+        dated = []
+        for position, row in enumerate(rows):
+            category = row[CATEGORY] or UNCATEGORIZED
+            add_to_aggregate(by_category.setdefault(category, new_aggregate()), row)
+            if row[ITEM] is not None:
+                add_to_aggregate(by_item.setdefault(row[ITEM], new_aggregate()), row)
+                item_positions.setdefault(row[ITEM], []).append(position)
+            month = row[DATE][:7] if row[DATE] else None
+            if month:
+                dated.append((row[DATE], position))
+            add_to_aggregate(cube.setdefault((category, row[VENDOR], row[STATUS], month), new_aggregate()), row)
+
+        dated.sort()
+        for positions in item_positions.values():
+            positions.sort(key=lambda position: (rows[position][DATE] or '', position))
+
+        self.rows = rows
+        self.by_category = by_category
+        self.by_item = by_item
+        self.cube = cube
+        self.item_positions = item_positions
+        self.dates = [row_date for row_date, position in dated]
+        self.date_positions = [position for row_date, position in dated]
+        self.build_seconds = time.perf_counter() - started
+
+    # Function to get the positions of the rows dated within [date_from, date_to]
+    def _date_range(self, date_from=None, date_to=None):
+        start = bisect_left(self.dates, _iso(date_from)) if date_from else 0
+        end = bisect_right(self.dates, _iso(date_to)) if date_to else len(self.dates)
+        return self.date_positions[start:end]
+
+    # Function to check a row against the vendor, status and category filters
+    @staticmethod
+    def _matches(row, vendor=None, status=None, category=None):
+        if vendor is not None and row[VENDOR] != vendor:
+            return False
+        if status is not None and row[STATUS] != status:
+            return False
+        if category is not None and (row[CATEGORY] or UNCATEGORIZED) != category:
+            return False
+        return True
+
+    # Function to total rows per category, optionally within a date range and
+    # for one vendor or status
+    def category_totals(self, date_from=None, date_to=None, vendor=None, status=None):
+        self.refresh()
+        if not (date_from or date_to or vendor or status):
+            return {category: _rounded(aggregate) for category, aggregate in sorted(self.by_category.items())}
+        if not (date_from or date_to) or _whole_months(date_from, date_to):
+            # No date range or whole calendar months: sum the matching cube cells
+            first, last = (_iso(date_from)[:7], _iso(date_to)[:7]) if date_from else (None, None)
+            totals = {}
+            for (category, cell_vendor, cell_status, month), aggregate in self.cube.items():
+                if vendor is not None and cell_vendor != vendor:
+                    continue
+                if status is not None and cell_status != status:
+                    continue
+                if first and not (month and first <= month <= last):
+                    continue
+                merge_aggregates(totals.setdefault(category, new_aggregate()), aggregate)
+            return {category: _rounded(aggregate) for category, aggregate in sorted(totals.items())}
+
+        totals = {}
+        for position in self._date_range(date_from, date_to):
+            row = self.rows[position]
+            if self._matches(row, vendor, status):
+                add_to_aggregate(totals.setdefault(row[CATEGORY] or UNCATEGORIZED, new_aggregate()), row)
+        return {category: _rounded(aggregate) for category, aggregate in sorted(totals.items())}
+
+    # Function to get the precomputed aggregate of one item, or None
+    def item_summary(self, item_number):
+        self.refresh()
+        aggregate = self.by_item.get(item_number)
+        return _rounded(aggregate) if aggregate else None
+
+    # Function to list what was paid for an item, in date order
+    def price_history(self, item_number, date_from=None, date_to=None, vendor=None, status=None):
+        self.refresh()
+        history = []
+        date_from, date_to = _iso(date_from), _iso(date_to)
+        for position in self.item_positions.get(item_number, ()):
+            row = self.rows[position]
+            if (date_from or date_to) and not row[DATE]:
+                continue
+            if date_from and row[DATE] < date_from:
+                continue
+            if date_to and row[DATE] > date_to:
+                continue
+            if row[PRICE] is None or not self._matches(row, vendor, status):
+                continue
+            history.append({'date': row[DATE], 'price': row[PRICE], 'ordered': row[ORDERED],
+                            'vendor': row[VENDOR], 'source_file': row[SOURCE_FILE]})
+        return history
+
+    # Function to list rows within a date range, with optional filters
+    def rows_between(self, date_from=None, date_to=None, category=None, vendor=None, status=None, limit=None):
+        self.refresh()
+        result = []
+        for position in self._date_range(date_from, date_to):
+            row = self.rows[position]
+            if self._matches(row, vendor, status, category):
+                result.append(dict(zip(FIELDS, row)))
+                if limit is not None and len(result) >= limit:
+                    break
+        return result
+
+    def stats(self):
+        return {
+            'rows': len(self.rows),
+            'dated_rows': len(self.dates),
+            'categories': len(self.by_category),
+            'cube_cells': len(self.cube),
+            'items': len(self.by_item),
+            'generation': self.generation,
+            'build_seconds': round(self.build_seconds, 4),
+        }
+
+# Query names that can be run through run_query (extract_service.py, the CLI)
+QUERIES = {
+    'category_totals': InventoryIndex.category_totals,
+    'item_summary': InventoryIndex.item_summary,
+    'price_history': InventoryIndex.price_history,
+    'rows_between': InventoryIndex.rows_between,
+}
+
+# Function to run a named query with keyword parameters
+def run_query(index, name, params=None):
+    query = QUERIES.get(name)
+    if query is None:
+        raise ValueError(f"Unknown query: {name}")
+    return query(index, **(params or {}))
+
+# Function to normalise a date parameter to an ISO string
+def _iso(value):
+    if not value:
+        return value
+    return to_iso_date(value) or str(value)
+
+# Function to check whether a date range covers whole calendar months
+def _whole_months(date_from, date_to):
+    if not (date_from and date_to):
+        return False
+    date_from, date_to = to_iso_date(date_from), to_iso_date(date_to)
+    if not (date_from and date_to) or not date_from.endswith('-01'):
+        return False
+    from datetime import date, timedelta
+    day_after = date.fromisoformat(date_to) + timedelta(days=1)
+    return day_after.day == 1
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a query against the inventory store")
+    parser.add_argument('query', choices=sorted(QUERIES), help="query to run")
+    parser.add_argument('--db', default=DEFAULT_INVENTORY_PATH, help="inventory database (default: inventory.sqlite3)")
+    parser.add_argument('--item-number', default=None)
+    parser.add_argument('--category', default=None)
+    parser.add_argument('--vendor', default=None)
+    parser.add_argument('--status', default=None)
+    parser.add_argument('--date-from', default=None)
+    parser.add_argument('--date-to', default=None)
+    args = parser.parse_args()
+
+    store = InventoryStore(args.db)
+    index = InventoryIndex(store)
+    params = {'item_number': args.item_number, 'category': args.category, 'vendor': args.vendor,
+              'status': args.status, 'date_from': args.date_from, 'date_to': args.date_to}
+    accepted = inspect.signature(QUERIES[args.query]).parameters
+    params = {name: value for name, value in params.items() if name in accepted and value is not None}
+    started = time.perf_counter()
+    result = run_query(index, args.query, params)
+    elapsed = time.perf_counter() - started
+    json.dump(result, sys.stdout, indent=2, default=str)
+    print(f"\n{args.query}: {elapsed * 1000:.2f} ms (index {index.stats()})", file=sys.stderr)
+    store.close()
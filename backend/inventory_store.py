@@ -0,0 +1,380 @@
+import os
+import re
+import sys
+import json
+import argparse
+import sqlite3
+import threading
+from datetime import date, datetime
+
+# SQLite inventory store, replacing the inventory_data.json file that was
+# rewritten in full on every run.
+#
+# Every inventory row is one table row with typed columns for the fields the
+# rest of the pipeline works with; any other fields of a parsed row are kept as
+# JSON in 'extra' so nothing is lost. Item number, category, source file and
+# date are indexed, so lookups read only the matching rows.
+#
+# Writes are single transactions: a run that fails half way leaves the store as
+# it was. Every parsed line is stored as its own row, so an item keeps one row
+# per invoice line (its price history); a re-processed file replaces the rows
+# of its source file. Edits made to rows read back from the store (the
+# inventory grid) are saved with update_rows, by the row id the store returned.
+# The database runs in WAL mode so readers (the Node server through
+# extract_service.py) are not blocked by a running import.
+
+# Default location of the store
+DEFAULT_INVENTORY_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'inventory.sqlite3')
+
+# Typed columns and their SQLite types
+COLUMNS = {
+    'item_number': 'TEXT',
+    'brand': 'TEXT',
+    'size': 'TEXT',
+    'price': 'REAL',
+    'ordered': 'REAL',
+    'quantity': 'REAL',
+    'category': 'TEXT',
+    'vendor': 'TEXT',
+    'status': 'TEXT',
+    'source_file': 'TEXT',
+    'date': 'TEXT',
+}
+
+NUMERIC_COLUMNS = {name for name, column_type in COLUMNS.items() if column_type == 'REAL'}
+
+# Fields the store adds to the rows it returns; they are not stored as row data
+STORE_FIELDS = ('id', 'updated_at')
+
+# Field names used by the parsers (App.extract_data_with_headers, cleanup.py,
+# prepdata.py and server.js) and the column they map to. Names are compared
+# after normalize_field_name.
+FIELD_ALIASES = {
+    'item_number': 'item_number', 'item#': 'item_number', 'item_no': 'item_number', 'itemno': 'item_number',
+    'item_num': 'item_number', 'sku': 'item_number',
+    'brand': 'brand', 'item': 'brand', 'item_name': 'brand', 'product': 'brand', 'product_name': 'brand',
+    'description': 'brand',
+    'size': 'size', 'packsize': 'size', 'pack_size': 'size',
+    'price': 'price', 'unit_cost': 'price', 'unit_price': 'price', 'price_per_bottle': 'price',
+    'ordered': 'ordered',
+    'quantity': 'quantity', 'qty': 'quantity',
+    'category': 'category',
+    'vendor': 'vendor', 'supplier': 'vendor', 'distributor': 'vendor',
+    'status': 'status',
+    'source_file': 'source_file',
+    'date': 'date', 'invoice_date': 'date', 'delivery_date': 'date',
+}
+
+# Date formats accepted for the date column
+DATE_FORMATS = ['%Y-%m-%d', '%m/%d/%Y', '%m/%d/%y', '%m-%d-%Y', '%Y/%m/%d', '%m.%d.%y', '%m.%d.%Y']
+
+NUMBER_CLEANUP_PATTERN = re.compile(r'[$,\s]')
+
+# Function to normalise a field name for alias lookup ("ITEM #" -> "item#", "Ext Value" -> "ext_value")
+def normalize_field_name(name):
+    name = str(name).strip().lower()
+    name = re.sub(r'\s*#', '#', name)
+    return re.sub(r'[\s\-]+', '_', name)
+
+# Function to convert a value to a number, or None if it is not one
+def to_number(value):
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return None if value != value else float(value)
+    text = NUMBER_CLEANUP_PATTERN.sub('', str(value))
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+# Function to convert a value to an ISO date string, or None if it is not a date
+def to_iso_date(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    text = str(value).strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+# Function to check whether a value is missing (None, NaN or blank)
+def _is_missing(value):
+    return value is None or value != value or (isinstance(value, str) and not value.strip())
+
+# Function to split a parsed row into typed column values and extra fields.
+# A value that cannot be converted to its column's type is kept in the extra
+# fields under its original name instead.
+def normalize_row(row, source_file=None):
+    values = {name: None for name in COLUMNS}
+    extra = {}
+    for key, value in row.items():
+        if key in STORE_FIELDS:
+            continue
+        if key == 'extra' and isinstance(value, dict):
+            extra.update(value)
+            continue
+        column = FIELD_ALIASES.get(normalize_field_name(key))
+        if column is None or values[column] is not None:
+            if not _is_missing(value):
+                extra[key] = value
+            continue
+        if _is_missing(value):
+            continue
+        if column in NUMERIC_COLUMNS:
+            converted = to_number(value)
+        elif column == 'date':
+            converted = to_iso_date(value)
+        else:
+            converted = ' '.join(str(value).split())
+        if converted is None:
+            extra[key] = value
+        else:
+            values[column] = converted
+    if source_file is not None:
+        values['source_file'] = source_file
+    values['source_file'] = values['source_file'] or ''
+    values['extra'] = json.dumps(extra, default=str, sort_keys=True) if extra else None
+    return values
+
+# Function to read a row id sent back by a client, or None if it is not one
+def _row_id(value):
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+class InventoryStore:
+    def __init__(self, db_path=DEFAULT_INVENTORY_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        column_defs = ', '.join(f"{name} {column_type}" for name, column_type in COLUMNS.items() if name != 'source_file')
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS inventory ("
+            "id INTEGER PRIMARY KEY, source_file TEXT NOT NULL DEFAULT '', "
+            f"{column_defs}, extra TEXT, updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS inventory_item_number ON inventory (item_number)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS inventory_category ON inventory (category)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS inventory_source_file ON inventory (source_file)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS inventory_date ON inventory (date)")
+        # Stores created before rows were kept per line merged rows on this index
+        self._db.execute("DROP INDEX IF EXISTS inventory_source_item")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', 0)")
+        self._db.commit()
+
+    # Function to bump the write generation inside the current transaction
+    def _bump_generation(self):
+        self._db.execute("UPDATE meta SET value = value + 1 WHERE key = 'generation'")
+
+    # Function to insert normalised rows inside the current transaction.
+    # Returns the number of rows stored.
+    def _write(self, rows, source_file=None):
+        names = list(COLUMNS) + ['extra']
+        insert = f"INSERT INTO inventory ({', '.join(names)}) VALUES ({', '.join('?' for _ in names)})"
+        values = [[normalized[name] for name in names] for normalized in
+                  (normalize_row(row, source_file) for row in rows)]
+        self._db.executemany(insert, values)
+        self._bump_generation()
+        return len(values)
+
+    # Function to add rows, one stored row per parsed row
+    def append(self, rows, source_file=None):
+        with self._lock, self._db:
+            return self._write(rows, source_file)
+
+    # Function to save edited rows: a row with the id of a stored row (as
+    # returned by find) replaces that row in place, a row without an id is
+    # added. Rows whose id is no longer stored (their file was re-processed
+    # since) are skipped. Returns the number of rows updated or added.
+    def update_rows(self, rows, source_file=None):
+        names = list(COLUMNS) + ['extra']
+        update = (f"UPDATE inventory SET {', '.join(f'{name} = ?' for name in names)}, "
+                  "updated_at = CURRENT_TIMESTAMP WHERE id = ?")
+        new_rows = []
+        updated = 0
+        with self._lock, self._db:
+            for row in rows:
+                row_id = _row_id(row.get('id'))
+                if row_id is None:
+                    new_rows.append(row)
+                    continue
+                normalized = normalize_row(row, source_file)
+                cursor = self._db.execute(update, [normalized[name] for name in names] + [row_id])
+                updated += cursor.rowcount
+            return updated + self._write(new_rows, source_file)
+
+    # Function to replace all rows of the given source files with new rows in
+    # one transaction (the rows of a re-processed or deleted file)
+    def replace_source_files(self, source_files, rows):
+        with self._lock, self._db:
+            self._db.executemany("DELETE FROM inventory WHERE source_file = ?", [(name,) for name in source_files])
+            return self._write(rows)
+
+    # Function to replace the whole inventory in one transaction
+    def replace_all(self, rows):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM inventory")
+            return self._write(rows)
+
+    # Function to remove the rows of the given source files
+    def delete_source_files(self, source_files):
+        with self._lock, self._db:
+            self._db.executemany("DELETE FROM inventory WHERE source_file = ?", [(name,) for name in source_files])
+            self._bump_generation()
+
+    # Function to turn a database row back into a dict, with the extra fields merged in
+    @staticmethod
+    def _to_dict(db_row, include_extra=True):
+        row = {name: db_row[name] for name in COLUMNS}
+        row['id'] = db_row['id']
+        row['updated_at'] = db_row['updated_at']
+        if include_extra and db_row['extra']:
+            for key, value in json.loads(db_row['extra']).items():
+                row.setdefault(key, value)
+        return row
+
+    # Function to query rows. Filters are exact matches on typed columns; dates
+    # are compared as ISO strings (date_from and date_to are inclusive).
+    def find(self, item_number=None, category=None, source_file=None, vendor=None, status=None,
+             date_from=None, date_to=None, limit=None, offset=0, include_extra=True):
+        conditions = []
+        params = []
+        for name, value in (('item_number', item_number), ('category', category), ('source_file', source_file),
+                            ('vendor', vendor), ('status', status)):
+            if value is not None:
+                conditions.append(f"{name} = ?")
+                params.append(value)
+        if date_from is not None:
+            conditions.append("date >= ?")
+            params.append(to_iso_date(date_from) or str(date_from))
+        if date_to is not None:
+            conditions.append("date <= ?")
+            params.append(to_iso_date(date_to) or str(date_to))
+        sql = "SELECT * FROM inventory"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY id"
+        if limit is not None or offset:
+            # LIMIT -1 is SQLite for no limit, so an offset applies on its own
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([int(limit) if limit is not None else -1, int(offset or 0)])
+        with self._lock:
+            return [self._to_dict(db_row, include_extra) for db_row in self._db.execute(sql, params)]
+
+    # Function to list the names of the extra fields used by any row, in the
+    # order they first appear (typed column names are left out)
+    def extra_fields(self):
+        with self._lock:
+            names = [name for (name,) in self._db.execute(
+                "SELECT json_each.key FROM inventory, json_each(inventory.extra) "
+                "WHERE inventory.extra IS NOT NULL GROUP BY json_each.key ORDER BY MIN(inventory.id)")]
+        return [name for name in names if name not in COLUMNS and name not in STORE_FIELDS]
+
+    # Function to iterate over every row without loading the whole table
+    def iter_rows(self, include_extra=True, batch_size=1000):
+        last_id = 0
+        while True:
+            with self._lock:
+                batch = self._db.execute("SELECT * FROM inventory WHERE id > ? ORDER BY id LIMIT ?",
+                                         (last_id, batch_size)).fetchall()
+            if not batch:
+                return
+            for db_row in batch:
+                yield self._to_dict(db_row, include_extra)
+            last_id = batch[-1]['id']
+
+    # Function to iterate over chosen typed columns of every row as tuples,
+    # in id order, without building dicts
+    def iter_columns(self, names, batch_size=10000):
+        unknown = [name for name in names if name not in COLUMNS and name != 'id']
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+        sql = f"SELECT id, {', '.join(names)} FROM inventory WHERE id > ? ORDER BY id LIMIT ?"
+        last_id = 0
+        while True:
+            with self._lock:
+                batch = self._db.execute(sql, (last_id, batch_size)).fetchall()
+            if not batch:
+                return
+            for db_row in batch:
+                yield tuple(db_row)[1:]
+            last_id = batch[-1][0]
+
+    def all_rows(self, include_extra=True):
+        return list(self.iter_rows(include_extra))
+
+    # Function to get the write generation, a counter bumped by every write.
+    # Readers that keep derived data (inventory_query.py) compare it to know
+    # when to refresh.
+    def generation(self):
+        with self._lock:
+            return self._db.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()[0]
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM inventory").fetchone()[0]
+
+    # Function to import a legacy inventory_data.json list
+    def import_json(self, json_path):
+        with open(json_path, 'r') as file:
+            data = json.load(file)
+        if isinstance(data, dict):
+            data = [value for value in data.values() if isinstance(value, dict)]
+        return self.append(data)
+
+    # Function to write the inventory as a JSON list, for tools that still read inventory_data.json
+    def export_json(self, json_path):
+        temp_path = json_path + '.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(self.all_rows(), file, indent=4, default=str)
+        os.replace(temp_path, json_path)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect and maintain the inventory store")
+    parser.add_argument('--db', default=DEFAULT_INVENTORY_PATH, help="inventory database (default: inventory.sqlite3)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help="import a legacy inventory_data.json file")
+    import_parser.add_argument('json_file')
+    export_parser = subparsers.add_parser('export', help="export the inventory as a JSON list")
+    export_parser.add_argument('json_file')
+    find_parser = subparsers.add_parser('find', help="print matching rows as JSON lines")
+    find_parser.add_argument('--item-number', default=None)
+    find_parser.add_argument('--category', default=None)
+    find_parser.add_argument('--source-file', default=None)
+    find_parser.add_argument('--limit', type=int, default=None)
+    subparsers.add_parser('count', help="print the number of rows")
+    args = parser.parse_args()
+
+    store = InventoryStore(args.db)
+    try:
+        if args.command == 'import':
+            print(f"Imported {store.import_json(args.json_file)} rows into {args.db}")
+        elif args.command == 'export':
+            store.export_json(args.json_file)
+            print(f"Exported {store.count()} rows to {args.json_file}")
+        elif args.command == 'find':
+            for row in store.find(item_number=args.item_number, category=args.category,
+                                  source_file=args.source_file, limit=args.limit):
+                sys.stdout.write(json.dumps(row, default=str) + '\n')
+        else:
+            print(store.count())
+    finally:
+        store.close()
@@ -0,0 +1,601 @@
+import os
+import re
+import csv
+import sys
+import json
+import math
+import time
+import heapq
+import sqlite3
+import argparse
+import threading
+import unicodedata
+from difflib import SequenceMatcher
+
+from inventory_store import InventoryStore, DEFAULT_INVENTORY_PATH, normalize_row
+
+# Item resolution: maps the product names of parsed rows (invoice lines from
+# server.js, count-sheet rows from cleanup.py, prepdata.py products, inventory
+# rows) to the canonical items of a catalogue.
+#
+# Names are normalised first: accents and punctuation dropped, common
+# abbreviations expanded and the bottle size pulled out and converted to ml
+# ("JACK DANIEL'S OLD NO.7 1.75L" -> "jack daniels old no 7", 1750). Every row
+# then has a key "<name>|<size>", and rows are resolved once per distinct key.
+#
+# A key is looked up in this order:
+#   1. aliases: keys already mapped to an item, confirmed in review or
+#      accepted automatically before;
+#   2. the unresolved cache: keys that did not match the current catalogue are
+#      not scored again until the catalogue changes;
+#   3. the index: an inverted token index (with a trigram index over the token
+#      vocabulary to correct misspelt tokens) picks the MAX_CANDIDATES items
+#      sharing the most idf weight with the name, and only those are ranked by
+#      string similarity. Nothing is compared pairwise against the whole
+#      catalogue.
+# A match is accepted when it scores at least ACCEPT_SCORE and beats the
+# runner-up by MIN_MARGIN. Other keys go to the review queue with their best
+# candidates; confirming one there turns it into an alias.
+
+DEFAULT_RESOLVER_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'item_resolver.sqlite3')
+
+# Score needed to accept a match, and the lead it needs over the runner-up
+ACCEPT_SCORE = 0.82
+MIN_MARGIN = 0.04
+
+# Items picked from the index per name, items of those compared character by
+# character, and candidates kept for review
+MAX_CANDIDATES = 50
+RERANK_CANDIDATES = 10
+REVIEW_CANDIDATES = 5
+
+# Distinct names needed before matching is spread over worker processes, and
+# names sent to a worker at a time
+PARALLEL_MIN_KEYS = 2000
+MATCH_CHUNK_SIZE = 500
+
+# Similarity needed to treat an unknown token as a misspelling of a known one
+TOKEN_SIMILARITY = 0.8
+
+# Score factor when both sizes are known and differ (another bottle of the same product)
+SIZE_MISMATCH_FACTOR = 0.75
+
+# Abbreviations seen on invoices and count sheets
+ABBREVIATIONS = {
+    'vdka': 'vodka', 'vod': 'vodka', 'whsky': 'whiskey', 'whisky': 'whiskey', 'wsky': 'whiskey',
+    'bbn': 'bourbon', 'brbn': 'bourbon', 'tqla': 'tequila', 'teq': 'tequila', 'gn': 'gin',
+    'chard': 'chardonnay', 'cab': 'cabernet', 'sauv': 'sauvignon', 'pnt': 'pinot', 'blnc': 'blanc',
+    'rsl': 'riesling', 'liq': 'liqueur', 'lqr': 'liqueur', 'cordl': 'cordial',
+    'spk': 'sparkling', 'sprk': 'sparkling', 'blk': 'black', 'wht': 'white', 'rd': 'red',
+    'org': 'original', 'orig': 'original', 'flv': 'flavored', 'flvd': 'flavored',
+    'yr': 'year', 'yrs': 'year', 'years': 'year', 'num': 'no',
+}
+
+STOPWORDS = {'the', 'and', 'of', 'a'}
+
+# Sizes: a number and a unit, converted to ml
+SIZE_PATTERN = re.compile(r'(?<![\w.])(\d+(?:\.\d+)?|\.\d+)\s*(ml|cl|ltr|lt|liters?|litres?|l|oz|gal)\b')
+SIZE_TO_ML = {'ml': 1, 'cl': 10, 'l': 1000, 'lt': 1000, 'ltr': 1000, 'liter': 1000, 'liters': 1000,
+              'litre': 1000, 'litres': 1000, 'oz': 29.5735, 'gal': 3785.41}
+
+# Standard bottle sizes, so 25.4 oz and 1.75 L land on 750 and 1750
+STANDARD_SIZES_ML = (50, 100, 187, 200, 355, 375, 473, 500, 700, 720, 750, 1000, 1500, 1750, 3000, 3785)
+
+NON_WORD_PATTERN = re.compile(r'[^a-z0-9]+')
+
+# Field names that hold an item name or size, in any of the parsers' spellings
+# (normalize_row maps them onto 'brand' and 'size')
+NAME_COLUMN = 'brand'
+SIZE_COLUMN = 'size'
+
+# Function to convert a size such as "1.75L", "750 ML" or "25.4oz" to ml, or None
+def parse_size(text):
+    if text is None:
+        return None
+    match = SIZE_PATTERN.search(str(text).lower())
+    if not match:
+        return None
+    return _to_ml(match.group(1), match.group(2))
+
+def _to_ml(number, unit):
+    ml = float(number) * SIZE_TO_ML[unit]
+    nearest = min(STANDARD_SIZES_ML, key=lambda size: abs(size - ml))
+    return nearest if abs(nearest - ml) <= 0.03 * nearest else int(round(ml))
+
+# Function to fold a name to lowercase ASCII
+def _fold(text):
+    text = unicodedata.normalize('NFKD', str(text))
+    return text.encode('ascii', 'ignore').decode('ascii').lower()
+
+# Function to normalise a product name and size.
+# Returns (normalised name, size in ml or None); a size found in the name is
+# used when no separate size is given.
+def normalize_name(name, size=None):
+    text = _fold(name or '').replace('&', ' and ').replace("'", '')
+    size_ml = parse_size(size) if size is not None else None
+    match = SIZE_PATTERN.search(text)
+    if match:
+        if size_ml is None:
+            size_ml = _to_ml(match.group(1), match.group(2))
+        text = SIZE_PATTERN.sub(' ', text)
+    tokens = []
+    for token in NON_WORD_PATTERN.split(text):
+        token = ABBREVIATIONS.get(token, token)
+        if token and token not in STOPWORDS:
+            tokens.append(token)
+    return ' '.join(tokens), size_ml
+
+# Function to build the key a name is resolved under
+def make_key(name, size_ml):
+    return f"{name}|{size_ml or ''}"
+
+# Function to split a key back into the name and size
+def split_key(key):
+    name, _, size = key.rpartition('|')
+    return name, int(size) if size else None
+
+# Function to get the character trigrams of a token
+def trigrams(token):
+    padded = f" {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+# Candidate lookup and ranking over the catalogue
+class ItemIndex:
+    def __init__(self, items):
+        # items: [(item_id, name, size)]
+        self.item_ids = []
+        self.names = []
+        self.sizes = []
+        self.tokens = []
+        postings = {}
+        for item_id, name, size in items:
+            normalized, size_ml = normalize_name(name, size)
+            if not normalized:
+                continue
+            position = len(self.item_ids)
+            self.item_ids.append(item_id)
+            self.names.append(normalized)
+            self.sizes.append(size_ml)
+            tokens = set(normalized.split())
+            self.tokens.append(tokens)
+            for token in tokens:
+                postings.setdefault(token, []).append(position)
+        self.postings = postings
+        # The same postings as arrays, for scoring candidates with numpy
+        import numpy as np
+        self.posting_arrays = {token: np.array(positions, dtype=np.int64) for token, positions in postings.items()}
+        count = len(self.item_ids) or 1
+        self.idf = {token: math.log(1 + count / len(positions)) for token, positions in postings.items()}
+        self.vocabulary_trigrams = {}
+        for token in postings:
+            if len(token) >= 3 and not token.isdigit():
+                for gram in trigrams(token):
+                    self.vocabulary_trigrams.setdefault(gram, []).append(token)
+        self._corrections = {}
+
+    def __len__(self):
+        return len(self.item_ids)
+
+    # Function to map a token to known tokens: itself, or close spellings of it
+    def similar_tokens(self, token):
+        if token in self.postings:
+            return [(token, 1.0)]
+        corrections = self._corrections.get(token)
+        if corrections is None:
+            corrections = []
+            if len(token) >= 3 and not token.isdigit():
+                overlap = {}
+                for gram in trigrams(token):
+                    for known in self.vocabulary_trigrams.get(gram, ()):
+                        overlap[known] = overlap.get(known, 0) + 1
+                for known, shared in heapq.nlargest(10, overlap.items(), key=lambda entry: entry[1]):
+                    similarity = SequenceMatcher(None, token, known).ratio()
+                    if similarity >= TOKEN_SIMILARITY:
+                        corrections.append((known, similarity))
+            self._corrections[token] = corrections
+        return corrections
+
+    # Function to map the tokens of a name to known tokens.
+    # Returns [{known token: idf x similarity}] with one dict per query token.
+    def _query_weights(self, name):
+        weights = []
+        for token in set(name.split()):
+            corrections = self.similar_tokens(token)
+            if corrections:
+                weights.append({known: self.idf[known] * similarity for known, similarity in corrections})
+            else:
+                # A token nothing in the catalogue resembles still counts against every item
+                weights.append({None: max(self.idf.values(), default=1.0)})
+        return weights
+
+    # Function to pick the items sharing the most (rare) tokens with a name.
+    # Every query token adds its idf weight to all items it is on, so the items
+    # of one rare token (the "citrus" of an unrelated mixer) cannot crowd out
+    # items that share more of the name. The weights are summed over the
+    # concatenated posting arrays only, so the cost grows with the postings of
+    # the name's tokens rather than with the size of the catalogue.
+    # Returns the positions of up to MAX_CANDIDATES items, in no particular order.
+    def candidates(self, weights):
+        import numpy as np
+        known_weights = {}
+        for token_weights in weights:
+            for known, weight in token_weights.items():
+                if known is not None and weight > known_weights.get(known, 0.0):
+                    known_weights[known] = weight
+        if not known_weights:
+            return []
+        postings = [self.posting_arrays[known] for known in known_weights]
+        positions = np.concatenate(postings)
+        posting_weights = np.repeat(list(known_weights.values()), [len(posting) for posting in postings])
+        touched, slots = np.unique(positions, return_inverse=True)
+        if len(touched) > MAX_CANDIDATES:
+            scores = np.bincount(slots, weights=posting_weights)
+            touched = touched[np.argpartition(-scores, MAX_CANDIDATES)[:MAX_CANDIDATES]]
+        return touched.tolist()
+
+    # Function to score the tokens of a candidate item against a name (0-1):
+    # the weight of the name's tokens found in the item over the weight of
+    # all tokens of both
+    def token_score(self, weights, position):
+        item_tokens = self.tokens[position]
+        shared = total = 0.0
+        matched_known = set()
+        for token_weights in weights:
+            total += max(token_weights.values())
+            shared += max((weight for known, weight in token_weights.items() if known in item_tokens), default=0.0)
+            matched_known.update(token_weights)
+        total += sum(self.idf[token] for token in item_tokens if token not in matched_known)
+        return shared / total if total else 0.0
+
+    # Function to rank the candidates for a name.
+    # Candidates are ordered by token score first; only the best RERANK_CANDIDATES
+    # are compared character by character, and the final score is the mean of
+    # both. Returns [(item_id, score)] best first.
+    def match(self, name, size_ml=None, limit=REVIEW_CANDIDATES):
+        weights = self._query_weights(name)
+        shortlist = heapq.nlargest(
+            RERANK_CANDIDATES,
+            ((self.token_score(weights, position), position) for position in self.candidates(weights)),
+        )
+        matcher = SequenceMatcher(None)
+        matcher.set_seq2(name)
+        ranked = []
+        for token_score, position in shortlist:
+            matcher.set_seq1(self.names[position])
+            score = 0.5 * token_score + 0.5 * matcher.ratio()
+            if size_ml and self.sizes[position] and size_ml != self.sizes[position]:
+                score *= SIZE_MISMATCH_FACTOR
+            ranked.append((score, position))
+        ranked.sort(reverse=True)
+        return [(self.item_ids[position], round(score, 4)) for score, position in ranked[:limit]]
+
+# Function to decide whether the best of the ranked candidates is a match
+def is_accepted(ranked, accept_score=ACCEPT_SCORE, min_margin=MIN_MARGIN):
+    if not ranked or ranked[0][1] < accept_score:
+        return False
+    return len(ranked) == 1 or ranked[0][1] - ranked[1][1] >= min_margin
+
+# Index used by each worker process (set up by _init_worker)
+_worker_index = None
+
+def _init_worker(index):
+    global _worker_index
+    _worker_index = index
+
+# Function run in a worker process to rank the candidates of a chunk of keys
+def _match_worker(keys):
+    return [(key, _worker_index.match(*split_key(key))) for key in keys]
+
+# Function to rank the candidates of many keys, in worker processes when
+# there are enough of them. Yields (key, ranked candidates).
+def match_keys(index, keys, workers=1):
+    import multiprocessing
+    # A pool worker is daemonic and cannot start a pool of its own
+    if workers <= 1 or len(keys) < PARALLEL_MIN_KEYS or multiprocessing.current_process().daemon:
+        for key in keys:
+            yield key, index.match(*split_key(key))
+        return
+    chunks = [keys[start:start + MATCH_CHUNK_SIZE] for start in range(0, len(keys), MATCH_CHUNK_SIZE)]
+    with multiprocessing.Pool(min(workers, len(chunks)), initializer=_init_worker, initargs=(index,)) as pool:
+        for matches in pool.imap(_match_worker, chunks):
+            yield from matches
+
+# Function to get the name and size of a parsed row in any of the parsers' spellings
+def row_name_and_size(row):
+    values = normalize_row(row)
+    return values[NAME_COLUMN], values[SIZE_COLUMN]
+
+class ItemResolver:
+    def __init__(self, db_path=DEFAULT_RESOLVER_PATH, accept_score=ACCEPT_SCORE, min_margin=MIN_MARGIN, workers=1):
+        self.db_path = db_path
+        self.workers = workers
+        self.last_stats = {}
+        self.accept_score = accept_score
+        self.min_margin = min_margin
+        self._lock = threading.Lock()
+        self._index = None
+        self._index_generation = None
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS items (item_id TEXT PRIMARY KEY, name TEXT NOT NULL, size TEXT)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS aliases ("
+            "key TEXT PRIMARY KEY, item_id TEXT NOT NULL, score REAL, confirmed INTEGER NOT NULL DEFAULT 0, "
+            "created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS unresolved ("
+            "key TEXT PRIMARY KEY, raw_name TEXT, raw_size TEXT, source_file TEXT, "
+            "seen INTEGER NOT NULL DEFAULT 0, candidates TEXT, generation INTEGER NOT NULL, "
+            "status TEXT NOT NULL DEFAULT 'pending', "
+            "first_seen TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP, last_seen TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS unresolved_status ON unresolved (status, seen)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', 0)")
+        self._db.commit()
+
+    # Function to get the catalogue generation, bumped whenever the catalogue changes
+    def generation(self):
+        with self._lock:
+            return self._generation()
+
+    def _generation(self):
+        return self._db.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()[0]
+
+    # Function to load catalogue items [(item_id, name, size)].
+    # Replacing the catalogue drops automatic aliases (confirmed ones are kept)
+    # and makes cached unresolved keys eligible for matching again.
+    def load_catalogue(self, items, replace=True):
+        with self._lock, self._db:
+            if replace:
+                self._db.execute("DELETE FROM items")
+            self._db.executemany(
+                "INSERT INTO items (item_id, name, size) VALUES (?, ?, ?) "
+                "ON CONFLICT (item_id) DO UPDATE SET name = excluded.name, size = excluded.size",
+                [(str(item_id), name, size) for item_id, name, size in items if item_id is not None and name],
+            )
+            self._db.execute("DELETE FROM aliases WHERE confirmed = 0")
+            self._db.execute("UPDATE meta SET value = value + 1 WHERE key = 'generation'")
+            return self._db.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+    # Function to use the items of the inventory store (rows with an item
+    # number; the latest name and size of each) as the catalogue
+    def load_catalogue_from_store(self, store):
+        items = {}
+        for item_number, brand, size in store.iter_columns(('item_number', 'brand', 'size')):
+            if item_number and brand:
+                items[item_number] = (item_number, brand, size)
+        return self.load_catalogue(items.values())
+
+    # Function to get the index of the current catalogue, building it on first use
+    def index(self):
+        return self._current_index()[0]
+
+    # Function to get the index with the generation it was built from
+    def _current_index(self):
+        with self._lock:
+            generation = self._generation()
+            if self._index is None or self._index_generation != generation:
+                items = self._db.execute("SELECT item_id, name, size FROM items").fetchall()
+                self._index = ItemIndex([tuple(item) for item in items])
+                self._index_generation = generation
+            return self._index, generation
+
+    def _lookup(self, table, columns, keys):
+        found = {}
+        keys = list(keys)
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ', '.join('?' for _ in chunk)
+            for row in self._db.execute(f"SELECT key, {columns} FROM {table} WHERE key IN ({placeholders})", chunk):
+                found[row['key']] = row
+        return found
+
+    # Function to resolve many parsed rows at once. Each distinct name/size is
+    # resolved once. Returns one result per row:
+    #   {'item_id', 'score', 'key', 'method'}
+    # where method is 'alias', 'match', 'unresolved', 'ignored' or 'empty'.
+    def resolve_rows(self, rows, source_file=None):
+        started = time.perf_counter()
+        index, generation = self._current_index()
+
+        row_keys = []
+        raw = {}
+        for row in rows:
+            name, size = row_name_and_size(row)
+            normalized, size_ml = normalize_name(name, size)
+            if not normalized:
+                row_keys.append(None)
+                continue
+            key = make_key(normalized, size_ml)
+            row_keys.append(key)
+            raw.setdefault(key, (name, size))
+
+        resolved = {}
+        with self._lock:
+            aliases = self._lookup('aliases', 'item_id, score, confirmed', raw)
+            cached = self._lookup('unresolved', 'status, generation', (key for key in raw if key not in aliases))
+        for key, alias in aliases.items():
+            resolved[key] = {'item_id': alias['item_id'], 'score': alias['score'], 'key': key, 'method': 'alias'}
+        for key, entry in cached.items():
+            if entry['status'] == 'ignored':
+                resolved[key] = {'item_id': None, 'score': None, 'key': key, 'method': 'ignored'}
+            elif entry['status'] == 'pending' and entry['generation'] == generation:
+                resolved[key] = {'item_id': None, 'score': None, 'key': key, 'method': 'unresolved'}
+
+        new_aliases = []
+        new_unresolved = []
+        pending = [key for key in raw if key not in resolved]
+        for key, ranked in match_keys(index, pending, self.workers):
+            if is_accepted(ranked, self.accept_score, self.min_margin):
+                item_id, score = ranked[0]
+                resolved[key] = {'item_id': item_id, 'score': score, 'key': key, 'method': 'match'}
+                new_aliases.append((key, item_id, score))
+            else:
+                resolved[key] = {'item_id': None, 'score': ranked[0][1] if ranked else None, 'key': key,
+                                 'method': 'unresolved'}
+                new_unresolved.append((key, raw[key][0], raw[key][1], source_file, json.dumps(ranked), generation))
+
+        seen = {}
+        for key in row_keys:
+            if key is not None and resolved[key]['method'] == 'unresolved':
+                seen[key] = seen.get(key, 0) + 1
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT INTO aliases (key, item_id, score, confirmed) VALUES (?, ?, ?, 0) "
+                "ON CONFLICT (key) DO NOTHING",
+                new_aliases,
+            )
+            self._db.executemany(
+                "INSERT INTO unresolved (key, raw_name, raw_size, source_file, candidates, generation) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET candidates = excluded.candidates, generation = excluded.generation, "
+                "status = 'pending'",
+                new_unresolved,
+            )
+            self._db.executemany(
+                "UPDATE unresolved SET seen = seen + ?, last_seen = CURRENT_TIMESTAMP WHERE key = ?",
+                [(count, key) for key, count in seen.items()],
+            )
+
+        self.last_stats = {
+            'rows': len(row_keys),
+            'distinct': len(raw),
+            'aliases': len(aliases),
+            'matched': len(new_aliases),
+            'unresolved': sum(1 for result in resolved.values() if result['method'] == 'unresolved'),
+            'seconds': round(time.perf_counter() - started, 3),
+        }
+        empty = {'item_id': None, 'score': None, 'key': None, 'method': 'empty'}
+        return [resolved[key] if key is not None else empty for key in row_keys]
+
+    # Function to resolve one name
+    def resolve(self, name, size=None):
+        return self.resolve_rows([{NAME_COLUMN: name, SIZE_COLUMN: size}])[0]
+
+    # Function to list pending unresolved names, the most frequent first
+    def review_queue(self, limit=50, offset=0):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, raw_name, raw_size, source_file, seen, candidates, first_seen, last_seen FROM unresolved "
+                "WHERE status = 'pending' ORDER BY seen DESC, key LIMIT ? OFFSET ?",
+                (limit, offset),
+            ).fetchall()
+        queue = []
+        for row in rows:
+            entry = dict(row)
+            entry['candidates'] = [
+                {'item_id': item_id, 'score': score} for item_id, score in json.loads(entry['candidates'] or '[]')
+            ]
+            queue.append(entry)
+        return queue
+
+    # Function to map an unresolved (or any) key to an item for good
+    def confirm(self, key, item_id):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO aliases (key, item_id, score, confirmed) VALUES (?, ?, NULL, 1) "
+                "ON CONFLICT (key) DO UPDATE SET item_id = excluded.item_id, confirmed = 1",
+                (key, str(item_id)),
+            )
+            self._db.execute("UPDATE unresolved SET status = 'resolved' WHERE key = ?", (key,))
+
+    # Function to take a key out of the review queue without mapping it
+    def ignore(self, key):
+        with self._lock, self._db:
+            self._db.execute("UPDATE unresolved SET status = 'ignored' WHERE key = ?", (key,))
+
+    def stats(self):
+        count = lambda query: self._db.execute(query).fetchone()[0]
+        with self._lock:
+            return {
+                'items': count("SELECT COUNT(*) FROM items"),
+                'aliases': count("SELECT COUNT(*) FROM aliases"),
+                'confirmed_aliases': count("SELECT COUNT(*) FROM aliases WHERE confirmed = 1"),
+                'pending_review': count("SELECT COUNT(*) FROM unresolved WHERE status = 'pending'"),
+                'generation': self._generation(),
+            }
+
+    def close(self):
+        self._db.close()
+
+# Function to read parsed rows from a JSON file (a list of rows, or the
+# item-number -> row object written by server.js) or a CSV file
+def read_rows(file_path):
+    if os.path.splitext(file_path)[1].lower() == '.csv':
+        with open(file_path, 'r', newline='', encoding='utf-8', errors='replace') as file:
+            return list(csv.DictReader(file))
+    with open(file_path, 'r', encoding='utf-8') as file:
+        data = json.load(file)
+    if isinstance(data, dict):
+        data = [row for row in data.values() if isinstance(row, dict)]
+    return data
+
+# Function to read catalogue items from a CSV or JSON file with item id, name and size fields
+def read_catalogue(file_path):
+    items = []
+    for row in read_rows(file_path):
+        values = normalize_row(row)
+        items.append((values['item_number'], values[NAME_COLUMN], values[SIZE_COLUMN]))
+    return items
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resolve parsed item names to catalogue items")
+    parser.add_argument('--db', default=DEFAULT_RESOLVER_PATH, help="resolver database (default: item_resolver.sqlite3)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="worker processes for matching large batches")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    catalogue_parser = subparsers.add_parser('catalogue', help="load the catalogue")
+    catalogue_parser.add_argument('--file', default=None, help="CSV or JSON file of items (item number, name, size)")
+    catalogue_parser.add_argument('--inventory', default=DEFAULT_INVENTORY_PATH,
+                                  help="inventory store to take the items from when no --file is given")
+
+    resolve_parser = subparsers.add_parser('resolve', help="resolve the rows of a parsed file")
+    resolve_parser.add_argument('rows_file', help="JSON or CSV file of parsed rows")
+    resolve_parser.add_argument('-o', '--output', default=None, help="write the rows with their item_id as JSON")
+
+    review_parser = subparsers.add_parser('review', help="list names waiting for review")
+    review_parser.add_argument('--limit', type=int, default=20)
+
+    confirm_parser = subparsers.add_parser('confirm', help="map a reviewed key to an item")
+    confirm_parser.add_argument('key')
+    confirm_parser.add_argument('item_id')
+
+    ignore_parser = subparsers.add_parser('ignore', help="drop a key from the review queue")
+    ignore_parser.add_argument('key')
+    args = parser.parse_args()
+
+    resolver = ItemResolver(args.db, workers=args.workers)
+    if args.command == 'catalogue':
+        if args.file:
+            count = resolver.load_catalogue(read_catalogue(args.file))
+        else:
+            store = InventoryStore(args.inventory)
+            count = resolver.load_catalogue_from_store(store)
+            store.close()
+        print(f"Catalogue loaded: {count} items")
+    elif args.command == 'resolve':
+        rows = read_rows(args.rows_file)
+        results = resolver.resolve_rows(rows, source_file=os.path.basename(args.rows_file))
+        print(f"Resolved {args.rows_file}: {resolver.last_stats}", file=sys.stderr)
+        if args.output:
+            with open(args.output, 'w') as file:
+                json.dump([dict(row, item_id=result['item_id'], match=result['method'])
+                           for row, result in zip(rows, results)], file, indent=2, default=str)
+            print(f"Resolved rows saved to {args.output}", file=sys.stderr)
+    elif args.command == 'review':
+        for entry in resolver.review_queue(args.limit):
+            candidates = ', '.join(f"{c['item_id']} ({c['score']})" for c in entry['candidates'])
+            print(f"{entry['seen']:>5}  {entry['key']}  <- {entry['raw_name']!r}  candidates: {candidates or '-'}")
+    elif args.command == 'confirm':
+        resolver.confirm(args.key, args.item_id)
+        print(f"{args.key} -> {args.item_id}")
+    else:
+        resolver.ignore(args.key)
+        print(f"Ignored {args.key}")
+    print(f"Resolver: {resolver.stats()}", file=sys.stderr)
+    resolver.close()
@@ -0,0 +1,347 @@
+import os
+import sys
+import json
+import time
+import argparse
+import sqlite3
+import threading
+
+import App
+from extraction_cache import ExtractionCache, hash_file
+
+# Persistent job queue for the extraction pipeline.
+#
+# Every file to extract becomes one row of a SQLite table. Jobs are keyed by
+# content hash + extractor + extractor version (the extraction cache key), so
+# the same invoice uploaded twice is one job: the second submit returns the
+# first job, and once that job is done its stored result answers every later
+# duplicate without running the pipeline again.
+#
+# Jobs are claimed in priority order (lower runs first), oldest first within a
+# priority, so interactive uploads overtake queued bulk imports. A job that
+# fails is queued again after RETRY_DELAY seconds, doubling per attempt, until
+# max_attempts is reached; then it is marked failed.
+#
+# The queue only stores and hands out jobs. They are run by the extraction
+# service (extract_service.py) on its fixed pool of workers, which bounds how
+# many files are extracted at once. submit() refuses new jobs with QueueFull
+# once max_queued jobs are waiting, so callers can push back instead of piling
+# up work. The database runs in WAL mode so the service, the Node server and
+# this module's CLI can use it at the same time.
+
+# Default location of the queue
+DEFAULT_QUEUE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'job_queue.sqlite3')
+
+# Named priorities; an integer priority can be passed as well
+PRIORITIES = {'interactive': 0, 'bulk': 10}
+
+STATUSES = ('queued', 'running', 'done', 'failed')
+FINISHED_STATUSES = ('done', 'failed')
+
+DEFAULT_MAX_ATTEMPTS = 3
+
+# Seconds before the first retry of a failed job; doubles on every attempt
+RETRY_DELAY = 5
+
+# Number of waiting jobs above which submit() raises QueueFull
+DEFAULT_MAX_QUEUED = 5000
+
+# Raised by submit() when the queue already holds max_queued waiting jobs
+class QueueFull(Exception):
+    pass
+
+# Function to turn a priority name or number into the stored number
+def priority_value(priority):
+    if isinstance(priority, str) and not priority.lstrip('-').isdigit():
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        return PRIORITIES[priority]
+    return int(priority)
+
+# Function to check an extractor name given by a caller
+def check_extractor(extractor):
+    if extractor is not None and extractor not in App.EXTRACTORS:
+        raise ValueError(f"Unknown extractor: {extractor}")
+
+# Function to build the deduplication key of a file for an extractor.
+# Returns (key, extractor name); raises ValueError for unknown extractors and
+# unsupported files, so they are refused before they are queued.
+def job_key(file_path, extractor=None):
+    check_extractor(extractor)
+    name = extractor or App.get_extractor_name(file_path)
+    if name is None:
+        raise ValueError(f"Unsupported file type: {file_path}")
+    _, version = App.EXTRACTORS[name]
+    return ExtractionCache.make_key(hash_file(file_path), name, version), name
+
+class JobQueue:
+    def __init__(self, db_path=DEFAULT_QUEUE_PATH, max_queued=DEFAULT_MAX_QUEUED, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.db_path = db_path
+        self.max_queued = max_queued
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY, key TEXT NOT NULL UNIQUE, path TEXT NOT NULL, extractor TEXT NOT NULL, "
+            "priority INTEGER NOT NULL, status TEXT NOT NULL DEFAULT 'queued', "
+            "attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL, "
+            "delete_after INTEGER NOT NULL DEFAULT 0, submitted INTEGER NOT NULL DEFAULT 1, "
+            "not_before REAL NOT NULL DEFAULT 0, error TEXT, result TEXT, "
+            "created REAL NOT NULL, started REAL, finished REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_next ON jobs (status, priority, id)")
+        self._db.commit()
+
+    # Function to convert a database row to a job dict; the result is only
+    # decoded when asked for
+    @staticmethod
+    def _to_dict(db_row, include_result=False):
+        job = {name: db_row[name] for name in
+               ('id', 'path', 'extractor', 'priority', 'status', 'attempts', 'max_attempts',
+                'submitted', 'error', 'created', 'started', 'finished')}
+        if include_result:
+            job['result'] = json.loads(db_row['result']) if db_row['result'] else None
+        return job
+
+    def _get(self, job_id):
+        return self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    # Function to add a file to the queue. Returns (job, duplicate): duplicate is
+    # True when the file's content was already queued, running or done, and job
+    # is then the existing job. A failed duplicate is queued again. With
+    # delete_after the file is removed once its job is finished (or right away
+    # when it is a duplicate of another file's job).
+    def submit(self, file_path, extractor=None, priority='interactive', delete_after=False, max_attempts=None):
+        file_path = os.path.abspath(file_path)
+        key, extractor = job_key(file_path, extractor)
+        priority = priority_value(priority)
+        now = time.time()
+        with self._lock, self._db:
+            existing = self._db.execute("SELECT * FROM jobs WHERE key = ?", (key,)).fetchone()
+            if existing is not None and existing['status'] != 'failed':
+                # A more urgent submit moves a waiting job up
+                self._db.execute(
+                    "UPDATE jobs SET submitted = submitted + 1, "
+                    "priority = CASE WHEN status = 'queued' AND ? < priority THEN ? ELSE priority END WHERE id = ?",
+                    (priority, priority, existing['id']))
+                job = self._get(existing['id'])
+                duplicate = True
+            else:
+                waiting = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+                if waiting >= self.max_queued:
+                    raise QueueFull(f"{waiting} jobs are already waiting")
+                values = (file_path, extractor, priority, max_attempts or self.max_attempts, int(delete_after), now)
+                if existing is None:
+                    cursor = self._db.execute(
+                        "INSERT INTO jobs (key, path, extractor, priority, max_attempts, delete_after, created) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)", (key,) + values)
+                    job_id = cursor.lastrowid
+                else:
+                    job_id = existing['id']
+                    self._db.execute(
+                        "UPDATE jobs SET path = ?, extractor = ?, priority = ?, max_attempts = ?, delete_after = ?, "
+                        "created = ?, status = 'queued', attempts = 0, submitted = submitted + 1, not_before = 0, "
+                        "error = NULL, result = NULL, started = NULL, finished = NULL WHERE id = ?", values + (job_id,))
+                job = self._get(job_id)
+                duplicate = False
+        if duplicate and delete_after and job['path'] != file_path:
+            _remove(file_path)
+        return self._to_dict(job, include_result=job['status'] == 'done'), duplicate
+
+    # Function to submit every supported file of a folder. Returns the jobs,
+    # the number of duplicates and the skipped (unsupported) files.
+    def submit_folder(self, folder, extractor=None, priority='bulk'):
+        check_extractor(extractor)
+        jobs = []
+        duplicates = 0
+        skipped = []
+        for file_path in App.list_input_files(folder):
+            try:
+                job, duplicate = self.submit(file_path, extractor, priority)
+            except ValueError:
+                skipped.append(file_path)
+                continue
+            jobs.append(job)
+            duplicates += duplicate
+        return {'jobs': jobs, 'duplicates': duplicates, 'skipped': skipped}
+
+    # Function to take the next job that is due, marking it running.
+    # Returns None if no job is due.
+    def claim(self):
+        with self._lock, self._db:
+            while True:
+                db_row = self._db.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' AND not_before <= ? ORDER BY priority, id LIMIT 1",
+                    (time.time(),)).fetchone()
+                if db_row is None:
+                    return None
+                # Another process may have claimed the job in the meantime
+                cursor = self._db.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, started = ? "
+                    "WHERE id = ? AND status = 'queued'", (time.time(), db_row['id']))
+                if cursor.rowcount:
+                    return self._to_dict(self._get(db_row['id']))
+
+    # Function to store the result of a finished job
+    def complete(self, job_id, result):
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE jobs SET status = 'done', result = ?, error = NULL, finished = ? WHERE id = ?",
+                (json.dumps(result), time.time(), job_id))
+            db_row = self._get(job_id)
+        self._cleanup(db_row)
+        return self._to_dict(db_row, include_result=True)
+
+    # Function to record a failed attempt. The job is queued again with a
+    # growing delay unless it is out of attempts or retry is False.
+    def fail(self, job_id, error, retry=True):
+        with self._lock, self._db:
+            db_row = self._get(job_id)
+            if retry and db_row['attempts'] < db_row['max_attempts']:
+                delay = RETRY_DELAY * 2 ** (db_row['attempts'] - 1)
+                self._db.execute("UPDATE jobs SET status = 'queued', error = ?, not_before = ? WHERE id = ?",
+                                 (error, time.time() + delay, job_id))
+            else:
+                self._db.execute("UPDATE jobs SET status = 'failed', error = ?, finished = ? WHERE id = ?",
+                                 (error, time.time(), job_id))
+            db_row = self._get(job_id)
+        self._cleanup(db_row)
+        return self._to_dict(db_row)
+
+    # Function to remove the file of a finished job that asked for it
+    def _cleanup(self, db_row):
+        if db_row['delete_after'] and db_row['status'] in FINISHED_STATUSES:
+            _remove(db_row['path'])
+
+    # Function to put jobs left running by a stopped service back in the queue.
+    # Only call this when no other process is running jobs from this queue.
+    def recover(self):
+        with self._lock, self._db:
+            return self._db.execute("UPDATE jobs SET status = 'queued', attempts = MAX(attempts - 1, 0) "
+                                    "WHERE status = 'running'").rowcount
+
+    # Function to queue a failed job again with fresh attempts
+    def retry(self, job_id):
+        with self._lock, self._db:
+            return self._db.execute(
+                "UPDATE jobs SET status = 'queued', attempts = 0, not_before = 0, finished = NULL "
+                "WHERE id = ? AND status = 'failed'", (job_id,)).rowcount > 0
+
+    def get(self, job_id, include_result=True):
+        with self._lock:
+            db_row = self._get(job_id)
+        return self._to_dict(db_row, include_result) if db_row is not None else None
+
+    def list_jobs(self, status=None, limit=100, offset=0):
+        sql = "SELECT * FROM jobs"
+        params = []
+        if status:
+            sql += " WHERE status = ?"
+            params.append(status)
+        sql += " ORDER BY id DESC LIMIT ? OFFSET ?"
+        params += [limit, offset]
+        with self._lock:
+            return [self._to_dict(db_row) for db_row in self._db.execute(sql, params)]
+
+    # Function to delete finished jobs (and their results) older than max_age seconds
+    def prune(self, max_age):
+        with self._lock, self._db:
+            return self._db.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished < ?",
+                                    (time.time() - max_age,)).rowcount
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            waiting = dict(self._db.execute(
+                "SELECT priority, COUNT(*) FROM jobs WHERE status = 'queued' GROUP BY priority").fetchall())
+        stats = {status: counts.get(status, 0) for status in STATUSES}
+        stats['queued_by_priority'] = {str(priority): count for priority, count in sorted(waiting.items())}
+        stats['max_queued'] = self.max_queued
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+# Function to delete a file, ignoring files that are already gone
+def _remove(file_path):
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Submit files to the extraction job queue and inspect jobs")
+    parser.add_argument('--queue', default=DEFAULT_QUEUE_PATH, help="job queue database (default: job_queue.sqlite3)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    submit_parser = subparsers.add_parser('submit', help="queue files or folders for extraction")
+    submit_parser.add_argument('paths', nargs='+', help="files or folders")
+    submit_parser.add_argument('--priority', default='bulk', help="interactive, bulk or a number (lower runs first)")
+    submit_parser.add_argument('--extractor', default=None, choices=sorted(App.EXTRACTORS),
+                               help="extractor for files without a known extension")
+    submit_parser.add_argument('--max-queued', type=int, default=DEFAULT_MAX_QUEUED,
+                               help="refuse new jobs once this many are waiting")
+
+    status_parser = subparsers.add_parser('status', help="show one job")
+    status_parser.add_argument('job_id', type=int)
+    status_parser.add_argument('--result', action='store_true', help="include the extracted text and rows")
+
+    list_parser = subparsers.add_parser('list', help="list recent jobs")
+    list_parser.add_argument('--status', choices=STATUSES, default=None)
+    list_parser.add_argument('--limit', type=int, default=50)
+
+    retry_parser = subparsers.add_parser('retry', help="queue a failed job again")
+    retry_parser.add_argument('job_id', type=int)
+
+    prune_parser = subparsers.add_parser('prune', help="delete finished jobs")
+    prune_parser.add_argument('--days', type=float, default=30, help="keep jobs finished in the last N days")
+
+    subparsers.add_parser('stats', help="count jobs per status")
+    args = parser.parse_args()
+
+    queue = JobQueue(args.queue, max_queued=getattr(args, 'max_queued', DEFAULT_MAX_QUEUED))
+    try:
+        if args.command == 'submit':
+            submitted = duplicates = 0
+            for path in args.paths:
+                try:
+                    if os.path.isdir(path):
+                        result = queue.submit_folder(path, args.extractor, args.priority)
+                        submitted += len(result['jobs'])
+                        duplicates += result['duplicates']
+                        for skipped in result['skipped']:
+                            print(f"Skipping unsupported file: {skipped}")
+                    else:
+                        _, duplicate = queue.submit(path, args.extractor, args.priority)
+                        submitted += 1
+                        duplicates += duplicate
+                except QueueFull as e:
+                    print(f"Queue is full ({e}); stopped at {path}")
+                    sys.exit(1)
+            print(f"Submitted {submitted} jobs ({duplicates} already queued or done)")
+        elif args.command == 'status':
+            job = queue.get(args.job_id, include_result=args.result)
+            if job is None:
+                print(f"Unknown job {args.job_id}")
+                sys.exit(1)
+            print(json.dumps(job, indent=2))
+        elif args.command == 'list':
+            for job in queue.list_jobs(args.status, args.limit):
+                print(f"{job['id']:>8}  {job['status']:<8}{job['priority']:>4}  {job['attempts']}/{job['max_attempts']}  "
+                      f"{job['path']}" + (f"  ({job['error']})" if job['error'] else ""))
+        elif args.command == 'retry':
+            if not queue.retry(args.job_id):
+                print(f"Job {args.job_id} is not a failed job")
+                sys.exit(1)
+            print(f"Job {args.job_id} queued again")
+        elif args.command == 'prune':
+            print(f"Deleted {queue.prune(args.days * 86400)} finished jobs")
+        else:
+            print(json.dumps(queue.stats(), indent=2))
+    finally:
+        queue.close()
@@ -0,0 +1,56 @@
+import os
+import json
+
+from extraction_cache import hash_file
+
+# Function to load a manifest of processed files ({relative path: {'mtime', 'size', 'hash'}})
+def load_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, 'r') as file:
+            return json.load(file)
+    except json.JSONDecodeError as e:
+        print(f"Error decoding manifest {manifest_path}: {e}. Treating every file as new.")
+        return {}
+
+# Function to save a manifest, replacing the old one in a single step
+def save_manifest(manifest, manifest_path):
+    temp_path = manifest_path + '.tmp'
+    with open(temp_path, 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(temp_path, manifest_path)
+
+# Function to compare a folder against its manifest.
+# A file whose mtime and size match its entry is taken as unchanged without
+# reading it; otherwise it is hashed, so a file that was only touched is not
+# reprocessed. Returns a dict with the 'new', 'changed', 'unchanged' and
+# 'deleted' relative paths, and 'entries' with the current entry of every file.
+def scan_folder(input_folder, manifest):
+    changes = {'new': [], 'changed': [], 'unchanged': [], 'deleted': [], 'entries': {}}
+    seen = set()
+    for root, dirs, files in os.walk(input_folder):
+        dirs.sort()
+        for file in sorted(files):
+            file_path = os.path.join(root, file)
+            rel_path = os.path.relpath(file_path, input_folder).replace(os.sep, '/')
+            seen.add(rel_path)
+            stat = os.stat(file_path)
+            entry = {'mtime': stat.st_mtime, 'size': stat.st_size}
+            old_entry = manifest.get(rel_path)
+
+            if old_entry and old_entry['mtime'] == entry['mtime'] and old_entry['size'] == entry['size']:
+                entry['hash'] = old_entry['hash']
+                changes['unchanged'].append(rel_path)
+            else:
+                entry['hash'] = hash_file(file_path)
+                if old_entry is None:
+                    changes['new'].append(rel_path)
+                elif old_entry['hash'] == entry['hash']:
+                    changes['unchanged'].append(rel_path)
+                else:
+                    changes['changed'].append(rel_path)
+            changes['entries'][rel_path] = entry
+
+    changes['deleted'] = sorted(rel_path for rel_path in manifest if rel_path not in seen)
+    return changes
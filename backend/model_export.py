@@ -0,0 +1,259 @@
+import os
+import json
+import time
+import argparse
+
+import AiTemplateBuild
+
+# CPU export and serving of the tabular category model (the custom GPT).
+#
+# export_model() turns the trained state dict into serving artefacts:
+#   - 'int8':        dynamically quantised (int8 Linear weights) TorchScript;
+#   - 'torchscript': fp32 TorchScript;
+#   - 'onnx':        fp32 ONNX, for onnxruntime.
+# Each artefact gets a <artefact>.json next to it with the input layout, so
+# serving loads the artefact alone: no model.py, tabular_config.py or eager
+# model construction.
+#
+# All artefacts take (features, category feature 0, 1, ...) and return the
+# logits only. load_predictor() picks the runtime by file extension and
+# returns a predictor whose predict() classifies a whole batch of rows.
+#
+# compare_models() runs the eager model and every artefact over the same rows
+# and reports load time, rows per second, size on disk and how often each one
+# agrees with the eager model's prediction.
+
+FORMATS = ('int8', 'torchscript', 'onnx')
+
+# File name of each artefact in the output folder
+ARTEFACT_NAMES = {
+    'int8': 'category_model.int8.pt',
+    'torchscript': 'category_model.pt',
+    'onnx': 'category_model.onnx',
+}
+
+# Rows per forward pass when serving
+DEFAULT_BATCH_SIZE = 256
+
+ONNX_OPSET = 17
+
+# Function to wrap the GPT model so it takes flat tensor inputs and returns
+# only the logits, which TorchScript and ONNX need
+def logits_module(model):
+    import torch
+
+    class LogitsOnly(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, features, *category_features):
+            logits, _ = self.model(features, list(category_features))
+            return logits
+
+    return LogitsOnly(model).eval()
+
+# Function to build a batch of example inputs with the model's input layout
+def example_inputs(n_features, category_sizes=AiTemplateBuild.CATEGORY_FEATURE_SIZES, batch_size=1, seed=None):
+    import torch
+    generator = torch.Generator().manual_seed(seed) if seed is not None else None
+    features = torch.randn(batch_size, n_features, generator=generator)
+    category_features = [torch.randint(0, size, (batch_size,), generator=generator) for size in category_sizes]
+    return features, category_features
+
+# Function to dynamically quantise the Linear layers of a model to int8
+def quantize_model(model):
+    import torch
+    quantization = getattr(torch, 'ao', torch).quantization
+    return quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+# Function to turn logits into one predicted class per row.
+# Sequence outputs (batch, positions, classes) keep the last position.
+def predicted_classes(logits, rows):
+    return logits.reshape(rows, -1, logits.shape[-1])[:, -1].argmax(-1).tolist()
+
+# Function to write the input layout of an artefact next to it
+def _write_metadata(artefact_path, artefact_format, config):
+    metadata = {
+        'format': artefact_format,
+        'n_features': config.n_features,
+        'category_sizes': list(AiTemplateBuild.CATEGORY_FEATURE_SIZES),
+        'output_size': config.output_size,
+    }
+    with open(artefact_path + '.json', 'w') as file:
+        json.dump(metadata, file, indent=2)
+    return metadata
+
+# Function to export the trained state dict to the requested formats.
+# Returns {format: artefact path}.
+def export_model(model_path, output_dir, formats=FORMATS, category_transformer_path=None):
+    import torch
+    if category_transformer_path:
+        AiTemplateBuild.add_category_transformer_path(category_transformer_path)
+    model, config = AiTemplateBuild.load_tabular_model(model_path)
+    os.makedirs(output_dir, exist_ok=True)
+    features, category_features = example_inputs(config.n_features, batch_size=2, seed=0)
+    inputs = (features, *category_features)
+
+    artefacts = {}
+    with torch.inference_mode():
+        for artefact_format in formats:
+            artefact_path = os.path.join(output_dir, ARTEFACT_NAMES[artefact_format])
+            started = time.perf_counter()
+            if artefact_format == 'onnx':
+                names = ['features'] + [f'category_{i}' for i in range(len(category_features))]
+                torch.onnx.export(
+                    logits_module(model), inputs, artefact_path,
+                    input_names=names, output_names=['logits'],
+                    dynamic_axes={name: {0: 'rows'} for name in names + ['logits']},
+                    opset_version=ONNX_OPSET,
+                )
+            else:
+                module = quantize_model(model) if artefact_format == 'int8' else model
+                traced = torch.jit.trace(logits_module(module), inputs, check_trace=False)
+                traced = torch.jit.freeze(traced)
+                torch.jit.save(traced, artefact_path)
+            _write_metadata(artefact_path, artefact_format, config)
+            artefacts[artefact_format] = artefact_path
+            print(f"Exported {artefact_format} model to {artefact_path} in {time.perf_counter() - started:.2f}s")
+    return artefacts
+
+# Predictor over any torch module that returns logits (eager, quantised or TorchScript)
+class TorchPredictor:
+    def __init__(self, module, n_features, category_sizes, batch_size=DEFAULT_BATCH_SIZE):
+        self.module = module
+        self.n_features = n_features
+        self.category_sizes = category_sizes
+        self.batch_size = batch_size
+
+    # Function to classify a batch of rows: features (rows, n_features) and
+    # one (rows,) tensor per categorical input
+    def predict(self, features, category_features):
+        import torch
+        classes = []
+        with torch.inference_mode():
+            for start in range(0, features.shape[0], self.batch_size):
+                end = start + self.batch_size
+                logits = self.module(features[start:end], *[values[start:end] for values in category_features])
+                classes.extend(predicted_classes(logits, features[start:end].shape[0]))
+        return classes
+
+# Predictor over an ONNX artefact, run with onnxruntime
+class OnnxPredictor:
+    def __init__(self, artefact_path, n_features, category_sizes, batch_size=DEFAULT_BATCH_SIZE, threads=None):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError("Serving an ONNX model needs the onnxruntime package") from None
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(artefact_path, options, providers=['CPUExecutionProvider'])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+        self.n_features = n_features
+        self.category_sizes = category_sizes
+        self.batch_size = batch_size
+
+    def predict(self, features, category_features):
+        import torch
+        features = features.float().numpy()
+        category_features = [values.long().numpy() for values in category_features]
+        classes = []
+        for start in range(0, features.shape[0], self.batch_size):
+            end = start + self.batch_size
+            values = [features[start:end]] + [values[start:end] for values in category_features]
+            (logits,) = self.session.run(['logits'], dict(zip(self.input_names, values)))
+            classes.extend(predicted_classes(torch.from_numpy(logits), values[0].shape[0]))
+        return classes
+
+# Function to load an exported artefact for serving, using its metadata file
+def load_predictor(artefact_path, batch_size=DEFAULT_BATCH_SIZE, threads=None):
+    import torch
+    with open(artefact_path + '.json', 'r') as file:
+        metadata = json.load(file)
+    if threads:
+        torch.set_num_threads(threads)
+    if metadata['format'] == 'onnx':
+        return OnnxPredictor(artefact_path, metadata['n_features'], metadata['category_sizes'],
+                             batch_size=batch_size, threads=threads)
+    module = torch.jit.load(artefact_path, map_location='cpu')
+    module.eval()
+    return TorchPredictor(module, metadata['n_features'], metadata['category_sizes'], batch_size=batch_size)
+
+# Function to build a predictor over the eager fp32 model from the state dict
+def load_eager_predictor(model_path, batch_size=DEFAULT_BATCH_SIZE):
+    model, config = AiTemplateBuild.load_tabular_model(model_path)
+    return TorchPredictor(logits_module(model), config.n_features, list(AiTemplateBuild.CATEGORY_FEATURE_SIZES),
+                          batch_size=batch_size)
+
+# Function to time the eager model and each artefact on the same rows.
+# Agreement is the share of rows where a model predicts the same class as the
+# eager model; pass labels to also get accuracy.
+def compare_models(model_path, artefacts, rows=10000, batch_size=DEFAULT_BATCH_SIZE, labels=None, seed=0):
+    started = time.perf_counter()
+    eager = load_eager_predictor(model_path, batch_size=batch_size)
+    candidates = [('eager', model_path, eager, time.perf_counter() - started)]
+    for artefact_path in artefacts:
+        started = time.perf_counter()
+        predictor = load_predictor(artefact_path, batch_size=batch_size)
+        name = os.path.basename(artefact_path)
+        candidates.append((name, artefact_path, predictor, time.perf_counter() - started))
+
+    features, category_features = example_inputs(eager.n_features, eager.category_sizes, batch_size=rows, seed=seed)
+    reference = None
+    results = []
+    for name, path, predictor, load_seconds in candidates:
+        # One warm-up batch so one-off graph optimisation is not timed
+        predictor.predict(features[:batch_size], [values[:batch_size] for values in category_features])
+        started = time.perf_counter()
+        classes = predictor.predict(features, category_features)
+        seconds = time.perf_counter() - started
+        if reference is None:
+            reference = classes
+        result = {
+            'model': name,
+            'load_seconds': round(load_seconds, 3),
+            'size_mb': round(os.path.getsize(path) / (1024 * 1024), 2),
+            'rows_per_second': round(rows / seconds, 1) if seconds else None,
+            'agreement': round(sum(a == b for a, b in zip(classes, reference)) / rows, 4),
+        }
+        if labels is not None:
+            result['accuracy'] = round(sum(a == b for a, b in zip(classes, labels)) / len(labels), 4)
+        results.append(result)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the tabular category model for CPU serving and compare it to the eager model")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help="write int8/TorchScript/ONNX artefacts from the state dict")
+    export_parser.add_argument('model_path', help="state dict of the trained tabular model")
+    export_parser.add_argument('--output-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models'),
+                               help="folder for the artefacts")
+    export_parser.add_argument('--formats', nargs='+', choices=FORMATS, default=list(FORMATS))
+    export_parser.add_argument('--category-transformer-path', default=AiTemplateBuild.CATEGORY_TRANSFORMER_PATH,
+                               help="folder containing model.py and tabular_config.py")
+
+    compare_parser = subparsers.add_parser('compare', help="compare speed and agreement of artefacts with the eager model")
+    compare_parser.add_argument('model_path', help="state dict of the trained tabular model")
+    compare_parser.add_argument('artefacts', nargs='+', help="exported artefacts (.pt or .onnx)")
+    compare_parser.add_argument('--rows', type=int, default=10000, help="number of synthetic rows")
+    compare_parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    compare_parser.add_argument('--threads', type=int, default=None, help="torch CPU threads")
+    compare_parser.add_argument('--category-transformer-path', default=AiTemplateBuild.CATEGORY_TRANSFORMER_PATH,
+                                help="folder containing model.py and tabular_config.py")
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        export_model(args.model_path, args.output_dir, args.formats, args.category_transformer_path)
+    else:
+        import torch
+        if args.threads:
+            torch.set_num_threads(args.threads)
+        AiTemplateBuild.add_category_transformer_path(args.category_transformer_path)
+        results = compare_models(args.model_path, args.artefacts, rows=args.rows, batch_size=args.batch_size)
+        print(f"{'model':<28}{'load s':>8}{'size MB':>9}{'rows/s':>12}{'agreement':>11}")
+        for result in results:
+            print(f"{result['model']:<28}{result['load_seconds']:>8}{result['size_mb']:>9}"
+                  f"{result['rows_per_second']:>12}{result['agreement']:>11}")
@@ -0,0 +1,306 @@
+import os
+import shutil
+import tempfile
+import time
+import argparse
+import multiprocessing
+
+import instrument
+
+# OCR subsystem used by App.iter_image_text and runnable on its own for bulk OCR.
+#
+# Every page is normalised once before it reaches Tesseract: converted to
+# grayscale, scaled down to TARGET_DPI (or MAX_SIDE pixels for photos without
+# usable DPI information) and binarised with an Otsu threshold. Multi-page
+# TIFFs are split into pages. Pages are sent to Tesseract in batches: one
+# Tesseract run reads a list file naming every page image of the batch, so the
+# process start-up and language model load are paid once per batch instead of
+# once per page. ocr_files spreads the batches over a pool of worker processes.
+#
+# PIL and pytesseract are imported inside the functions that use them.
+
+# Tesseract OCR executable. Set TESSERACT_CMD in the environment, pass
+# --tesseract-cmd, or put tesseract on the PATH.
+TESSERACT_CMD = (os.environ.get('TESSERACT_CMD')
+                 or shutil.which('tesseract')
+                 or r"C:/Users/wonde/AppData/Local/Programs/Tesseract-OCR/tesseract.exe")
+
+# Resolution pages are normalised to; Tesseract works best at about 300 DPI
+TARGET_DPI = 300
+
+# Longest side in pixels for images without DPI information (a letter page at 300 DPI is 3300 px)
+MAX_SIDE = 3500
+
+# Number of pages sent to one Tesseract run
+DEFAULT_BATCH_SIZE = 8
+
+# Tesseract separates the pages of a multi-image run with a form feed
+PAGE_SEPARATOR = '\f'
+
+# Function to change the Tesseract executable. The environment variable is set
+# as well so worker processes started later use the same executable.
+def set_tesseract_cmd(cmd):
+    global TESSERACT_CMD
+    TESSERACT_CMD = cmd
+    os.environ['TESSERACT_CMD'] = cmd
+
+# Function to import pytesseract and point it at the Tesseract executable
+def _load_pytesseract():
+    import pytesseract
+    pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+    return pytesseract
+
+# Function to compute the Otsu threshold of a grayscale histogram
+def otsu_threshold(histogram):
+    total = sum(histogram)
+    sum_all = sum(i * count for i, count in enumerate(histogram))
+    sum_background = 0
+    weight_background = 0
+    best_threshold = 0
+    best_variance = -1.0
+    for threshold, count in enumerate(histogram):
+        weight_background += count
+        if weight_background == 0:
+            continue
+        weight_foreground = total - weight_background
+        if weight_foreground == 0:
+            break
+        sum_background += threshold * count
+        mean_background = sum_background / weight_background
+        mean_foreground = (sum_all - sum_background) / weight_foreground
+        variance = weight_background * weight_foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_variance = variance
+            best_threshold = threshold
+    return best_threshold
+
+# Function to work out the size a page is scaled down to, or None to keep it
+def _target_size(size, dpi, target_dpi=TARGET_DPI, max_side=MAX_SIDE):
+    width, height = size
+    scale = 1.0
+    if dpi and dpi > target_dpi:
+        scale = target_dpi / dpi
+    elif max(width, height) > max_side:
+        scale = max_side / max(width, height)
+    if scale >= 1.0:
+        return None
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+# Function to normalise one page for OCR: grayscale, scaled down to the target
+# resolution and, if threshold is set, binarised
+def preprocess_image(img, target_dpi=TARGET_DPI, max_side=MAX_SIDE, threshold=True):
+    from PIL import Image
+
+    dpi = img.info.get('dpi')
+    size = _target_size(img.size, float(dpi[0]) if dpi else None, target_dpi, max_side)
+    if size is not None:
+        # For JPEGs this makes the decoder itself downscale by a power of two,
+        # so large photos are never decoded at full resolution
+        img.draft('L', size)
+    if img.mode != 'L':
+        img = img.convert('L')
+    # draft only gets close to the requested size
+    if size is not None and img.size != size:
+        img = img.resize(size, Image.LANCZOS)
+    if threshold:
+        cutoff = otsu_threshold(img.histogram())
+        img = img.point([0] * (cutoff + 1) + [255] * (255 - cutoff))
+    return img
+
+# Function to count the pages (frames) of an image file without decoding them
+def count_pages(image_file):
+    from PIL import Image
+    with Image.open(image_file) as img:
+        return getattr(img, 'n_frames', 1)
+
+# Function to load and preprocess one page of an image file
+def load_page(image_file, page=0, **preprocess):
+    from PIL import Image
+    with Image.open(image_file) as img:
+        if page:
+            img.seek(page)
+        page_img = preprocess_image(img, **preprocess)
+        page_img.load()
+    return page_img
+
+# Function to OCR a batch of pages with a single Tesseract run.
+# pages is a list of (image_file, page number); returns one text per page.
+def ocr_batch(pages, lang=None, config='', **preprocess):
+    with instrument.span('ocr', file=pages[0][0] if pages else None) as span:
+        texts = _ocr_batch(pages, lang, config, **preprocess)
+        span.add(rows=len(texts), bytes=sum(len(text) for text in texts))
+    return texts
+
+def _ocr_batch(pages, lang=None, config='', **preprocess):
+    pytesseract = _load_pytesseract()
+    target_dpi = preprocess.get('target_dpi', TARGET_DPI)
+    with tempfile.TemporaryDirectory(prefix='ocr-') as tmp_dir:
+        image_paths = []
+        for i, (image_file, page) in enumerate(pages):
+            img = load_page(image_file, page, **preprocess)
+            image_path = os.path.join(tmp_dir, f'page{i:04d}.png')
+            # Pages are normalised to the target resolution; recording it
+            # saves Tesseract from guessing
+            img.save(image_path, dpi=(target_dpi, target_dpi))
+            image_paths.append(image_path)
+
+        if len(image_paths) == 1:
+            return [pytesseract.image_to_string(image_paths[0], lang=lang, config=config)]
+
+        # Tesseract treats a .txt input as a list of images to read in one run
+        list_path = os.path.join(tmp_dir, 'pages.txt')
+        with open(list_path, 'w') as file:
+            file.write('\n'.join(image_paths) + '\n')
+        output = pytesseract.image_to_string(list_path, lang=lang, config=config)
+
+    texts = output.split(PAGE_SEPARATOR)
+    if len(texts) < len(pages):
+        raise RuntimeError(f"Tesseract returned {len(texts)} pages for a batch of {len(pages)}")
+    return texts[:len(pages)]
+
+# Function to yield the text of every page of one image file, in page order.
+# Runs in the calling process, so it can be used inside other pool workers.
+def iter_ocr_pages(image_file, batch_size=DEFAULT_BATCH_SIZE, lang=None, **preprocess):
+    page_count = count_pages(image_file)
+    for start in range(0, page_count, batch_size):
+        pages = [(image_file, page) for page in range(start, min(start + batch_size, page_count))]
+        for text in ocr_batch(pages, lang=lang, **preprocess):
+            yield text
+
+# Pool worker set-up: pin Tesseract to one thread, since the pool already
+# keeps every core busy
+def _init_worker(tesseract_cmd):
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+    if tesseract_cmd:
+        set_tesseract_cmd(tesseract_cmd)
+
+# Pool worker: OCR one batch and report errors instead of raising.
+# The worker's instrumentation totals go back with the result.
+def _ocr_batch_worker(args):
+    pages, lang, preprocess = args
+    try:
+        return ocr_batch(pages, lang=lang, **preprocess), None, instrument.collect()
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}", instrument.collect()
+
+# Throughput counters of an ocr_files run
+class OCRStats:
+    def __init__(self):
+        self.files = 0
+        self.pages = 0
+        self.batches = 0
+        self.failed_pages = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def pages_per_second(self):
+        return self.pages / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'files': self.files,
+            'pages': self.pages,
+            'batches': self.batches,
+            'failed_pages': self.failed_pages,
+            'seconds': round(self.elapsed, 3),
+            'pages_per_second': round(self.pages_per_second, 2),
+        }
+
+# Function to OCR many image files on a pool of worker processes.
+# The pages of all files are cut into batches of batch_size and the batches are
+# spread over the workers. Yields one result dict per file ({'path', 'pages',
+# 'text', 'error'}) in input order, as soon as all its pages are done.
+# Pass an OCRStats to collect the throughput.
+def ocr_files(image_files, workers=None, batch_size=DEFAULT_BATCH_SIZE, lang=None, stats=None, **preprocess):
+    image_files = list(image_files)
+    workers = max(1, workers or os.cpu_count() or 1)
+    stats = stats if stats is not None else OCRStats()
+
+    page_counts = []
+    page_texts = []
+    errors = []
+    jobs = []
+    for file_index, image_file in enumerate(image_files):
+        try:
+            page_count = count_pages(image_file)
+            errors.append(None)
+        except Exception as e:
+            page_count = 0
+            errors.append(f"{type(e).__name__}: {e}")
+        page_counts.append(page_count)
+        page_texts.append([None] * page_count)
+        for page in range(page_count):
+            jobs.append((file_index, page))
+
+    batches = [jobs[i:i + batch_size] for i in range(0, len(jobs), batch_size)]
+    remaining = list(page_counts)
+    next_file = 0
+
+    pool = multiprocessing.Pool(processes=workers, initializer=_init_worker,
+                                initargs=(os.environ.get('TESSERACT_CMD') or TESSERACT_CMD,))
+    try:
+        arguments = [([(image_files[f], p) for f, p in batch], lang, preprocess) for batch in batches]
+        for batch, (texts, error, metrics) in zip(batches, pool.imap(_ocr_batch_worker, arguments)):
+            instrument.merge(metrics)
+            stats.batches += 1
+            for i, (file_index, page) in enumerate(batch):
+                if error:
+                    errors[file_index] = errors[file_index] or error
+                    stats.failed_pages += 1
+                else:
+                    page_texts[file_index][page] = texts[i]
+                    stats.pages += 1
+                remaining[file_index] -= 1
+
+            while next_file < len(image_files) and remaining[next_file] == 0:
+                yield _file_result(image_files[next_file], page_counts[next_file],
+                                   page_texts[next_file], errors[next_file], stats)
+                next_file += 1
+
+        while next_file < len(image_files):
+            yield _file_result(image_files[next_file], page_counts[next_file],
+                               page_texts[next_file], errors[next_file], stats)
+            next_file += 1
+    finally:
+        pool.terminate()
+        pool.join()
+        stats.elapsed = time.perf_counter() - stats.started
+
+def _file_result(image_file, page_count, texts, error, stats):
+    stats.files += 1
+    text = None if error else '\n'.join(texts)
+    return {'path': image_file, 'pages': page_count, 'text': text, 'error': error}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OCR image files in batches on a worker pool")
+    parser.add_argument('files', nargs='+', help="image files (multi-page TIFFs are split into pages)")
+    parser.add_argument('-o', '--output', default=None, help="write the text of all files to this file")
+    parser.add_argument('--workers', type=int, default=None, help="number of worker processes (default: number of cores)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="pages per Tesseract run")
+    parser.add_argument('--lang', default=None, help="Tesseract language(s), e.g. eng")
+    parser.add_argument('--dpi', type=int, default=TARGET_DPI, help="resolution pages are normalised to")
+    parser.add_argument('--max-side', type=int, default=MAX_SIDE, help="longest side in pixels for images without DPI information")
+    parser.add_argument('--no-threshold', action='store_true', help="do not binarise pages")
+    parser.add_argument('--tesseract-cmd', default=None, help="path to the Tesseract executable")
+    args = parser.parse_args()
+    if args.tesseract_cmd:
+        set_tesseract_cmd(args.tesseract_cmd)
+
+    stats = OCRStats()
+    out = open(args.output, 'w') if args.output else None
+    try:
+        for result in ocr_files(args.files, workers=args.workers, batch_size=args.batch_size, lang=args.lang,
+                                stats=stats, target_dpi=args.dpi, max_side=args.max_side,
+                                threshold=not args.no_threshold):
+            if result['error']:
+                print(f"Failed to OCR {result['path']}: {result['error']}")
+                continue
+            print(f"{result['path']}: {result['pages']} page(s)")
+            if out:
+                out.write(result['text'] + '\n')
+    finally:
+        if out:
+            out.close()
+    print(f"OCR: {stats.pages} pages in {stats.elapsed:.2f}s ({stats.pages_per_second:.2f} pages/s), "
+          f"{stats.batches} Tesseract runs, {stats.failed_pages} failed pages")
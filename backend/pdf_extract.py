@@ -0,0 +1,274 @@
+import os
+import sys
+import hashlib
+import argparse
+import multiprocessing
+from collections import deque
+from io import StringIO
+
+import ocr
+import instrument
+
+# Page-level PDF extraction.
+#
+# Pages are extracted independently with pdfminer's TextConverter, so only one
+# page's layout is held in memory at a time, and the pages of a large document
+# can be spread over a pool of worker processes in groups of PAGES_PER_JOB.
+# Results are yielded in page order as soon as they are ready.
+#
+# Pages without a text layer (scans) are rendered with pdf2image, if it is
+# installed, and sent through ocr.py; pages with text never go near Tesseract.
+#
+# With an ExtractionCache, every page is cached on its own, keyed by a hash of
+# the page's content streams, so a re-uploaded PDF with one changed page only
+# re-extracts that page.
+#
+# pdfminer and pdf2image are imported inside the functions that use them.
+
+# Version of the page extractor; bump it whenever the page text changes
+PAGE_EXTRACTOR_VERSION = 1
+
+# Number of consecutive pages handed to a pool worker at once
+PAGES_PER_JOB = 8
+
+# A page with fewer non-whitespace characters than this has no usable text layer
+MIN_TEXT_CHARS = 10
+
+# Resolution text-less pages are rendered at before OCR
+OCR_RENDER_DPI = 300
+
+# pdfminer ends every page with a form feed; OCR'd pages get the same separator
+PAGE_SEPARATOR = '\f'
+
+# Function to parse a page range such as "1-5,8,10-" into a sorted list of
+# zero-based page numbers. Page numbers in the range are one-based.
+def parse_page_range(page_range, page_count):
+    if not page_range:
+        return list(range(page_count))
+    pages = set()
+    for part in page_range.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = part.split('-', 1)
+            start = int(start) if start.strip() else 1
+            end = int(end) if end.strip() else page_count
+        else:
+            start = end = int(part)
+        if start < 1 or end < start:
+            raise ValueError(f"Invalid page range: {part}")
+        pages.update(range(start - 1, min(end, page_count)))
+    return sorted(pages)
+
+# Function to hash what is drawn on a page: its content streams, the streams of
+# the XObjects (images, forms) it uses, its size and its rotation
+def hash_page(page):
+    from pdfminer.pdftypes import resolve1, PDFStream
+
+    digest = hashlib.sha256()
+    digest.update(repr((page.mediabox, page.rotate)).encode())
+    for stream in page.contents:
+        stream = resolve1(stream)
+        if isinstance(stream, PDFStream):
+            digest.update(stream.get_rawdata() or b'')
+    xobjects = resolve1((page.resources or {}).get('XObject')) or {}
+    for name in sorted(xobjects):
+        stream = resolve1(xobjects[name])
+        if isinstance(stream, PDFStream):
+            digest.update(name.encode() if isinstance(name, str) else bytes(name))
+            digest.update(stream.get_rawdata() or b'')
+    return digest.hexdigest()
+
+# Function to list the pages of a PDF with their content hashes.
+# Only the page tree and content streams are read; no layout analysis is done.
+def scan_pages(pdf_file):
+    from pdfminer.pdfpage import PDFPage
+    with open(pdf_file, 'rb') as fp:
+        return [hash_page(page) for page in PDFPage.get_pages(fp)]
+
+# Function to count the pages of a PDF
+def count_pdf_pages(pdf_file):
+    from pdfminer.pdfpage import PDFPage
+    with open(pdf_file, 'rb') as fp:
+        return sum(1 for page in PDFPage.get_pages(fp))
+
+# Function to check whether a page's extracted text is a real text layer
+def has_text_layer(text):
+    return len(''.join(text.split())) >= MIN_TEXT_CHARS
+
+# Function to OCR one page of a PDF, or return None if pdf2image is missing
+def ocr_pdf_page(pdf_file, page_number, dpi=OCR_RENDER_DPI):
+    try:
+        from pdf2image import convert_from_path
+    except ImportError:
+        return None
+    import tempfile
+    images = convert_from_path(pdf_file, dpi=dpi, first_page=page_number + 1, last_page=page_number + 1)
+    if not images:
+        return None
+    with tempfile.TemporaryDirectory(prefix='pdf-ocr-') as tmp_dir:
+        image_path = os.path.join(tmp_dir, 'page.png')
+        images[0].save(image_path, dpi=(dpi, dpi))
+        return ''.join(ocr.iter_ocr_pages(image_path, target_dpi=dpi))
+
+# Function to extract the given pages of a PDF, yielding (page number, text,
+# method) in page order, where method is 'text', 'ocr' or 'empty'
+def iter_page_texts(pdf_file, page_numbers, use_ocr=True):
+    from pdfminer.converter import TextConverter
+    from pdfminer.layout import LAParams
+    from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+    from pdfminer.pdfpage import PDFPage
+
+    page_numbers = sorted(page_numbers)
+    with open(pdf_file, 'rb') as fp, StringIO() as output_string:
+        rsrcmgr = PDFResourceManager()
+        device = TextConverter(rsrcmgr, output_string, laparams=LAParams())
+        interpreter = PDFPageInterpreter(rsrcmgr, device)
+        pages = PDFPage.get_pages(fp, pagenos=set(page_numbers))
+        for page_number, page in zip(page_numbers, pages):
+            interpreter.process_page(page)
+            text = output_string.getvalue()
+            output_string.seek(0)
+            output_string.truncate()
+
+            method = 'text'
+            if not has_text_layer(text):
+                ocr_text = ocr_pdf_page(pdf_file, page_number) if use_ocr else None
+                if ocr_text is None:
+                    method = 'empty'
+                else:
+                    text = ocr_text.rstrip(PAGE_SEPARATOR) + PAGE_SEPARATOR
+                    method = 'ocr'
+            yield page_number, text, method
+
+# Pool worker: extract a group of pages and report errors instead of raising.
+# The worker's instrumentation totals go back with the result.
+def _page_worker(args):
+    pdf_file, page_numbers, use_ocr = args
+    try:
+        return list(iter_page_texts(pdf_file, page_numbers, use_ocr=use_ocr)), None, instrument.collect()
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}", instrument.collect()
+
+# Counters of the pages handled by iter_pdf_pages
+class PageStats:
+    def __init__(self):
+        self.pages = 0
+        self.cached = 0
+        self.text = 0
+        self.ocr = 0
+        self.empty = 0
+
+    def as_dict(self):
+        return {'pages': self.pages, 'cached': self.cached, 'text': self.text, 'ocr': self.ocr, 'empty': self.empty}
+
+# Function to split sorted page numbers into groups of at most size pages
+def _page_groups(page_numbers, size):
+    return [page_numbers[i:i + size] for i in range(0, len(page_numbers), size)]
+
+# Function to extract the text of a PDF page by page, yielding one string per
+# page in page order. pages is an optional one-based range ("1-5,8").
+# With workers > 1 the pages are extracted on a process pool; inside a pool
+# worker (which cannot start its own pool) they are extracted in-process.
+def iter_pdf_pages(pdf_file, pages=None, workers=1, cache=None, use_ocr=True, stats=None):
+    stats = stats if stats is not None else PageStats()
+    if cache is not None:
+        page_hashes = scan_pages(pdf_file)
+        page_count = len(page_hashes)
+    else:
+        page_count = count_pdf_pages(pdf_file)
+    page_numbers = parse_page_range(pages, page_count)
+
+    keys = {}
+    results = {}
+    missing = []
+    for page_number in page_numbers:
+        if cache is not None:
+            keys[page_number] = cache.make_key(page_hashes[page_number], 'pdf-page', PAGE_EXTRACTOR_VERSION)
+            text = cache.get(keys[page_number])
+            if text is not None:
+                results[page_number] = text
+                stats.cached += 1
+                instrument.count('cache_hit', cache='pdf-page')
+                continue
+            instrument.count('cache_miss', cache='pdf-page')
+        missing.append(page_number)
+
+    def store(page_number, text, method):
+        setattr(stats, method, getattr(stats, method) + 1)
+        instrument.count('pdf_pages', method=method)
+        # Empty pages are not cached, so they are retried once OCR is available
+        if cache is not None and method != 'empty':
+            cache.put(keys[page_number], text)
+        results[page_number] = text
+
+    def drain():
+        while order and order[0] in results:
+            stats.pages += 1
+            yield results.pop(order.popleft())
+
+    order = deque(page_numbers)
+    workers = max(1, workers or 1)
+    if workers == 1 or len(missing) <= 1 or multiprocessing.current_process().daemon:
+        if not missing:
+            yield from drain()
+            return
+        for page_number, text, method in iter_page_texts(pdf_file, missing, use_ocr=use_ocr):
+            store(page_number, text, method)
+            yield from drain()
+        yield from drain()
+        return
+
+    groups = _page_groups(missing, PAGES_PER_JOB)
+    with multiprocessing.Pool(processes=min(workers, len(groups))) as pool:
+        arguments = [(pdf_file, group, use_ocr) for group in groups]
+        # imap keeps the groups in order, so pages stream out as soon as the
+        # group holding the next page is done
+        for group, (page_results, error, metrics) in zip(groups, pool.imap(_page_worker, arguments)):
+            instrument.merge(metrics)
+            if error:
+                raise RuntimeError(f"Failed to extract pages {group[0] + 1}-{group[-1] + 1} of {pdf_file}: {error}")
+            for page_number, text, method in page_results:
+                store(page_number, text, method)
+            yield from drain()
+    yield from drain()
+
+# Function to extract a PDF as one string
+def extract_pdf_text(pdf_file, pages=None, workers=1, cache=None, use_ocr=True):
+    return ''.join(iter_pdf_pages(pdf_file, pages=pages, workers=workers, cache=cache, use_ocr=use_ocr))
+
+if __name__ == "__main__":
+    import time
+    from extraction_cache import ExtractionCache
+
+    parser = argparse.ArgumentParser(description="Extract the text of a PDF page by page")
+    parser.add_argument('pdf_file', help="PDF file")
+    parser.add_argument('-o', '--output', default=None, help="write the text to this file (default: stdout)")
+    parser.add_argument('--pages', default=None, help="one-based page range, e.g. 1-5,8,20-")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="number of worker processes")
+    parser.add_argument('--no-ocr', action='store_true', help="do not OCR pages without a text layer")
+    parser.add_argument('--cache-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'extraction'),
+                        help="directory of the page cache")
+    parser.add_argument('--no-cache', action='store_true', help="always re-extract every page")
+    parser.add_argument('--tesseract-cmd', default=None, help="path to the Tesseract executable")
+    args = parser.parse_args()
+    if args.tesseract_cmd:
+        ocr.set_tesseract_cmd(args.tesseract_cmd)
+
+    cache = None if args.no_cache else ExtractionCache(args.cache_dir)
+    stats = PageStats()
+    started = time.perf_counter()
+    out = open(args.output, 'w') if args.output else None
+    try:
+        for text in iter_pdf_pages(args.pdf_file, pages=args.pages, workers=args.workers, cache=cache,
+                                   use_ocr=not args.no_ocr, stats=stats):
+            if out:
+                out.write(text)
+            else:
+                print(text, end='')
+    finally:
+        if out:
+            out.close()
+    elapsed = time.perf_counter() - started
+    print(f"Extracted {stats.pages} pages in {elapsed:.2f}s: {stats.as_dict()}", file=sys.stderr)
@@ -0,0 +1,442 @@
+import os
+import re
+import csv
+import json
+import math
+import shutil
+import zipfile
+import argparse
+import tempfile
+from datetime import date, datetime
+from xml.sax.saxutils import escape
+
+import instrument
+
+# Report export: one pass over the inventory rows writes every requested
+# format (xlsx, CSV, JSON).
+#
+# Rows are written as they arrive, so memory does not grow with the number of
+# rows and no DataFrame is copied per format. The xlsx file is written by
+# XlsxStreamWriter, which streams the sheet XML to temporary files and zips
+# them on close; openpyxl's write-only mode is several times slower on large
+# reports. The workbook has one sheet with every row and, unless turned off,
+# one sheet per category. The rows of all sheets share one in-memory buffer
+# that is appended to the sheets' files when full, so neither memory nor open
+# files grow with the number of categories.
+#
+# Output paths are built from a base path: "output/Inventory.xlsx" or
+# "output/Inventory" give output/Inventory.xlsx, .csv and .json.
+
+FORMATS = ('xlsx', 'csv', 'json')
+
+# Sheet with every row
+ALL_ROWS_SHEET = 'Inventory'
+
+# Sheet of rows without a category
+UNCATEGORIZED = 'Uncategorized'
+
+# zlib level of the xlsx parts; sheet XML compresses well even at level 1
+COMPRESS_LEVEL = 1
+
+# Rules for sheet names and sizes in Excel
+MAX_SHEET_TITLE = 31
+MAX_SHEET_ROWS = 1048576
+INVALID_SHEET_CHARACTERS = re.compile(r'[\[\]:*?/\\]')
+
+# Characters that are not allowed in XML 1.0
+ILLEGAL_XML_CHARACTERS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+# Function to get the path of one format from the base path
+def output_path(base_path, output_format):
+    root, extension = os.path.splitext(base_path)
+    if extension.lstrip('.').lower() in FORMATS:
+        base_path = root
+    return f"{base_path}.{output_format}"
+
+# Function to convert a value to a plain str/int/float/bool, or None if missing
+def clean_value(value):
+    value_type = type(value)
+    if value_type is str or value_type is int or value is None or value_type is bool:
+        return value
+    if value_type is float:
+        return None if math.isnan(value) or math.isinf(value) else value
+    if isinstance(value, (str, int)):
+        return value
+    if isinstance(value, float):
+        return clean_value(float(value))
+    if isinstance(value, (datetime, date)):
+        # pandas NaT is a datetime that is not equal to itself
+        return None if value != value else value.isoformat()
+    if hasattr(value, 'item'):
+        # numpy scalar
+        return clean_value(value.item())
+    if hasattr(value, 'isoformat'):
+        # pandas Timestamp; NaT has no date
+        return None if value != value else value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    return str(value)
+
+# Function to turn a category into a valid, unique sheet title
+def sheet_title(name, used):
+    title = INVALID_SHEET_CHARACTERS.sub('_', str(name)).strip("' ") or UNCATEGORIZED
+    title = title[:MAX_SHEET_TITLE]
+    candidate = title
+    number = 2
+    while candidate.lower() in used:
+        suffix = f" ({number})"
+        candidate = title[:MAX_SHEET_TITLE - len(suffix)] + suffix
+        number += 1
+    used.add(candidate.lower())
+    return candidate
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '{sheets}</Types>'
+)
+_SHEET_CONTENT_TYPE = ('<Override PartName="/xl/worksheets/sheet{number}.xml" '
+                       'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>')
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/></Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets>{sheets}</sheets></workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '{sheets}<Relationship Id="rIdStyles" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/></Relationships>'
+)
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+_SHEET_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" '
+    'state="frozen"/></sheetView></sheetViews><sheetData>'
+)
+_SHEET_FOOTER = '</sheetData></worksheet>'
+
+# Characters that need escaping or removing in cell text
+SPECIAL_XML_CHARACTERS = re.compile('[&<>\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+# Number of rendered string cells kept for reuse; report columns such as
+# vendor, size and category repeat the same few values
+STRING_CELL_CACHE_SIZE = 100000
+
+# Characters of sheet XML held in memory, over all sheets, before it is
+# appended to the sheets' temporary files
+SHEET_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Function to render one string cell: inline string, XML-escaped
+def _string_cell(text, style=''):
+    if SPECIAL_XML_CHARACTERS.search(text):
+        text = escape(ILLEGAL_XML_CHARACTERS.sub('', text))
+    space = ' xml:space="preserve"' if text[:1].isspace() or text[-1:].isspace() else ''
+    return f'<c{style} t="inlineStr"><is><t{space}>{text}</t></is></c>'
+
+# Write-only xlsx writer for large reports. Rows can be added to any sheet in
+# any order; each sheet's XML is buffered and appended to a temporary file
+# (which is only open while that happens) and the workbook is zipped on close
+# (written to a .tmp file, then moved in place).
+# Cells hold inline strings, numbers and booleans; there are no shared strings,
+# and the only style is the bold header row. Cells and rows are written in
+# order without cell references, so a rendered row can go to several sheets.
+class XlsxStreamWriter:
+    def __init__(self, path, compresslevel=COMPRESS_LEVEL):
+        self.path = path
+        self.compresslevel = compresslevel
+        self.sheets = []
+        self._string_cells = {}
+        self._buffered = 0
+        self._tempdir = tempfile.TemporaryDirectory(prefix='xlsx-', dir=os.path.dirname(os.path.abspath(path)))
+
+    # Function to add a sheet with a bold header row. Returns the sheet number
+    # to pass to write_row.
+    def add_sheet(self, title, header):
+        number = len(self.sheets)
+        header_xml = '<row>' + ''.join(_string_cell(str(name), ' s="1"') for name in header) + '</row>'
+        self.sheets.append({'title': title, 'header': header, 'rows': 1, 'next': None, 'pending': [header_xml],
+                            'path': os.path.join(self._tempdir.name, f"sheet{number + 1}.xml")})
+        self._buffered += len(header_xml)
+        return number
+
+    # Function to render a row of values as sheet XML
+    def render_row(self, values):
+        cache = self._string_cells
+        cells = []
+        for value in values:
+            value_type = type(value)
+            if value_type is str:
+                cell = cache.get(value)
+                if cell is None:
+                    if len(cache) >= STRING_CELL_CACHE_SIZE:
+                        cache.clear()
+                    cell = cache[value] = _string_cell(value) if value else '<c/>'
+                cells.append(cell)
+            elif value is None:
+                cells.append('<c/>')
+            elif value_type is bool:
+                cells.append(f'<c t="b"><v>{int(value)}</v></c>')
+            elif value_type is int or value_type is float:
+                cells.append(f'<c><v>{value!r}</v></c>')
+            else:
+                cells.append(_string_cell(str(value)))
+        return f'<row>{"".join(cells)}</row>'
+
+    # Function to add a row rendered by render_row to a sheet. A full sheet
+    # continues on a new sheet with the same title and header.
+    def write_rendered(self, sheet, row_xml):
+        info = self.sheets[sheet]
+        while info['rows'] >= MAX_SHEET_ROWS:
+            if info['next'] is None:
+                info['next'] = self.add_sheet(info['title'], info['header'])
+            info = self.sheets[info['next']]
+        info['rows'] += 1
+        info['pending'].append(row_xml)
+        self._buffered += len(row_xml)
+        if self._buffered >= SHEET_BUFFER_SIZE:
+            self._flush()
+
+    # Function to append the buffered rows of every sheet to its file
+    def _flush(self):
+        for sheet in self.sheets:
+            if sheet['pending']:
+                with open(sheet['path'], 'a', encoding='utf-8') as part:
+                    part.writelines(sheet['pending'])
+                sheet['pending'] = []
+        self._buffered = 0
+
+    def write_row(self, sheet, values):
+        self.write_rendered(sheet, self.render_row(values))
+
+    def close(self):
+        tmp_path = self.path + '.tmp'
+        used = set()
+        titles = [sheet_title(sheet['title'], used) for sheet in self.sheets]
+        numbers = range(1, len(self.sheets) + 1)
+        try:
+            self._flush()
+            with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=self.compresslevel) as archive:
+                archive.writestr('[Content_Types].xml', _CONTENT_TYPES.format(
+                    sheets=''.join(_SHEET_CONTENT_TYPE.format(number=number) for number in numbers)))
+                archive.writestr('_rels/.rels', _ROOT_RELS)
+                archive.writestr('xl/workbook.xml', _WORKBOOK.format(sheets=''.join(
+                    f'<sheet name="{escape(title, {chr(34): "&quot;"})}" sheetId="{number}" r:id="rId{number}"/>'
+                    for number, title in zip(numbers, titles))))
+                archive.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS.format(sheets=''.join(
+                    f'<Relationship Id="rId{number}" '
+                    f'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+                    f'Target="worksheets/sheet{number}.xml"/>' for number in numbers)))
+                archive.writestr('xl/styles.xml', _STYLES)
+                for number, sheet in zip(numbers, self.sheets):
+                    with archive.open(f'xl/worksheets/sheet{number}.xml', 'w', force_zip64=True) as part, \
+                            open(sheet['path'], 'rb') as source:
+                        part.write(_SHEET_HEADER.encode('utf-8'))
+                        shutil.copyfileobj(source, part, 1024 * 1024)
+                        part.write(_SHEET_FOOTER.encode('utf-8'))
+            os.replace(tmp_path, self.path)
+        finally:
+            self._tempdir.cleanup()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return self.path
+
+    # Function to drop the workbook without writing it
+    def abort(self):
+        self._tempdir.cleanup()
+
+# Rows encoded per JSON write
+JSON_BATCH_SIZE = 1000
+
+_JSON_ENCODER = json.JSONEncoder(separators=(', ', ': '))
+
+# Writer of one report in several formats. Rows are lists of values in column
+# order; category_column (if given) routes each row to its category's sheet.
+class ReportWriter:
+    def __init__(self, base_path, columns, formats=('xlsx',), category_column=None, category_sheets=True):
+        unknown = [output_format for output_format in formats if output_format not in FORMATS]
+        if unknown:
+            raise ValueError(f"Unknown report formats: {unknown}")
+        self.columns = [str(column) for column in columns]
+        self.paths = {output_format: output_path(base_path, output_format) for output_format in formats}
+        self.rows = 0
+        os.makedirs(os.path.dirname(os.path.abspath(base_path)), exist_ok=True)
+        self._category_index = self.columns.index(category_column) if category_column in self.columns else None
+        self._category_sheets = {}
+        self._xlsx = None
+        self._csv_file = self._csv = None
+        self._json_file = None
+        self._json_rows = []
+        self._json_written = False
+        if 'xlsx' in self.paths:
+            self._xlsx = XlsxStreamWriter(self.paths['xlsx'])
+            self._all_sheet = self._xlsx.add_sheet(ALL_ROWS_SHEET, self.columns)
+            self._category_sheets_on = category_sheets and self._category_index is not None
+        if 'csv' in self.paths:
+            self._csv_file = open(self.paths['csv'] + '.tmp', 'w', newline='', encoding='utf-8')
+            self._csv = csv.writer(self._csv_file, lineterminator='\n')
+            self._csv.writerow(self.columns)
+        if 'json' in self.paths:
+            self._json_file = open(self.paths['json'] + '.tmp', 'w', encoding='utf-8')
+            self._json_file.write('[')
+
+    def _category_sheet(self, category):
+        key = UNCATEGORIZED if category is None or category == '' else str(category)
+        sheet = self._category_sheets.get(key)
+        if sheet is None:
+            sheet = self._category_sheets[key] = self._xlsx.add_sheet(key, self.columns)
+        return sheet
+
+    # Function to write one row (values in column order) to every format
+    def write(self, values):
+        values = [clean_value(value) for value in values]
+        if self._xlsx is not None:
+            row_xml = self._xlsx.render_row(values)
+            self._xlsx.write_rendered(self._all_sheet, row_xml)
+            if self._category_sheets_on:
+                self._xlsx.write_rendered(self._category_sheet(values[self._category_index]), row_xml)
+        if self._csv is not None:
+            self._csv.writerow(values)
+        if self._json_file is not None:
+            self._json_rows.append(dict(zip(self.columns, values)))
+            if len(self._json_rows) >= JSON_BATCH_SIZE:
+                self._flush_json()
+        self.rows += 1
+
+    # Function to write the buffered JSON rows; one encoder call per batch is
+    # much faster than one per row
+    def _flush_json(self):
+        if self._json_rows:
+            if self._json_written:
+                self._json_file.write(',')
+            self._json_file.write('\n' + _JSON_ENCODER.encode(self._json_rows)[1:-1])
+            self._json_written = True
+            self._json_rows = []
+
+    def close(self):
+        if self._csv_file is not None:
+            self._csv_file.close()
+            os.replace(self.paths['csv'] + '.tmp', self.paths['csv'])
+        if self._json_file is not None:
+            self._flush_json()
+            self._json_file.write('\n]\n')
+            self._json_file.close()
+            os.replace(self.paths['json'] + '.tmp', self.paths['json'])
+        if self._xlsx is not None:
+            self._xlsx.close()
+        return self.paths
+
+    # Function to drop the partly written reports, leaving existing files as they were
+    def abort(self):
+        for output_format, file in (('csv', self._csv_file), ('json', self._json_file)):
+            if file is not None:
+                file.close()
+                os.remove(self.paths[output_format] + '.tmp')
+        if self._xlsx is not None:
+            self._xlsx.abort()
+
+# Function to find the category column of a header, ignoring case
+def find_category_column(columns, name='category'):
+    for column in columns:
+        if str(column).strip().lower() == name.lower():
+            return str(column)
+    return None
+
+# Function to export rows (lists in column order) in one pass.
+# Returns {format: path}.
+def export_rows(rows, base_path, columns, formats=('xlsx',), category_column=None, category_sheets=True):
+    with instrument.span('save', target='report') as span:
+        writer = ReportWriter(base_path, columns, formats, category_column or find_category_column(columns),
+                              category_sheets)
+        try:
+            for values in rows:
+                writer.write(values)
+        except BaseException:
+            writer.abort()
+            raise
+        paths = writer.close()
+        span.add(rows=writer.rows)
+    return paths
+
+# Function to export a list of dicts; the columns are every key, in the
+# order they first appear
+def export_records(records, base_path, formats=('xlsx',), columns=None, **options):
+    if columns is None:
+        columns = list(dict.fromkeys(key for record in records for key in record))
+    return export_rows(([record.get(column) for column in columns] for record in records),
+                       base_path, columns, formats, **options)
+
+# Function to export a DataFrame without copying it per format
+def export_frame(df, base_path, formats=('xlsx',), **options):
+    return export_rows(df.itertuples(index=False, name=None), base_path, list(df.columns), formats, **options)
+
+# Function to export the inventory store, reading it in batches.
+# The columns are the typed columns plus every extra field in the store.
+def export_store(store, base_path, formats=('xlsx',), **options):
+    from inventory_store import COLUMNS
+    columns = ['id'] + list(COLUMNS) + store.extra_fields()
+    rows = ([row.get(column) for column in columns] for row in store.iter_rows(include_extra=True))
+    return export_rows(rows, base_path, columns, formats, **options)
+
+# Function to export a CSV file, streaming it row by row
+def export_csv_file(csv_path, base_path, formats=('xlsx',), **options):
+    with open(csv_path, 'r', newline='', encoding='utf-8', errors='replace') as file:
+        reader = csv.reader(file)
+        columns = next(reader, [])
+        return export_rows(reader, base_path, columns, formats, **options)
+
+if __name__ == "__main__":
+    from inventory_store import InventoryStore, DEFAULT_INVENTORY_PATH
+    parser = argparse.ArgumentParser(description="Export the inventory (or a CSV file) as xlsx, CSV and JSON reports")
+    parser.add_argument('-o', '--output', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                                'output', 'Inventory.xlsx'),
+                        help="base path of the reports; the extension is replaced per format")
+    parser.add_argument('--inventory', default=DEFAULT_INVENTORY_PATH, help="inventory store to export")
+    parser.add_argument('--from-csv', default=None, help="export this CSV file instead of the inventory store")
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=list(FORMATS))
+    parser.add_argument('--category-column', default=None, help="column that names each row's sheet (default: category)")
+    parser.add_argument('--no-category-sheets', action='store_true', help="only write the sheet with every row")
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+    instrument.configure_from_args(args)
+
+    options = {'category_column': args.category_column, 'category_sheets': not args.no_category_sheets}
+    if args.from_csv:
+        paths = export_csv_file(args.from_csv, args.output, args.formats, **options)
+    else:
+        store = InventoryStore(args.inventory)
+        try:
+            paths = export_store(store, args.output, args.formats, **options)
+        finally:
+            store.close()
+    for output_format, path in paths.items():
+        print(f"{output_format} report saved to {path}")
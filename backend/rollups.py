@@ -0,0 +1,189 @@
+import os
+import json
+import argparse
+
+# Incrementally maintained rollups of the cleaned inventory data.
+#
+# Instead of re-running groupby('Category') over every input whenever one
+# changes, each input file (a "source") contributes its own per-group sums, and
+# the rollup keeps running totals across all sources. Re-processing a source
+# applies only the difference between its new and old contribution;
+# retracting a source subtracts its contribution. A source whose content hash
+# has not changed is not parsed again at all.
+#
+# Totals are kept for three dimensions: Category, Vendor and Month (YYYY-MM of
+# the row's Date). Every group also counts its rows, so a group disappears from
+# the report once the last source contributing to it is retracted.
+#
+# The rollup is persisted as one JSON snapshot, replaced in a single step like
+# the manifest, holding the totals and each source's contribution.
+
+# Measures summed per group
+MEASURES = ['Quantity', 'Ordered', 'Ext Value']
+
+# Dimensions and the report column name of each
+DIMENSIONS = {'category': 'Category', 'vendor': 'Vendor', 'month': 'Month'}
+
+# Group key for rows without a vendor or month
+UNKNOWN = 'Unknown'
+
+# Decimal places kept after applying deltas, so float noise from repeated
+# subtraction does not build up
+PRECISION = 6
+
+SNAPSHOT_VERSION = 1
+
+# Function to compute the per-group sums one source contributes.
+# Returns {dimension: {group key: [rows, Quantity, Ordered, Ext Value]}}.
+def contributions_from_frame(df, vendor=None):
+    import pandas as pd
+
+    measures = pd.DataFrame(index=df.index)
+    for measure in MEASURES:
+        if measure in df.columns:
+            measures[measure] = pd.to_numeric(df[measure], errors='coerce').fillna(0)
+        else:
+            measures[measure] = 0.0
+    measures['rows'] = 1
+
+    keys = {}
+    keys['category'] = df['Category'] if 'Category' in df.columns else pd.Series(UNKNOWN, index=df.index)
+    if 'Vendor' in df.columns:
+        keys['vendor'] = df['Vendor']
+    else:
+        keys['vendor'] = pd.Series(vendor or UNKNOWN, index=df.index)
+    if 'Date' in df.columns:
+        keys['month'] = pd.to_datetime(df['Date'], errors='coerce').dt.strftime('%Y-%m')
+    else:
+        keys['month'] = pd.Series(UNKNOWN, index=df.index)
+
+    contributions = {}
+    for dimension, key in keys.items():
+        if dimension == 'category':
+            # Like groupby('Category'), rows without a category are left out
+            sums = measures[key.notna()].groupby(key[key.notna()].astype(str).values)[['rows'] + MEASURES].sum()
+        else:
+            key = key.astype(object).where(key.notna(), UNKNOWN).astype(str)
+            sums = measures.groupby(key.values)[['rows'] + MEASURES].sum()
+        contributions[dimension] = {
+            str(group): [int(values[0])] + [float(value) for value in values[1:]]
+            for group, values in zip(sums.index, sums.itertuples(index=False, name=None))
+        }
+    return contributions
+
+# Function to add the contributions of one part of a source (a chunk) into
+# the contributions of the whole source
+def merge_contributions(target, part):
+    for dimension, groups in part.items():
+        target_groups = target.setdefault(dimension, {})
+        for group, values in groups.items():
+            current = target_groups.get(group)
+            target_groups[group] = list(values) if current is None else [a + b for a, b in zip(current, values)]
+    return target
+
+class Rollups:
+    def __init__(self, snapshot_path):
+        self.snapshot_path = snapshot_path
+        self.sources = {}
+        self.totals = {dimension: {} for dimension in DIMENSIONS}
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, 'r') as file:
+                snapshot = json.load(file)
+            if snapshot.get('version') == SNAPSHOT_VERSION:
+                self.sources = snapshot['sources']
+                self.totals = snapshot['totals']
+            else:
+                print(f"Ignoring rollup snapshot {snapshot_path} from another version; it will be rebuilt.")
+
+    # Function to check whether a source is already rolled up with this content
+    def is_current(self, source_id, content_hash):
+        source = self.sources.get(source_id)
+        return source is not None and content_hash is not None and source.get('hash') == content_hash
+
+    # Function to add (sign 1) or subtract (sign -1) a contribution from the totals
+    def _add(self, contributions, sign):
+        for dimension, groups in contributions.items():
+            totals = self.totals.setdefault(dimension, {})
+            for group, values in groups.items():
+                current = totals.get(group, [0] + [0.0] * len(MEASURES))
+                updated = [current[0] + sign * values[0]]
+                updated += [round(a + sign * b, PRECISION) for a, b in zip(current[1:], values[1:])]
+                if updated[0] <= 0:
+                    totals.pop(group, None)
+                else:
+                    totals[group] = updated
+
+    # Function to set the contribution of a source, applying only the
+    # difference to the previous one. Returns the number of groups touched.
+    def apply(self, source_id, contributions, content_hash=None):
+        old = self.sources.get(source_id)
+        if old is not None:
+            self._add(old['contributions'], -1)
+        self._add(contributions, 1)
+        self.sources[source_id] = {'hash': content_hash, 'contributions': contributions}
+        touched = set()
+        for part in ([old['contributions']] if old else []) + [contributions]:
+            for dimension, groups in part.items():
+                touched.update((dimension, group) for group in groups)
+        return len(touched)
+
+    # Function to remove a source's contribution. Returns False if it was not rolled up.
+    def retract(self, source_id):
+        old = self.sources.pop(source_id, None)
+        if old is None:
+            return False
+        self._add(old['contributions'], -1)
+        return True
+
+    # Function to write the snapshot, replacing the old one in a single step
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.snapshot_path)), exist_ok=True)
+        temp_path = self.snapshot_path + '.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump({'version': SNAPSHOT_VERSION, 'sources': self.sources, 'totals': self.totals}, file)
+        os.replace(temp_path, self.snapshot_path)
+
+    # Function to get the current totals of a dimension as a DataFrame with the
+    # same columns as cleanup.group_by_category
+    def report(self, dimension='category'):
+        import pandas as pd
+        column = DIMENSIONS[dimension]
+        groups = sorted(self.totals.get(dimension, {}).items())
+        return pd.DataFrame(
+            [[group] + values[1:] for group, values in groups],
+            columns=[column] + MEASURES,
+        )
+
+    # Function to write the report of every dimension to the output folder.
+    # The category report is 1grouped_data.csv, as written by cleanup.parse_data.
+    def write_reports(self, output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+        paths = {}
+        for dimension in DIMENSIONS:
+            name = "1grouped_data.csv" if dimension == 'category' else f"1grouped_by_{dimension}.csv"
+            path = os.path.join(output_dir, name)
+            self.report(dimension).to_csv(path, index=True)
+            paths[dimension] = path
+        return paths
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show or maintain the category/vendor/month rollups")
+    parser.add_argument('snapshot', help="rollup snapshot file")
+    parser.add_argument('--dimension', choices=sorted(DIMENSIONS), default='category', help="report to print")
+    parser.add_argument('--retract', nargs='*', default=[], help="source files to remove from the rollups")
+    parser.add_argument('--write-reports', default=None, help="write the CSV reports to this folder")
+    args = parser.parse_args()
+
+    rollups = Rollups(args.snapshot)
+    for source_id in args.retract:
+        if rollups.retract(os.path.abspath(source_id)):
+            print(f"Retracted {source_id}")
+        else:
+            print(f"{source_id} is not in the rollups")
+    if args.retract:
+        rollups.save()
+    if args.write_reports:
+        for path in rollups.write_reports(args.write_reports).values():
+            print(f"Report saved to {path}")
+    print(f"{len(rollups.sources)} sources")
+    print(rollups.report(args.dimension).to_string(index=False))
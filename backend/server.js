@@ -5,11 +5,11 @@ const path = require('path');
 const fs = require('fs');
 const tesseract = require('tesseract.js');
 const chokidar = require('chokidar');
-const { spawn } = require('child_process');
 const { parse } = require('json2csv'); // Importing the json2csv library for CSV conversion
 const mime = require('mime-types');
 const winston = require('winston');  // Advanced logging library
 const OpenAI = require('openai');
+const ExtractionService = require('./extractionService');
 // Initialize the express app
 const app = express();
 app.use(cors());
@@ -57,7 +57,15 @@ const logger = winston.createLogger({
 // Set up multer for file upload handling
 const upload = multer({ dest: UPLOAD_FOLDER });
 
-// Route to handle file upload and text extraction using app.py
+// Python extraction service, started once and shared by all requests
+const extractionService = new ExtractionService({
+    workers: process.env.EXTRACTION_WORKERS ? parseInt(process.env.EXTRACTION_WORKERS, 10) : undefined,
+    logger
+});
+extractionService.start();
+process.on('exit', () => extractionService.stop());
+
+// Route to handle file upload and text extraction using the Python extraction service
 app.post('/process', upload.single('file'), async (req, res) => {
     const file = req.file;
     const file_path = path.join(UPLOAD_FOLDER, file.filename);
@@ -69,67 +77,137 @@ app.post('/process', upload.single('file'), async (req, res) => {
     }
 
     try {
-        // Run the Python script (app.py) to extract text
-        const pythonProcess = spawn('python', [path.join(__dirname, 'app.py'), file_path]);
-
-        let scriptOutput = '';
-        pythonProcess.stdout.on('data', (data) => {
-            scriptOutput += data.toString();
+        // Extract text with the long-lived Python extraction service
+        const result = await extractionService.extract(file_path, 'image');
+        const jsonData = result.rows;
+        logger.info(`Extracted data from extraction service: ${JSON.stringify(jsonData)}`);
+
+        // Generate the filenames for each format
+        const txtFilePath = path.join(OUTPUT_FOLDER, `${baseFilename}.txt`);
+        const jsonFilePath = path.join(OUTPUT_FOLDER, `${baseFilename}.json`);
+        const csvFilePath = path.join(OUTPUT_FOLDER, `${baseFilename}.csv`);
+
+        // Save data in .txt format
+        await fs.promises.writeFile(txtFilePath, result.text, 'utf8');
+        logger.info(`Data saved as .txt file: ${txtFilePath}`);
+
+        // Save data in .json format
+        await fs.promises.writeFile(jsonFilePath, JSON.stringify(jsonData, null, 2), 'utf8');
+        logger.info(`Data saved as .json file: ${jsonFilePath}`);
+
+        // Convert JSON to CSV and save it
+        const csvData = parse(jsonData);
+        await fs.promises.writeFile(csvFilePath, csvData, 'utf8');
+        logger.info(`Data saved as .csv file: ${csvFilePath}`);
+
+        // Cleanup: Delete the uploaded file after processing
+        fs.unlinkSync(file_path);
+        logger.info(`File ${file.originalname} successfully processed and deleted.`);
+
+        res.status(200).json({ 
+            message: 'Data processed successfully',
+            files: {
+                txt: txtFilePath,
+                json: jsonFilePath,
+                csv: csvFilePath
+            }
         });
+    } catch (error) {
+        logger.error(`Error during file processing for ${file.originalname}: ${error}`);
+        if (error.code === 'queue_full') {
+            fs.unlink(file_path, () => {});
+            return res.status(503).set('Retry-After', '30').json({ error: 'Too many files are waiting; try again later' });
+        }
+        res.status(500).json({ error: 'Failed to process the file' });
+    }
+});
 
-        pythonProcess.stderr.on('data', (data) => {
-            logger.error(`Python script error: ${data}`);
+// Job queue routes. Uploads to /jobs are queued and answered right away with
+// the job; the client polls /jobs/:id for the status and, once done, the
+// extracted text and rows. ?priority=bulk queues behind interactive uploads.
+// The extractor comes from the extension of the uploaded file's name unless
+// ?extractor= names one; unknown extractors and file types are refused with 400.
+app.post('/jobs', upload.single('file'), async (req, res) => {
+    const file = req.file;
+    if (!file) {
+        return res.status(400).json({ error: 'No file uploaded' });
+    }
+    const file_path = path.join(UPLOAD_FOLDER, file.filename);
+    const extractor = req.query.extractor || undefined;
+    const priority = req.query.priority === 'bulk' ? 'bulk' : 'interactive';
+    try {
+        // The service deletes the upload once its job is finished
+        const { job, duplicate } = await extractionService.enqueue(file_path, {
+            extractor, name: file.originalname, priority, deleteAfter: true
         });
+        logger.info(`Queued ${file.originalname} as job ${job.id}${duplicate ? ' (duplicate)' : ''}`);
+        res.status(202).json({ job, duplicate });
+    } catch (error) {
+        fs.unlink(file_path, () => {});
+        logger.error(`Failed to queue ${file.originalname}: ${error}`);
+        if (error.code === 'bad_request') {
+            return res.status(400).json({ error: error.message });
+        }
+        if (error.code === 'queue_full') {
+            return res.status(503).set('Retry-After', '30').json({ error: 'Too many files are waiting; try again later' });
+        }
+        res.status(500).json({ error: 'Failed to queue the file' });
+    }
+});
 
-        pythonProcess.on('close', async (code) => {
-            if (code !== 0) {
-                logger.error(`Python script exited with code ${code}`);
-                return res.status(500).json({ error: 'Failed to process the file' });
-            }
+// Bulk import of a folder on the server: { "folder": "imports/march" }
+app.post('/jobs/import', async (req, res) => {
+    const { folder, extractor } = req.body || {};
+    if (!folder) {
+        return res.status(400).json({ error: "Missing 'folder'" });
+    }
+    try {
+        const { jobs, duplicates, skipped } = await extractionService.enqueueFolder(folder, { extractor });
+        logger.info(`Queued ${jobs.length} files from ${folder} (${duplicates} duplicates, ${skipped.length} skipped)`);
+        res.status(202).json({ jobs: jobs.map((job) => job.id), duplicates, skipped });
+    } catch (error) {
+        logger.error(`Failed to import folder ${folder}: ${error}`);
+        const status = { bad_request: 400, queue_full: 503 }[error.code] || 500;
+        res.status(status).json({ error: `Failed to import folder: ${error.message}` });
+    }
+});
 
-            try {
-                // Parse the script output as JSON
-                const jsonData = JSON.parse(scriptOutput);
-                logger.info(`Extracted data from app.py: ${JSON.stringify(jsonData)}`);
-
-                // Generate the filenames for each format
-                const txtFilePath = path.join(OUTPUT_FOLDER, `${baseFilename}.txt`);
-                const jsonFilePath = path.join(OUTPUT_FOLDER, `${baseFilename}.json`);
-                const csvFilePath = path.join(OUTPUT_FOLDER, `${baseFilename}.csv`);
-
-                // Save data in .txt format
-                await fs.promises.writeFile(txtFilePath, scriptOutput, 'utf8');
-                logger.info(`Data saved as .txt file: ${txtFilePath}`);
-
-                // Save data in .json format
-                await fs.promises.writeFile(jsonFilePath, JSON.stringify(jsonData, null, 2), 'utf8');
-                logger.info(`Data saved as .json file: ${jsonFilePath}`);
-
-                // Convert JSON to CSV and save it
-                const csvData = parse(jsonData);
-                await fs.promises.writeFile(csvFilePath, csvData, 'utf8');
-                logger.info(`Data saved as .csv file: ${csvFilePath}`);
-
-                // Cleanup: Delete the uploaded file after processing
-                fs.unlinkSync(file_path);
-                logger.info(`File ${file.originalname} successfully processed and deleted.`);
-
-                res.status(200).json({ 
-                    message: 'Data processed successfully',
-                    files: {
-                        txt: txtFilePath,
-                        json: jsonFilePath,
-                        csv: csvFilePath
-                    }
-                });
-            } catch (parseError) {
-                logger.error(`Failed to parse output from app.py: ${parseError}`);
-                res.status(500).json({ error: 'Invalid output format from Python script' });
-            }
+// Job list and per-status counts: ?status=queued|running|done|failed&limit=&offset=
+app.get('/jobs', async (req, res) => {
+    const { status, limit, offset } = req.query;
+    try {
+        const { jobs, stats } = await extractionService.jobs({
+            status,
+            limit: limit ? parseInt(limit, 10) : undefined,
+            offset: offset ? parseInt(offset, 10) : undefined
         });
+        res.json({ jobs, stats });
     } catch (error) {
-        logger.error(`Error during file processing for ${file.originalname}: ${error}`);
-        res.status(500).json({ error: error.toString() });
+        logger.error(`Job list failed: ${error}`);
+        res.status(500).json({ error: 'Failed to list jobs' });
+    }
+});
+
+app.get('/jobs/:id', async (req, res) => {
+    try {
+        res.json(await extractionService.job(parseInt(req.params.id, 10)));
+    } catch (error) {
+        if (error.message.startsWith('KeyError')) {
+            return res.status(404).json({ error: `Unknown job ${req.params.id}` });
+        }
+        logger.error(`Job status failed for ${req.params.id}: ${error}`);
+        res.status(500).json({ error: 'Failed to read the job' });
+    }
+});
+
+// Route to report the health of the Python extraction service
+app.get('/health', async (req, res) => {
+    try {
+        const health = await extractionService.health();
+        res.json({ server: 'ok', extractionService: health });
+    } catch (error) {
+        logger.error(`Extraction service health check failed: ${error}`);
+        res.status(503).json({ server: 'ok', extractionService: { status: 'down', error: error.message } });
     }
 });
 
@@ -216,65 +294,74 @@ async function saveDataToJSONFile(data, filename) {
     }
 }
 
-// Path to your inventory data file
-const inventoryFile = path.join('F:','repogit', 'XseLLer8', 'inventory_data.json');
-app.put('/inventory', (req, res) => {
+// Inventory routes go through the extraction service, which keeps the
+// inventory in an indexed SQLite store (inventory_store.py)
+app.put('/inventory', async (req, res) => {
     const updatedInventory = req.body;  // Expecting an array of updated inventory data
-  
-    // Save the updated data to your database or in-memory storage here
-   
-    database.saveInventory(updatedInventory);
-  
-    res.json({ success: true, message: 'Inventory updated successfully' });
-  });
-// API route to get inventory data
-app.get('/inventory', (req, res) => {
-  // Read the inventory data from the file and send it as a JSON response
-  fs.readFile(inventoryFile, 'utf8', (err, data) => {
-    if (err) {
-      console.error('Error reading inventory data:', err);
-      return res.status(500).json({ error: 'Failed to load inventory data' });
+
+    try {
+        const count = await extractionService.updateInventoryRows(updatedInventory);
+        res.json({ success: true, message: 'Inventory updated successfully', count });
+    } catch (error) {
+        logger.error(`Error saving inventory data: ${error}`);
+        res.status(500).json({ error: 'Failed to save inventory data' });
     }
+});
 
+// API route to get inventory data. Optional filters: ?item_number=&category=&vendor=&status=&limit=&offset=
+app.get('/inventory', async (req, res) => {
+    const { item_number, category, vendor, status, source_file, date_from, date_to, limit, offset } = req.query;
     try {
-      const jsonData = JSON.parse(data);  // Parse the file contents
-      res.json(jsonData);  // Send the parsed JSON as the response
-    } catch (parseError) {
-      console.error('Error parsing inventory data:', parseError);
-      res.status(500).json({ error: 'Invalid JSON format in inventory file' });
+        const rows = await extractionService.inventory({
+            item_number, category, vendor, status, source_file, date_from, date_to,
+            limit: limit ? parseInt(limit, 10) : undefined,
+            offset: offset ? parseInt(offset, 10) : undefined
+        });
+        res.json(rows);
+    } catch (error) {
+        logger.error(`Error reading inventory data: ${error}`);
+        res.status(500).json({ error: 'Failed to load inventory data' });
     }
-  });
 });
 
-// Function to update inventory with new invoice data
-function updateInventory(newData) {
-  const inventory = JSON.parse(fs.readFileSync(inventoryFile, 'utf-8'));
-
-  newData.forEach((newItem) => {
-    const existingItem = inventory.find(item => item['ITEM#'] === newItem['ITEM#']);
-
-    if (existingItem) {
-      // Update the item with the most recent price and add the old price to history
-      existingItem.priceHistory.push({
-        price: existingItem.PRICE,
-        date: existingItem.lastUpdated,
-      });
-
-      existingItem.PRICE = newItem.PRICE;
-      existingItem.ORDERED = newItem.ORDERED;
-      existingItem.STATUS = newItem.STATUS;
-      existingItem.lastUpdated = new Date().toISOString();  // Keep track of when the price was updated
-
-    } else {
-      // Add the new item to the inventory
-      newItem.priceHistory = [];
-      newItem.lastUpdated = new Date().toISOString();
-      inventory.push(newItem);
+// Dashboard queries, answered from the service's in-memory inventory index
+// Totals per category: ?date_from=&date_to=&vendor=&status=
+app.get('/inventory/categories', async (req, res) => {
+    const { date_from, date_to, vendor, status } = req.query;
+    try {
+        res.json(await extractionService.query('category_totals', { date_from, date_to, vendor, status }));
+    } catch (error) {
+        logger.error(`Category totals query failed: ${error}`);
+        res.status(500).json({ error: 'Failed to query inventory' });
     }
-  });
+});
+
+// Summary and price history of one item: ?date_from=&date_to=&vendor=&status=
+app.get('/inventory/items/:itemNumber', async (req, res) => {
+    const { date_from, date_to, vendor, status } = req.query;
+    const item_number = req.params.itemNumber;
+    try {
+        const [summary, priceHistory] = await Promise.all([
+            extractionService.query('item_summary', { item_number }),
+            extractionService.query('price_history', { item_number, date_from, date_to, vendor, status })
+        ]);
+        if (!summary) {
+            return res.status(404).json({ error: `Unknown item ${item_number}` });
+        }
+        res.json({ item_number, summary, priceHistory });
+    } catch (error) {
+        logger.error(`Item query failed for ${item_number}: ${error}`);
+        res.status(500).json({ error: 'Failed to query inventory' });
+    }
+});
 
-  // Save the updated inventory back to the file
-  fs.writeFileSync(inventoryFile, JSON.stringify(inventory, null, 2), 'utf-8');
+// Function to update inventory with new invoice data. The rows of the source
+// file are replaced; earlier invoices keep their own rows, so the price
+// history of an item is its rows across source files.
+async function updateInventory(newData, sourceFile) {
+    const items = Object.values(newData).filter(item => item && item['ITEM#']);
+    const count = await extractionService.replaceInventory(items, sourceFile);
+    logger.info(`Inventory updated with ${count} items from ${sourceFile}`);
 }
 
 const openai = new OpenAI({
@@ -317,7 +404,7 @@ watcher.on('add', async filePath => {
         try {
             const fileData = await fs.promises.readFile(filePath, 'utf8');
             const jsonData = mapTextToJSON(fileData);
-            updateInventory(jsonData);
+            await updateInventory(jsonData, path.basename(filePath));
             await saveDataToJSONFile(jsonData, JSON_FILE);
 
             // Move the processed file to the archive folder
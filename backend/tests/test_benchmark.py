@@ -0,0 +1,62 @@
+from pathlib import Path
+
+import pytest
+
+import benchmark
+
+TINY = {'invoices': 3, 'invoice_lines': 20, 'export_rows': 50, 'sheets': 1, 'sheet_rows': 10, 'pdf_pages': 2,
+        'images': 1}
+
+@pytest.fixture
+def tiny_scale(monkeypatch):
+    monkeypatch.setitem(benchmark.SCALES, 'tiny', TINY)
+    return 'tiny'
+
+def read_corpus(path):
+    path = Path(path)
+    files = [path] if path.is_file() else sorted(path.iterdir())
+    return {file.name: file.read_bytes() for file in files}
+
+def test_corpora_depend_only_on_the_seed(tmp_path, tiny_scale):
+    first = benchmark.generate_corpora(str(tmp_path / 'a'), tiny_scale, ('text', 'export'), seed=7)
+    second = benchmark.generate_corpora(str(tmp_path / 'b'), tiny_scale, ('export', 'text'), seed=7)
+    other = benchmark.generate_corpora(str(tmp_path / 'c'), tiny_scale, ('text',), seed=8)
+    for corpus in ('text', 'export'):
+        assert read_corpus(first[corpus]) == read_corpus(second[corpus])
+    assert len(read_corpus(first['text'])) == 3
+    assert read_corpus(first['text']) != read_corpus(other['text'])
+
+def test_existing_corpora_are_reused(tmp_path, tiny_scale):
+    paths = benchmark.generate_corpora(str(tmp_path), tiny_scale, ('export',))
+    with open(paths['export'], 'a') as file:
+        file.write('kept\n')
+    assert benchmark.generate_corpora(str(tmp_path), tiny_scale, ('export',)) == paths
+    assert Path(paths['export']).read_text().endswith('kept\n')
+
+def test_a_failing_stage_is_recorded_not_raised():
+    timer = benchmark.StageTimer('text')
+    assert timer.run('extract', lambda: benchmark._with_lines(['a\nb\n', 'c\n']), bytes_in=6) == ['a\nb\n', 'c\n']
+    assert timer.run('parse', lambda: 1 / 0) is None
+    extract, parse = timer.stages
+    assert extract['rows'] == 3 and 'error' not in extract
+    assert parse['rows'] is None and parse['error'] == 'ZeroDivisionError: division by zero'
+
+def record(stage, seconds, rows=1000, rss=None, **extra):
+    return dict({'corpus': 'export', 'stage': stage, 'seconds': seconds, 'rows': rows, 'bytes': None,
+                 'rows_per_second': None, 'mb_per_second': None, 'peak_rss_mb': rss}, **extra)
+
+def test_summary_keeps_the_median_time_and_highest_memory():
+    runs = [[record('read', 2.0, rss=100.0)], [record('read', 1.0)], [record('read', 4.0, rss=120.0)]]
+    summary, = benchmark.summarize(runs)
+    assert summary['seconds'] == 2.0 and summary['seconds_all'] == [2.0, 1.0, 4.0]
+    assert summary['rows_per_second'] == 500.0 and summary['peak_rss_mb'] == 120.0
+
+def test_compare_flags_slowdowns_beyond_the_threshold():
+    baseline = {'results': [record('read', 1.0), record('save', 1.0), record('group', 0.002),
+                            record('write', 1.0, error='OSError: disk full')]}
+    current = {'results': [record('read', 1.25), record('save', 0.5), record('group', 0.006),
+                           record('write', 1.0), record('new', 1.0)]}
+    verdicts = {row[1]: row[5] for row in benchmark.compare_results(baseline, current, threshold=0.1)}
+    # 'group' triples, but by less than the timer noise floor
+    assert verdicts == {'read': 'slower', 'save': 'faster', 'group': 'same', 'write': 'n/a', 'new': 'n/a'}
+    assert {row[1]: row[5] for row in benchmark.compare_results(baseline, current, threshold=0.5)}['read'] == 'same'
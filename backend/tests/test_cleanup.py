@@ -0,0 +1,36 @@
+import os
+
+import pandas as pd
+
+import cleanup
+
+SAMPLE_PATH = os.path.join(cleanup.REPO_ROOT, 'output', '1cleaned_data.csv')
+
+# Function to get the dead columns the way advanced_clean first did, one column at a time
+def dead_columns_per_column(df):
+    return [col for col in df.columns if df[col].replace(' ', '').eq(0).all()]
+
+def check_against_reference(df):
+    expected = df.apply(cleanup.realign_row, axis=1)
+    actual = cleanup.realign_rows(df)
+    pd.testing.assert_frame_equal(actual, expected)
+
+    expected = cleanup.coerce_numeric_columns(expected).replace('', ' ')
+    actual = cleanup.coerce_numeric_columns(actual).replace('', ' ')
+    pd.testing.assert_frame_equal(actual, expected)
+    assert cleanup.find_dead_columns(actual) == dead_columns_per_column(expected)
+
+def test_sample_file_matches_per_row_reference():
+    check_against_reference(cleanup.load_cleaned_data(SAMPLE_PATH))
+
+def test_shifted_rows_are_moved_left():
+    df = pd.DataFrame({
+        'Brand': ['Bud Light', ' ', ' '],
+        'Stock': ['6', ' ', 'Corona'],
+        'Quantity': ['1', '12', ' '],
+        'Unit Cost': [' ', '2.5', '3'],
+    })
+    check_against_reference(df)
+    realigned = cleanup.realign_rows(df)
+    assert realigned.iloc[1].tolist() == ['12', '2.5', '', '']
+    assert realigned.iloc[2].tolist() == ['Corona', '3', '', '']
@@ -0,0 +1,49 @@
+import pandas as pd
+
+import cleanup
+
+HEADER = ['Index', 'Brand', 'Bin', 'Size', 'Unit', 'Location', 'Stock', 'Price', 'Date', 'Status', 'Category',
+          'Quantity', 'Ext Value']
+
+def write_export(path, rows):
+    lines = ['\t'.join(HEADER)] + ['\t'.join(str(value) for value in row) for row in rows]
+    path.write_text('\n'.join(lines) + '\n', encoding='ISO-8859-1')
+    return str(path)
+
+def export_rows():
+    rows = []
+    for number in range(20):
+        # Bin is numeric in the first chunks and text later; Location is only
+        # filled in further down, so no single chunk shows the whole layout
+        bin_code = number if number < 12 else f'B{number}'
+        location = 'Back bar' if number > 14 else ''
+        brand = ['Titos Vodka', 'Bud Light', 'Jameson', 'Cabernet Sauvignon'][number % 4]
+        rows.append([number, brand, bin_code, '750ml', 'ml', location, 6, 20.5, '2024-03-01', 'ok',
+                     ['Spirits', 'Beer', 'Wine'][number % 3], number % 5, number * 1.5])
+        if number % 7 == 0:
+            rows.append([''] * len(HEADER))
+    return rows
+
+def test_chunked_run_writes_what_a_single_read_writes(tmp_path):
+    path = write_export(tmp_path / 'export.txt', export_rows())
+    single_df, single_grouped = cleanup.parse_data(path, str(tmp_path / 'single'))
+    chunked_grouped = cleanup.parse_data_chunked(path, str(tmp_path / 'chunked'), chunksize=4)
+
+    pd.testing.assert_frame_equal(chunked_grouped, single_grouped, check_dtype=False)
+    for name in ('1cleaned_data.csv', '1grouped_data.csv'):
+        assert (tmp_path / 'chunked' / name).read_text() == (tmp_path / 'single' / name).read_text()
+
+def test_layout_scan_sees_the_whole_file(tmp_path):
+    path = write_export(tmp_path / 'export.txt', export_rows())
+    layout = cleanup.scan_layout(path, chunksize=4)
+    assert layout['columns'] == HEADER
+    # The blank lines make Quantity a float column in a single read as well
+    assert layout['dtypes']['Bin'] is str and layout['dtypes']['Quantity'] == 'float64'
+    assert layout['split_width'] is None
+
+def test_chunks_reach_the_callback_in_order(tmp_path):
+    path = write_export(tmp_path / 'export.txt', export_rows())
+    seen = []
+    cleanup.parse_data_chunked(path, str(tmp_path / 'out'), chunksize=6, chunk_callback=seen.append)
+    assert [len(chunk) for chunk in seen] == [5, 5, 5, 5]
+    assert pd.concat(seen)['Brand'].tolist() == [row[1] for row in export_rows() if row[1]]
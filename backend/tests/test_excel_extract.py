@@ -0,0 +1,37 @@
+from excel_extract import iter_sheet_records
+
+def values(rows):
+    return [record['values'] for record in iter_sheet_records('Inventory', rows)]
+
+def test_all_text_data_row_is_not_a_header():
+    rows = [
+        ('Item', 'Brand', 'Size', 'Qty'),
+        ('Vodka', 'Smirnoff', '750ml', 'case'),
+        ('Gin', 'Tanqueray', '1L', 4),
+    ]
+    assert values(rows)[1:] == [
+        {'Item': 'Vodka', 'Brand': 'Smirnoff', 'Size': '750ml', 'Qty': 'case'},
+        {'Item': 'Gin', 'Brand': 'Tanqueray', 'Size': '1L', 'Qty': 4},
+    ]
+
+def test_column_names_below_a_banner_replace_it():
+    rows = [
+        ('Weekly count',),
+        ('SALES', None, 'EXPENSES', None, 'COSTS'),
+        ('Item', 'Qty', 'Cost', 'Total', 'Vendor'),
+        ('Vodka', 2, 10.5, 21.0, 'Acme'),
+        (None, None, None, None, None),
+        ('Rum', 'Bacardi', 'Gold', 'Light', 'Dark', 'Spiced'),
+    ]
+    records = values(rows)
+    assert records[0] == {'A': 'Weekly count'}
+    assert records[3] == {'Item': 'Vodka', 'Qty': 2, 'Cost': 10.5, 'Total': 21.0, 'Vendor': 'Acme'}
+    assert records[4] == {'Item': 'Rum', 'Qty': 'Bacardi', 'Cost': 'Gold', 'Total': 'Light', 'Vendor': 'Dark',
+                          'F': 'Spiced'}
+
+def test_rows_with_numbers_before_any_header_are_data():
+    rows = [
+        ('Vodka', 2, 10.5),
+        ('Item', 'Qty', 'Cost'),
+    ]
+    assert values(rows) == [{'A': 'Vodka', 'B': 2, 'C': 10.5}, {'A': 'Item', 'B': 'Qty', 'C': 'Cost'}]
@@ -0,0 +1,47 @@
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+import extraction_cache
+from extraction_cache import ExtractionCache, hash_file
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # A clock that always moves forward, so every access has its own time
+    clock = itertools.count(1000)
+    monkeypatch.setattr(extraction_cache, 'time', SimpleNamespace(time=lambda: float(next(clock))))
+    cache = ExtractionCache(str(tmp_path / 'cache'), max_bytes=25)
+    yield cache
+    cache.close()
+
+def test_same_content_under_another_name_is_a_hit(cache, tmp_path):
+    first = tmp_path / 'invoice.txt'
+    renamed = tmp_path / 'upload-7f3a'
+    first.write_text('Bud Light 12')
+    renamed.write_text('Bud Light 12')
+    cache.put(ExtractionCache.make_key(hash_file(str(first)), 'txt', 1), 'Bud Light 12\n')
+    assert cache.get(ExtractionCache.make_key(hash_file(str(renamed)), 'txt', 1)) == 'Bud Light 12\n'
+    # A new extractor version does not reuse the old text
+    assert cache.get(ExtractionCache.make_key(hash_file(str(renamed)), 'txt', 2)) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_least_recently_used_entries_are_evicted_first(cache):
+    cache.put('aa01', '0123456789')
+    cache.put('bb02', '0123456789')
+    assert cache.get('aa01') == '0123456789'
+    cache.put('cc03', '0123456789')
+    assert [cache.contains(key) for key in ('aa01', 'bb02', 'cc03')] == [True, False, True]
+    assert cache.stats()['bytes'] == 20 and cache.evictions == 1
+
+def test_streamed_text_is_stored_only_once_complete(cache):
+    def failing_extraction():
+        yield 'page 1\n'
+        raise RuntimeError('OCR failed on page 2')
+
+    with pytest.raises(RuntimeError):
+        list(cache.iter_cached('dd04', failing_extraction))
+    assert not cache.contains('dd04') and cache.stats()['entries'] == 0
+    assert ''.join(cache.iter_cached('dd04', lambda: iter(['page 1\n', 'page 2\n']))) == 'page 1\npage 2\n'
+    # The second read comes from the cache, in blocks
+    assert list(cache.iter_cached('dd04', lambda: pytest.fail('extracted twice'))) == ['page 1\npage 2\n']
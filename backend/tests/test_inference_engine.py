@@ -0,0 +1,87 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('torch')
+Image = pytest.importorskip('PIL.Image')
+
+import AiTemplateBuild
+import model_export
+from inference_engine import InferenceEngine
+
+# Colours of the pages of each test document; a page's text is its colour
+DOCUMENTS = {'a.png': ['red'], 'b.tif': ['green', 'blue', 'white'], 'c.png': ['black'], 'd.tif': ['gray', 'pink']}
+
+def write_documents(tmp_path):
+    paths = []
+    for name, colours in DOCUMENTS.items():
+        pages = [Image.new('RGB', (8, 8), colour) for colour in colours]
+        path = tmp_path / name
+        pages[0].save(path, save_all=True, append_images=pages[1:])
+        paths.append(str(path))
+    return paths
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    # The model weights are not part of the tests: LayoutLMv2 "reads" a page
+    # as its colour and the classifier returns the length of the text
+    layout_model = SimpleNamespace(eval=lambda: None)
+    monkeypatch.setattr(AiTemplateBuild, 'load_layoutlmv2', lambda checkpoint: (None, None, layout_model))
+    monkeypatch.setattr(model_export, 'load_eager_predictor', lambda model_path: SimpleNamespace(n_features=4))
+    engine = InferenceEngine('model.pt', batch_size=4, max_wait=0.2, cache_dir=str(tmp_path / 'cache'))
+    engine.layout_batches = []
+    engine.class_batches = []
+
+    def layout_texts(images):
+        engine.layout_batches.append(len(images))
+        return ['%02x%02x%02x' % image.getpixel((0, 0)) for image in images]
+
+    def classify_texts(texts):
+        engine.class_batches.append(len(texts))
+        return [len(text) for text in texts]
+
+    monkeypatch.setattr(engine, '_layout_texts', layout_texts)
+    monkeypatch.setattr(engine, '_classify_texts', classify_texts)
+    yield engine
+    engine.close()
+
+def page_texts(result):
+    return [entry['text'] for entry in result['pages']]
+
+def test_pages_of_several_documents_share_a_batch(engine, tmp_path):
+    paths = write_documents(tmp_path)
+    results = list(engine.classify_files(paths))
+    assert [result['path'] for result in results] == paths
+    assert [len(result['pages']) for result in results] == [1, 3, 1, 2]
+    assert page_texts(results[1]) == ['008000', '0000ff', 'ffffff']
+    assert engine.layout_batches == engine.class_batches == [4, 3]
+
+def test_a_resubmitted_document_skips_layoutlmv2(engine, tmp_path):
+    paths = write_documents(tmp_path)
+    first = list(engine.classify_files(paths))
+    engine.layout_batches.clear()
+    again = list(engine.classify_files(list(reversed(paths))))
+    assert engine.layout_batches == []
+    assert [page_texts(result) for result in again] == [page_texts(result) for result in reversed(first)]
+    assert engine.stats.as_dict()['feature_cache_hits'] == 7
+
+def test_requests_from_several_threads_are_batched_together(engine, tmp_path):
+    paths = write_documents(tmp_path)
+    expected = {result['path']: result for result in engine.classify_files(paths)}
+    engine.class_batches.clear()
+
+    futures = {}
+    start = threading.Barrier(len(paths))
+    def submit(path):
+        start.wait()
+        futures[path] = engine.submit(path)
+    threads = [threading.Thread(target=submit, args=(path,)) for path in paths]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for path in paths:
+        assert futures[path].result(timeout=10) == expected[path]
+    # Seven pages from four requests, in fewer batches than requests
+    assert sum(engine.class_batches) == 7 and len(engine.class_batches) < len(paths)
@@ -0,0 +1,52 @@
+import multiprocessing
+import os
+
+import pytest
+
+import instrument
+
+@pytest.fixture
+def owner(monkeypatch):
+    # Instrumentation switched on in this process, with totals of its own
+    for name in ('PIPELINE_INSTRUMENT', 'PIPELINE_METRICS', 'PIPELINE_PROFILE', 'PIPELINE_INSTRUMENT_OWNER'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(instrument, '_enabled', True)
+    monkeypatch.setattr(instrument, '_format', 'prometheus')
+    monkeypatch.setattr(instrument, '_owner_pid', os.getpid())
+    monkeypatch.setattr(instrument, '_metrics_path', None)
+    monkeypatch.setattr(instrument, '_log', None)
+    monkeypatch.setattr(instrument, '_stages', {})
+    monkeypatch.setattr(instrument, '_counters', {})
+
+def _extract_worker(rows):
+    with instrument.span('extract') as span:
+        span.add(rows=rows, bytes=10)
+    instrument.count('cache_miss', cache='extraction')
+    return rows, instrument.collect()
+
+def test_owner_counts_the_totals_pool_workers_send_back(owner):
+    with instrument.span('extract') as span:
+        span.add(rows=1)
+    with multiprocessing.get_context('fork').Pool(2) as pool:
+        for rows, metrics in pool.imap(_extract_worker, [2, 3, 4]):
+            instrument.merge(metrics)
+    totals = instrument.snapshot()
+    assert {field: totals['stages']['extract'][field] for field in ('calls', 'rows', 'bytes')} == \
+        {'calls': 4, 'rows': 10, 'bytes': 30}
+    assert totals['counters'] == [{'cache': 'extraction', 'name': 'cache_miss', 'value': 3}]
+    assert 'pipeline_stage_calls_total{stage="extract"} 4' in instrument.prometheus_text()
+
+def test_the_owner_keeps_its_own_totals(owner):
+    with instrument.span('parse'):
+        pass
+    assert instrument.collect() is None
+    assert instrument.snapshot()['stages']['parse']['calls'] == 1
+
+def test_configure_exports_the_metrics_path(owner, monkeypatch, tmp_path):
+    monkeypatch.setattr(instrument, '_owner_pid', None)
+    metrics_path = str(tmp_path / 'metrics.prom')
+    instrument.configure(output_format='prometheus', metrics_path=metrics_path)
+    assert os.environ['PIPELINE_METRICS'] == metrics_path
+    assert os.environ['PIPELINE_INSTRUMENT_OWNER'] == str(os.getpid())
+    instrument.configure(output_format='prometheus')
+    assert 'PIPELINE_METRICS' not in os.environ
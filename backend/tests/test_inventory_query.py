@@ -0,0 +1,88 @@
+import pytest
+
+from inventory_query import FIELDS, InventoryIndex, run_query, new_aggregate, add_to_aggregate, _rounded
+from inventory_store import InventoryStore
+
+ROWS = [
+    {'ITEM#': 'BB4043', 'ITEM': 'Titos Vodka', 'PRICE': 20.0, 'ORDERED': 2, 'QTY': 2, 'CATEGORY': 'Spirits',
+     'VENDOR': 'Southern', 'STATUS': 'Delivered', 'date': '03/15/2024'},
+    {'ITEM#': 'BB4043', 'ITEM': 'Titos Vodka', 'PRICE': 22.5, 'ORDERED': 1, 'QTY': 1, 'CATEGORY': 'Spirits',
+     'VENDOR': 'Breakthru', 'STATUS': 'Delivered', 'date': '2024-04-02'},
+    {'ITEM#': 'BB4043', 'ITEM': 'Titos Vodka', 'PRICE': 19.0, 'ORDERED': 3, 'QTY': 3, 'CATEGORY': 'Spirits',
+     'VENDOR': 'Southern', 'STATUS': 'Backordered', 'date': '2024-02-28'},
+    {'ITEM#': 'BL12', 'ITEM': 'Bud Light', 'PRICE': 1.25, 'ORDERED': 24, 'QTY': 24, 'CATEGORY': 'Beer',
+     'VENDOR': 'Southern', 'STATUS': 'Delivered', 'date': '2024-03-31'},
+    {'ITEM#': 'BL12', 'ITEM': 'Bud Light', 'PRICE': 1.5, 'ORDERED': 12, 'CATEGORY': 'Beer',
+     'VENDOR': 'Breakthru', 'STATUS': 'Delivered', 'date': '2024-04-20'},
+    {'ITEM#': 'CS750', 'ITEM': 'Cabernet', 'PRICE': 11.0, 'ORDERED': 6, 'QTY': 6, 'CATEGORY': 'Wine',
+     'VENDOR': 'Southern', 'STATUS': 'Delivered'},
+    {'ITEM': 'Lime wedges', 'PRICE': 2.0, 'QTY': 1, 'date': '2024-03-10'},
+]
+
+@pytest.fixture
+def store(tmp_path):
+    store = InventoryStore(str(tmp_path / 'inventory.sqlite3'))
+    store.append(ROWS, source_file='invoices.txt')
+    yield store
+    store.close()
+
+# Function to total the store's rows the slow way, by scanning every row
+def scan_totals(store, date_from=None, date_to=None, vendor=None, status=None):
+    totals = {}
+    for row in store.find():
+        if (date_from or date_to) and not row['date']:
+            continue
+        if (date_from and row['date'] < date_from) or (date_to and row['date'] > date_to):
+            continue
+        if (vendor and row['vendor'] != vendor) or (status and row['status'] != status):
+            continue
+        aggregate = totals.setdefault(row['category'] or 'Uncategorized', new_aggregate())
+        add_to_aggregate(aggregate, tuple(row[name] for name in FIELDS))
+    return {category: _rounded(aggregate) for category, aggregate in sorted(totals.items())}
+
+@pytest.mark.parametrize('params', [
+    {},
+    {'vendor': 'Southern'},
+    {'status': 'Delivered'},
+    # Whole months come from the cube, other ranges from the dated rows
+    {'date_from': '2024-03-01', 'date_to': '2024-04-30'},
+    {'date_from': '2024-02-01', 'date_to': '2024-03-31'},
+    {'date_from': '2024-03-01', 'date_to': '2024-03-31', 'vendor': 'Southern'},
+    {'date_from': '2024-03-10', 'date_to': '2024-04-02'},
+    {'date_from': '2024-03-16', 'status': 'Delivered'},
+    {'date_to': '2024-03-15'},
+])
+def test_category_totals_match_a_scan_of_the_store(store, params):
+    expected = scan_totals(store, **params)
+    assert run_query(InventoryIndex(store), 'category_totals', params) == expected
+
+def test_month_totals_accept_the_store_date_formats(store):
+    index = InventoryIndex(store)
+    totals = index.category_totals(date_from='03/01/2024', date_to='03/31/2024')
+    assert sorted(totals) == ['Beer', 'Spirits', 'Uncategorized']
+    assert totals['Spirits']['spend'] == 40.0 and totals['Beer']['quantity'] == 24.0
+
+def test_price_history_is_in_date_order(store):
+    index = InventoryIndex(store)
+    history = run_query(index, 'price_history', {'item_number': 'BB4043'})
+    assert [(entry['date'], entry['price']) for entry in history] == [
+        ('2024-02-28', 19.0), ('2024-03-15', 20.0), ('2024-04-02', 22.5)]
+    assert [entry['price'] for entry in index.price_history('BB4043', date_from='2024-03-01',
+                                                            vendor='Southern')] == [20.0]
+    summary = index.item_summary('BB4043')
+    assert (summary['min_price'], summary['max_price'], summary['last_price']) == (19.0, 22.5, 22.5)
+
+def test_index_is_rebuilt_only_after_a_write(store):
+    index = InventoryIndex(store)
+    assert not index.refresh()
+    assert index.category_totals()['Wine']['rows'] == 1
+
+    store.append([{'ITEM#': 'CS750', 'PRICE': 12.0, 'ORDERED': 1, 'CATEGORY': 'Wine', 'date': '2024-05-01'}])
+    assert index.category_totals()['Wine']['rows'] == 2
+    assert index.stats()['generation'] == store.generation()
+    assert index.item_summary('CS750')['last_price'] == 12.0
+    assert not index.refresh()
+
+def test_unknown_queries_are_refused(store):
+    with pytest.raises(ValueError, match='Unknown query'):
+        run_query(InventoryIndex(store), 'drop_table')
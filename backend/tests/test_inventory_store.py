@@ -0,0 +1,57 @@
+import json
+
+from inventory_store import InventoryStore
+
+ROWS = [
+    {'ITEM#': 'BB4043', 'PRICE': 10.0, 'date': '2024-03-01'},
+    {'ITEM#': 'BB4043', 'PRICE': 12.0, 'date': '2024-04-01'},
+    {'ITEM#': 'X1', 'PRICE': 1.0},
+]
+
+def open_store(tmp_path):
+    return InventoryStore(str(tmp_path / 'inventory.sqlite3'))
+
+def test_every_parsed_line_is_kept(tmp_path):
+    store = open_store(tmp_path)
+    assert store.replace_all(ROWS) == 3
+    assert store.count() == 3
+    assert sorted(row['price'] for row in store.find(item_number='BB4043')) == [10.0, 12.0]
+    store.close()
+
+def test_replace_source_files_only_replaces_that_file(tmp_path):
+    store = open_store(tmp_path)
+    store.append(ROWS, source_file='march.txt')
+    store.append(ROWS[:1], source_file='april.txt')
+    assert store.replace_source_files(['march.txt'], [dict(row, source_file='march.txt') for row in ROWS[:2]]) == 2
+    assert store.count() == 3
+    assert {row['source_file'] for row in store.find(item_number='BB4043')} == {'march.txt', 'april.txt'}
+    store.close()
+
+def test_saving_the_grid_updates_rows_in_place(tmp_path):
+    store = open_store(tmp_path)
+    store.append(ROWS[:1] + [{'ITEM NAME': 'Lime wedges', 'PRICE': 2.0}], source_file='march.txt')
+    stored = store.find()
+    # PUT /inventory sends back every row GET returned, as JSON, after an edit
+    for price in (11.0, 13.0):
+        rows = json.loads(json.dumps(store.find()))
+        rows[0]['price'] = price
+        assert store.update_rows(rows) == 2
+    rows = store.find()
+    assert [row['id'] for row in rows] == [row['id'] for row in stored]
+    assert [row['price'] for row in rows] == [13.0, 2.0]
+    assert rows[1]['brand'] == 'Lime wedges' and rows[1]['source_file'] == 'march.txt'
+    assert store.extra_fields() == []
+    store.close()
+
+def test_update_rows_adds_rows_without_an_id(tmp_path):
+    store = open_store(tmp_path)
+    store.append(ROWS[:1])
+    assert store.update_rows([{'ITEM#': 'N1', 'PRICE': 4.0}, {'id': 999, 'ITEM#': 'GONE'}]) == 1
+    assert [row['item_number'] for row in store.find()] == ['BB4043', 'N1']
+    store.close()
+
+def test_find_applies_offset_without_limit(tmp_path):
+    store = open_store(tmp_path)
+    store.append(ROWS)
+    assert [row['price'] for row in store.find(offset=1)] == [12.0, 1.0]
+    store.close()
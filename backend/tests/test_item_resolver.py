@@ -0,0 +1,21 @@
+from item_resolver import ItemIndex, normalize_name
+
+SIZES = ('50ml', '375ml', '750ml', '1L', '1.75L')
+
+def build_index():
+    items = [('M1', 'Citrus Twist Mixer', '1L')]
+    items += [('S%d' % normalize_name('', size)[1], 'Smirnoff Vodka', size) for size in SIZES]
+    items += [('B%d' % number, 'Brand%d Vodka' % number, '750ml') for number in range(100)]
+    return ItemIndex(items)
+
+def test_rare_token_does_not_hide_the_real_match():
+    index = build_index()
+    ranked = index.match(*normalize_name('smirnoff citrus vodka', '750ml'))
+    assert ranked[0][0] == 'S750'
+    assert {'S50', 'S375', 'S1000', 'S1750'} <= {item_id for item_id, score in ranked}
+
+def test_candidates_keep_every_item_of_a_small_match():
+    index = build_index()
+    weights = index._query_weights(normalize_name('smirnoff citrus vodka')[0])
+    ids = {index.item_ids[position] for position in index.candidates(weights)}
+    assert {'M1', 'S50', 'S375', 'S750', 'S1000', 'S1750'} <= ids
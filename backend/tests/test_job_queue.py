@@ -0,0 +1,67 @@
+import pytest
+
+import job_queue
+from job_queue import JobQueue, QueueFull
+from extract_service import request_extractor
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / 'queue.sqlite3'), max_queued=3)
+    yield queue
+    queue.close()
+
+@pytest.fixture
+def uploads(tmp_path):
+    # Upload names carry no extension, like multer's
+    def save(name, content):
+        path = tmp_path / name
+        path.write_text(content)
+        return str(path)
+    return save
+
+def test_the_same_content_is_one_job(queue, uploads):
+    job, duplicate = queue.submit(uploads('a', 'invoice 1'), 'txt')
+    again, duplicate_again = queue.submit(uploads('b', 'invoice 1'), 'txt')
+    assert (duplicate, duplicate_again) == (False, True)
+    assert again['id'] == job['id'] and again['submitted'] == 2
+    queue.complete(queue.claim()['id'], {'text': 'invoice 1', 'rows': []})
+    done, duplicate = queue.submit(uploads('c', 'invoice 1'), 'txt')
+    assert duplicate and done['status'] == 'done' and done['result']['text'] == 'invoice 1'
+
+def test_interactive_uploads_run_before_bulk_imports(queue, uploads):
+    bulk = queue.submit(uploads('a', 'march'), 'txt', 'bulk')[0]
+    interactive = queue.submit(uploads('b', 'april'), 'txt')[0]
+    moved_up = queue.submit(uploads('c', 'march'), 'txt', 'interactive')[0]
+    assert moved_up['id'] == bulk['id']
+    assert [queue.claim()['id'], queue.claim()['id']] == [bulk['id'], interactive['id']]
+    assert queue.claim() is None
+
+def test_failed_jobs_are_retried_until_out_of_attempts(queue, uploads, monkeypatch):
+    monkeypatch.setattr(job_queue, 'RETRY_DELAY', 0)
+    job = queue.submit(uploads('a', 'scan'), 'txt', max_attempts=2)[0]
+    assert queue.fail(queue.claim()['id'], 'OSError: busy')['status'] == 'queued'
+    failed = queue.fail(queue.claim()['id'], 'OSError: busy')
+    assert failed['status'] == 'failed' and failed['attempts'] == 2
+    assert queue.retry(job['id']) and queue.claim()['id'] == job['id']
+
+def test_a_full_queue_refuses_new_jobs(queue, uploads):
+    for content in ('1', '2', '3'):
+        queue.submit(uploads(content, content), 'txt')
+    with pytest.raises(QueueFull):
+        queue.submit(uploads('4', '4'), 'txt')
+    # A duplicate adds no work and is still answered
+    assert queue.submit(uploads('5', '1'), 'txt')[1]
+
+def test_unknown_extractors_are_refused_before_queueing(queue, uploads, tmp_path):
+    with pytest.raises(ValueError, match='Unknown extractor'):
+        queue.submit(uploads('a', 'scan'), 'scanner')
+    with pytest.raises(ValueError, match='Unsupported file type'):
+        queue.submit(uploads('b', 'scan'))
+    with pytest.raises(ValueError, match='Unknown extractor'):
+        queue.submit_folder(str(tmp_path), 'scanner')
+    assert queue.stats()['queued'] == 0
+
+def test_the_extractor_follows_the_uploaded_file_name():
+    assert request_extractor({'name': 'Invoice 1.31.23.PDF'}) == 'pdf'
+    assert request_extractor({'name': 'scan.png', 'extractor': 'pdf'}) == 'pdf'
+    assert request_extractor({'name': 'notes'}) is None
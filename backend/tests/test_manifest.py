@@ -0,0 +1,76 @@
+import os
+
+import App
+import manifest
+from inventory_store import InventoryStore
+from manifest import load_manifest, save_manifest, scan_folder
+
+def write(folder, rel_path, text):
+    path = folder / rel_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return path
+
+def test_scan_sorts_files_into_new_changed_unchanged_and_deleted(tmp_path):
+    folder = tmp_path / 'invoices'
+    for rel_path in ('march/a.txt', 'march/b.txt', 'c.txt', 'gone.txt'):
+        write(folder, rel_path, rel_path)
+    first = scan_folder(str(folder), {})
+    assert first['new'] == ['c.txt', 'gone.txt', 'march/a.txt', 'march/b.txt']
+    save_manifest(first['entries'], str(tmp_path / 'manifest.json'))
+
+    os.remove(folder / 'gone.txt')
+    write(folder, 'march/b.txt', 'an edited invoice')
+    touched = write(folder, 'c.txt', 'c.txt')
+    os.utime(touched, (1, 1))
+    write(folder, 'april/d.txt', 'd')
+    changes = scan_folder(str(folder), load_manifest(str(tmp_path / 'manifest.json')))
+    assert changes['new'] == ['april/d.txt']
+    assert changes['changed'] == ['march/b.txt']
+    # c.txt was only touched: same content, so it is not processed again
+    assert changes['unchanged'] == ['c.txt', 'march/a.txt']
+    assert changes['deleted'] == ['gone.txt']
+    assert changes['entries']['c.txt']['mtime'] == 1
+
+def refuse_to_hash(path):
+    raise AssertionError(f"{path} was hashed again")
+
+def test_files_with_the_same_mtime_and_size_are_not_read(tmp_path, monkeypatch):
+    folder = tmp_path / 'invoices'
+    write(folder, 'a.txt', 'a')
+    entries = scan_folder(str(folder), {})['entries']
+    monkeypatch.setattr(manifest, 'hash_file', refuse_to_hash)
+    assert scan_folder(str(folder), entries)['unchanged'] == ['a.txt']
+
+def test_a_corrupt_manifest_reprocesses_everything(tmp_path):
+    path = tmp_path / 'manifest.json'
+    path.write_text('{"a.txt": ')
+    assert load_manifest(str(path)) == {}
+
+def test_incremental_run_only_replaces_rows_of_changed_files(tmp_path):
+    folder = tmp_path / 'invoices'
+    write(folder, 'a.txt', 'BRAND PRICE\nTitos\n10\n')
+    write(folder, 'b.txt', 'BRAND PRICE\nSmirnoff\n12\n')
+    store = InventoryStore(str(tmp_path / 'inventory.sqlite3'))
+    manifest_path = str(tmp_path / 'manifest.json')
+    output = tmp_path / 'extracted.txt'
+
+    App.process_files_incremental(str(folder), str(output), store, manifest_path)
+    assert sorted((row['source_file'], row['brand']) for row in store.find()) == \
+        [('a.txt', 'Titos'), ('b.txt', 'Smirnoff')]
+
+    os.remove(folder / 'a.txt')
+    write(folder, 'b.txt', 'BRAND PRICE\nSmirnoff Red\n13\n')
+    write(folder, 'c.txt', 'BRAND PRICE\nBacardi\n9\n')
+    rows, changes = App.process_files_incremental(str(folder), str(output), store, manifest_path)
+    assert (changes['new'], changes['changed'], changes['deleted']) == (['c.txt'], ['b.txt'], ['a.txt'])
+    assert sorted((row['source_file'], row['brand']) for row in rows) == \
+        [('b.txt', 'Smirnoff Red'), ('c.txt', 'Bacardi')]
+    # Only the processed files' text is written out
+    assert 'Titos' not in output.read_text() and 'Bacardi' in output.read_text()
+    assert sorted(load_manifest(manifest_path)) == ['b.txt', 'c.txt']
+
+    # Nothing changed: nothing is extracted and the rows stay as they are
+    rows, changes = App.process_files_incremental(str(folder), str(output), store, manifest_path)
+    assert changes['unchanged'] == ['b.txt', 'c.txt'] and len(rows) == 2
+    store.close()
@@ -0,0 +1,66 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip('torch')
+
+import AiTemplateBuild
+import model_export
+
+CONFIG = SimpleNamespace(n_features=6, output_size=5)
+
+# Stand-in for the trained GPT with the same call signature:
+# model(features, [category features]) -> (logits (rows, positions, classes), loss)
+class TinyTabularModel(torch.nn.Module):
+    def __init__(self, config):
+        super().__init__()
+        self.features = torch.nn.Linear(config.n_features, 16)
+        self.categories = torch.nn.ModuleList(
+            torch.nn.Embedding(size, 16) for size in AiTemplateBuild.CATEGORY_FEATURE_SIZES)
+        self.head = torch.nn.Linear(16, config.output_size)
+
+    def forward(self, features, category_features):
+        hidden = self.features(features)
+        for embedding, values in zip(self.categories, category_features):
+            hidden = hidden + embedding(values)
+        return self.head(torch.relu(hidden)).unsqueeze(1), None
+
+@pytest.fixture
+def model_path(tmp_path, monkeypatch):
+    torch.manual_seed(0)
+    model = TinyTabularModel(CONFIG).eval()
+    path = tmp_path / 'category_model_state.pt'
+    torch.save(model.state_dict(), path)
+    monkeypatch.setattr(AiTemplateBuild, 'load_tabular_model', lambda model_path: (model, CONFIG))
+    return str(path)
+
+def test_torchscript_artefact_predicts_like_the_eager_model(model_path, tmp_path):
+    artefacts = model_export.export_model(model_path, str(tmp_path / 'models'), formats=('torchscript',))
+    with open(artefacts['torchscript'] + '.json') as file:
+        assert json.load(file) == {'format': 'torchscript', 'n_features': 6, 'output_size': 5,
+                                   'category_sizes': list(AiTemplateBuild.CATEGORY_FEATURE_SIZES)}
+    features, category_features = model_export.example_inputs(6, batch_size=300, seed=1)
+    eager = model_export.load_eager_predictor(model_path).predict(features, category_features)
+    served = model_export.load_predictor(artefacts['torchscript']).predict(features, category_features)
+    assert served == eager and len(served) == 300
+
+def test_int8_artefact_mostly_agrees_with_the_eager_model(model_path, tmp_path):
+    artefacts = model_export.export_model(model_path, str(tmp_path / 'models'), formats=('int8',))
+    eager, int8 = model_export.compare_models(model_path, [artefacts['int8']], rows=500, batch_size=64)
+    assert eager['agreement'] == 1.0
+    assert int8['model'] == 'category_model.int8.pt' and int8['agreement'] >= 0.9
+
+def test_rows_are_classified_the_same_in_any_batch_size(model_path):
+    features, category_features = model_export.example_inputs(6, batch_size=50, seed=2)
+    whole = model_export.load_eager_predictor(model_path, batch_size=256)
+    pieces = model_export.load_eager_predictor(model_path, batch_size=7)
+    assert pieces.predict(features, category_features) == whole.predict(features, category_features)
+
+def test_onnx_artefact_predicts_like_the_eager_model(model_path, tmp_path):
+    pytest.importorskip('onnx')
+    pytest.importorskip('onnxruntime')
+    artefacts = model_export.export_model(model_path, str(tmp_path / 'models'), formats=('onnx',))
+    features, category_features = model_export.example_inputs(6, batch_size=100, seed=3)
+    eager = model_export.load_eager_predictor(model_path).predict(features, category_features)
+    assert model_export.load_predictor(artefacts['onnx']).predict(features, category_features) == eager
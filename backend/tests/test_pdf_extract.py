@@ -0,0 +1,47 @@
+import pytest
+
+pytest.importorskip('pdfminer')
+
+import pdf_extract
+from benchmark import write_text_pdf
+from extraction_cache import ExtractionCache
+
+PAGES = [[f'INVOICE {page}', f'Titos Vodka {page} 750ml', f'Bud Light {page + 10} can'] for page in range(7)]
+
+def write_pdf(tmp_path, pages=PAGES, name='invoice.pdf'):
+    path = tmp_path / name
+    write_text_pdf(str(path), pages)
+    return str(path)
+
+def test_page_ranges_are_one_based_and_clipped():
+    assert pdf_extract.parse_page_range('1-3,5,7-', 8) == [0, 1, 2, 4, 6, 7]
+    assert pdf_extract.parse_page_range('-2, 6-40', 7) == [0, 1, 5, 6]
+    assert pdf_extract.parse_page_range(None, 3) == [0, 1, 2]
+    with pytest.raises(ValueError):
+        pdf_extract.parse_page_range('4-2', 8)
+
+def test_pool_keeps_the_text_of_a_whole_document_read(tmp_path, monkeypatch):
+    from pdfminer.high_level import extract_text
+    path = write_pdf(tmp_path)
+    # Groups of two pages, so the pages come back from several workers
+    monkeypatch.setattr(pdf_extract, 'PAGES_PER_JOB', 2)
+    pages = list(pdf_extract.iter_pdf_pages(path, workers=3, use_ocr=False))
+    assert len(pages) == 7 and 'Titos Vodka 3 750ml' in pages[3]
+    assert ''.join(pages) == extract_text(path)
+    assert pdf_extract.extract_pdf_text(path, pages='2,4', use_ocr=False) == pages[1] + pages[3]
+
+def test_only_changed_pages_are_extracted_again(tmp_path):
+    cache = ExtractionCache(str(tmp_path / 'cache'))
+    text = pdf_extract.extract_pdf_text(write_pdf(tmp_path), cache=cache, use_ocr=False)
+    again = pdf_extract.PageStats()
+    assert ''.join(pdf_extract.iter_pdf_pages(write_pdf(tmp_path), cache=cache, use_ocr=False, stats=again)) == text
+    assert again.as_dict() == {'pages': 7, 'cached': 7, 'text': 0, 'ocr': 0, 'empty': 0}
+
+    edited = [list(lines) for lines in PAGES]
+    edited[5][1] = 'Titos Vodka 99 750ml'
+    stats = pdf_extract.PageStats()
+    edited_text = ''.join(pdf_extract.iter_pdf_pages(write_pdf(tmp_path, edited, 'edited.pdf'), cache=cache,
+                                                     use_ocr=False, stats=stats))
+    assert (stats.cached, stats.text) == (6, 1)
+    assert edited_text == text.replace('Titos Vodka 5 750ml', 'Titos Vodka 99 750ml')
+    cache.close()
@@ -0,0 +1,46 @@
+import os
+import sys
+
+# output/prepdata.py lives outside the backend folder
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'output'))
+
+import prepdata
+from benchmark import parse_data_readlines
+
+def write(tmp_path, text, name='extracted.txt'):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+def test_file_without_items_gives_an_empty_frame(tmp_path):
+    df = prepdata.parse_data(write(tmp_path, 'DOMESTIC BEER\n\nsubtotal\n'))
+    assert df.empty
+    assert list(df.columns) == prepdata.COLUMNS + ['Section']
+
+def test_items_take_the_header_above_them(tmp_path):
+    df = prepdata.parse_data(write(tmp_path, 'Bud Light 12 can\nIMPORT BEER\n  Corona Extra 24\n'))
+    assert df['Section'].tolist() == ['Miscellaneous', 'IMPORT BEER']
+    assert df['Product Name'].tolist() == ['Bud Light', 'Corona Extra']
+    assert df['Quantity'].tolist() == [12, 24]
+    assert df['Size'].isna().tolist() == [False, True]
+
+def test_blocks_match_the_original_parser(tmp_path, monkeypatch):
+    text = 'DOMESTIC BEER\nBud Light 12 CAN\n\tMiller 6 pack 24\nTOTAL 36\nIMPORT BEER\nCorona 1 2\nnot an item\n'
+    path = write(tmp_path, text)
+    # Blocks of a line or two, so headers carry over from one block to the next
+    monkeypatch.setattr(prepdata, 'BLOCK_SIZE', 16)
+    df = prepdata.parse_data(path)
+    original = parse_data_readlines(path)
+    assert df['Section'].tolist() == original['Category'].tolist()
+    assert df['Product Name'].tolist() == original['Product Name'].tolist()
+    assert df['Quantity'].tolist() == original['Quantity'].tolist()
+    assert df['Size'].fillna('').tolist() == original['Size'].fillna('').tolist()
+
+def test_quantity_is_the_last_run_of_digits(tmp_path):
+    text = 'Titos80 12\nCorona 1 2\n  750ml 6 btl  \nDOMESTIC BEER\n12\nRum 5ml\nGin 1.75 ltr\n'
+    path = write(tmp_path, text)
+    df = prepdata.parse_data(path)
+    original = parse_data_readlines(path)
+    assert df['Product Name'].tolist() == original['Product Name'].tolist() == \
+        ['Titos80', 'Corona 1', '750ml', '', 'Rum', 'Gin 1.']
+    assert df['Quantity'].tolist() == original['Quantity'].tolist() == [12, 2, 6, 12, 5, 75]
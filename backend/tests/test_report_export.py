@@ -0,0 +1,66 @@
+import csv
+import json
+import os
+
+import openpyxl
+import pytest
+
+import report_export
+
+COLUMNS = ['item_number', 'brand', 'price', 'category']
+
+def make_rows(count, categories):
+    return [[f'N{number}', f'Brand <{number}> & co', number + 0.5, f'Cat {number % categories}']
+            for number in range(count)]
+
+def sheet_values(sheet):
+    return [list(row) for row in sheet.iter_rows(values_only=True)]
+
+def test_many_category_sheets_round_trip(tmp_path, monkeypatch):
+    # A buffer of a few rows, so sheets are appended to many times
+    monkeypatch.setattr(report_export, 'SHEET_BUFFER_SIZE', 2000)
+    rows = make_rows(3000, 300)
+    paths = report_export.export_rows(iter(rows), str(tmp_path / 'report'), COLUMNS, report_export.FORMATS)
+
+    workbook = openpyxl.load_workbook(paths['xlsx'], read_only=True)
+    assert len(workbook.sheetnames) == 301
+    assert sheet_values(workbook[report_export.ALL_ROWS_SHEET]) == [COLUMNS] + rows
+    assert sheet_values(workbook['Cat 7']) == [COLUMNS] + [row for row in rows if row[3] == 'Cat 7']
+    workbook.close()
+
+    with open(paths['csv'], newline='') as file:
+        assert list(csv.reader(file))[1:] == [[str(value) for value in row] for row in rows]
+    with open(paths['json']) as file:
+        assert json.load(file) == [dict(zip(COLUMNS, row)) for row in rows]
+
+def test_full_sheet_continues_on_a_new_sheet(tmp_path, monkeypatch):
+    monkeypatch.setattr(report_export, 'MAX_SHEET_ROWS', 4)
+    rows = make_rows(7, 1)
+    path = report_export.export_rows(rows, str(tmp_path / 'report.xlsx'), COLUMNS, category_sheets=False)['xlsx']
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    assert workbook.sheetnames == ['Inventory', 'Inventory (2)', 'Inventory (3)']
+    assert sum(len(sheet_values(sheet)) - 1 for sheet in workbook.worksheets) == 7
+    workbook.close()
+
+def test_failed_export_leaves_no_files(tmp_path):
+    def rows():
+        yield ['N1', 'Vodka', 1.0, 'Liquor']
+        raise RuntimeError('source failed')
+    with pytest.raises(RuntimeError):
+        report_export.export_rows(rows(), str(tmp_path / 'report'), COLUMNS, report_export.FORMATS)
+    assert os.listdir(tmp_path) == []
+
+def test_sheet_titles_are_valid_and_unique():
+    used = set()
+    assert report_export.sheet_title('Beer/Wine: [Imports]', used) == 'Beer_Wine_ _Imports_'
+    assert report_export.sheet_title('beer_wine_ _imports_', used) == 'beer_wine_ _imports_ (2)'
+    assert len(report_export.sheet_title('x' * 40, used)) == report_export.MAX_SHEET_TITLE
+
+@pytest.mark.skipif(not os.path.isdir('/proc/self/fd'), reason="needs /proc to count open files")
+def test_open_files_do_not_grow_with_sheets(tmp_path):
+    writer = report_export.XlsxStreamWriter(str(tmp_path / 'report.xlsx'))
+    open_before = len(os.listdir('/proc/self/fd'))
+    for number in range(500):
+        writer.write_row(writer.add_sheet(f'Cat {number}', COLUMNS), ['N1', 'Vodka', 1.0, f'Cat {number}'])
+    assert len(os.listdir('/proc/self/fd')) <= open_before
+    writer.close()
@@ -0,0 +1,70 @@
+import pandas as pd
+
+import cleanup
+from rollups import Rollups, contributions_from_frame
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=['Category', 'Vendor', 'Date', 'Quantity', 'Ordered', 'Ext Value'])
+
+MARCH = frame([
+    ['Spirits', 'Southern', '2024-03-02', 2, 1, 40.0],
+    ['Beer', 'Southern', '2024-03-09', 24, 2, 30.5],
+    ['Spirits', None, 'not a date', 1, 1, 22.0],
+])
+APRIL = frame([
+    ['Wine', 'Breakthru', '2024-04-01', 6, 1, 60.0],
+    ['Beer', 'Breakthru', '2024-04-03', 12, 1, 15.25],
+])
+
+def test_totals_follow_a_full_regroup(tmp_path):
+    rollups = Rollups(str(tmp_path / 'rollups.json'))
+    rollups.apply('march', contributions_from_frame(MARCH), 'h1')
+    rollups.apply('april', contributions_from_frame(APRIL), 'h2')
+    expected = cleanup.group_by_category(pd.concat([MARCH, APRIL]))
+    pd.testing.assert_frame_equal(rollups.report(), expected, check_dtype=False)
+    assert rollups.report('vendor')['Vendor'].tolist() == ['Breakthru', 'Southern', 'Unknown']
+    assert rollups.report('month')['Month'].tolist() == ['2024-03', '2024-04', 'Unknown']
+
+def test_reapplying_a_source_replaces_its_old_contribution(tmp_path):
+    rollups = Rollups(str(tmp_path / 'rollups.json'))
+    rollups.apply('march', contributions_from_frame(MARCH), 'h1')
+    rollups.apply('april', contributions_from_frame(APRIL), 'h2')
+    corrected = MARCH.iloc[:2].copy()
+    corrected.loc[1, 'Ext Value'] = 31.1
+    # Only the groups of the old and new March rows are touched
+    assert rollups.apply('march', contributions_from_frame(corrected), 'h3') == 6
+
+    expected = cleanup.group_by_category(pd.concat([corrected, APRIL]))
+    pd.testing.assert_frame_equal(rollups.report(), expected, check_dtype=False)
+    assert 'Unknown' not in rollups.totals['vendor'] and rollups.is_current('march', 'h3')
+
+def test_retracting_the_last_source_of_a_group_drops_it(tmp_path):
+    path = str(tmp_path / 'rollups.json')
+    rollups = Rollups(path)
+    rollups.apply('march', contributions_from_frame(MARCH), 'h1')
+    rollups.apply('april', contributions_from_frame(APRIL), 'h2')
+    assert rollups.retract('april') and not rollups.retract('april')
+    rollups.save()
+
+    reloaded = Rollups(path)
+    assert reloaded.report()['Category'].tolist() == ['Beer', 'Spirits']
+    assert sorted(reloaded.totals['vendor']) == ['Southern', 'Unknown']
+    pd.testing.assert_frame_equal(reloaded.report(), cleanup.group_by_category(MARCH), check_dtype=False)
+
+def refuse_to_parse(*args):
+    raise AssertionError("an unchanged file was parsed again")
+
+def test_unchanged_files_are_not_parsed_again(tmp_path, monkeypatch):
+    header = ['Index', 'Brand', 'Bin', 'Size', 'Unit', 'Location', 'Stock', 'Price', 'Date', 'Status',
+              'Category', 'Quantity', 'Ext Value']
+    rows = [[1, 'Titos Vodka', 'A1', '750ml', 'ml', 'Bar', 6, 20.5, '2024-03-01', 'ok', 'Spirits', 2, 41.0],
+            [2, 'Bud Light', 'B1', '12oz', 'oz', 'Bar', 24, 1.5, '2024-03-01', 'ok', 'Beer', 24, 36.0]]
+    export = tmp_path / 'export.txt'
+    export.write_text('\n'.join('\t'.join(map(str, row)) for row in [header] + rows) + '\n')
+    rollups = Rollups(str(tmp_path / 'rollups.json'))
+    assert cleanup.update_rollups(str(export), rollups, str(tmp_path / 'out'))
+
+    monkeypatch.setattr(cleanup, 'parse_data', refuse_to_parse)
+    assert not cleanup.update_rollups(str(export), Rollups(str(tmp_path / 'rollups.json')), str(tmp_path / 'out'))
+    grouped = pd.read_csv(tmp_path / 'out' / '1grouped_data.csv', index_col=0)
+    assert grouped['Ext Value'].tolist() == [36.0, 41.0]
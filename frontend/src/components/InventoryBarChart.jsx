@@ -5,9 +5,10 @@ import { Chart as ChartJS, CategoryScale, LinearScale, BarElement, Title, Toolti
 ChartJS.register(CategoryScale, LinearScale, BarElement, Title, Tooltip, Legend);
 
 function InventoryBarChart({ data }) {
-  const labels = data.map(item => item['ITEM NAME']);
-  const quantities = data.map(item => item.ORDERED);
-  const prices = data.map(item => item.PRICE);
+  // Inventory rows use the store's column names; rows added after an upload name the item itemName
+  const labels = data.map(item => item.brand || item.itemName);
+  const quantities = data.map(item => item.ordered);
+  const prices = data.map(item => item.price);
 
   const chartData = {
     labels: labels,
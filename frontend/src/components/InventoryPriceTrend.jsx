@@ -28,11 +28,11 @@ const InventoryPriceTrend = () => {
   }, [inventoryData]);
 
   const chartData = {
-    labels: inventoryData.map(item => item['ITEM NAME']),
+    labels: inventoryData.map(item => item.brand),
     datasets: [
       {
         label: 'Item Price Trend',
-        data: inventoryData.map(item => item.PRICE),
+        data: inventoryData.map(item => item.price),
         fill: false,
         backgroundColor: 'rgba(75,192,192,0.4)',
         borderColor: 'rgba(75,192,192,1)',
@@ -1,55 +1,118 @@
+import os
+import sys
+import argparse
 import pandas as pd
 import re
 
-def parse_data(file_path):
-    # Read the file content
-    with open(file_path, 'r') as file:
-        lines = file.readlines()
-    
-    # Initialize lists to store parsed data
-    current_category = None
-    data = []
-
-    # Step 1: Iterate through the lines to parse data
-    for line in lines:
-        line = line.strip()
-        
-        # Skip empty lines
-        if not line:
-            continue
-        
-        # Step 2: Identify category headers
-        if line.isupper() and 'TOTAL' not in line:
-            # This is a category header (e.g., "DOMESTIC BEER", "IMPORT BEER")
-            current_category = line
-            continue
-
-        # Step 3: Parse item lines (non-empty, non-header lines)
-        match = re.match(r'^(.*?)(\d+)\s*(oz|ml|ltr|gal|can|btl)?$', line, re.IGNORECASE)
-        if match:
-            product_name = match.group(1).strip()
-            quantity = match.group(2).strip()
-            size = match.group(3) if match.group(3) else 'unknown'
-
-            # Add parsed data to the list
-            data.append({
-                'Category': current_category,
-                'Product Name': product_name,
-                'Quantity': int(quantity),
-                'Size': size
-            })
-    
-    # Step 4: Convert the list of dictionaries into a DataFrame
-    df = pd.DataFrame(data)
-
-    # Step 5: Clean the DataFrame by filling missing values or adjusting the format
-    df['Category'] = df['Category'].fillna('Miscellaneous')
-    df['Size'] = df['Size'].str.lower().replace('unknown', pd.NA)
+# Adding the backend folder so the shared categoriser can be imported
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from categorizer import load_categorizer
+
+# Item lines: product name, quantity and an optional size unit. The pattern
+# runs over every line of a block of text at once, so the spaces around each
+# part are left out of the groups (as strip() did per line). The quantity is
+# the last run of digits on the line; the name is matched greedily and backs
+# off from the end of the line, which finds the same split as the original
+# lazy (.*?) without retrying the rest of the pattern at every character.
+ITEM_PATTERN = re.compile(r'^[^\S\n]*(.*\S|)[^\S\n]*(?<!\d)(\d+)[^\S\n]*(oz|ml|ltr|gal|can|btl)?[^\S\n]*$',
+                          re.IGNORECASE | re.MULTILINE)
+
+# Lines that may be category headers: no a-z letter and at least one other
+# letter. Each one is confirmed with isupper(), the rule for headers.
+HEADER_CANDIDATE_PATTERN = re.compile(r'^[^a-z\n]*[^\W\d_a-z][^a-z\n]*$', re.MULTILINE)
+
+# Columns produced by the parser
+COLUMNS = ['Category', 'Product Name', 'Quantity', 'Size', 'Source File']
+
+# Text read from a file at a time by iter_item_columns
+BLOCK_SIZE = 1 << 20
+
+# Function to check whether a line is a category header (e.g. "DOMESTIC BEER", "IMPORT BEER")
+def is_header(line):
+    return line.isupper() and 'TOTAL' not in line
+
+# Generator over the items of one or more files in column-oriented blocks:
+# one list per column of COLUMNS for about every BLOCK_SIZE characters of text.
+# Files are read a block of lines at a time, never loaded whole. The current
+# category header is tracked as state and reset for every file. Size is ''
+# for lines without a unit.
+def iter_item_columns(file_paths):
+    for file_path in file_paths:
+        current_category = None
+        with open(file_path, 'r') as file:
+            while True:
+                lines = file.readlines(BLOCK_SIZE)
+                if not lines:
+                    break
+                text = ''.join(lines)
+                categories, names, quantities, sizes = [], [], [], []
+
+                # Function to add the items between two positions of the block
+                def add_items(start, end, category):
+                    items = ITEM_PATTERN.findall(text, start, end)
+                    if items:
+                        block_names, block_quantities, block_sizes = zip(*items)
+                        categories.extend([category] * len(items))
+                        names.extend(block_names)
+                        quantities.extend(map(int, block_quantities))
+                        sizes.extend(block_sizes)
+
+                # The item lines between two headers all take the first header
+                start = 0
+                for candidate in HEADER_CANDIDATE_PATTERN.finditer(text):
+                    line = candidate.group().strip()
+                    if is_header(line):
+                        add_items(start, candidate.start(), current_category)
+                        current_category = line
+                        start = candidate.end()
+                add_items(start, len(text), current_category)
+                yield categories, names, quantities, sizes, [file_path] * len(names)
+
+# Generator over the item rows of one or more files as
+# (category, product name, quantity, size, source file) tuples
+def iter_items(file_paths):
+    for columns in iter_item_columns(file_paths):
+        for category, product_name, quantity, size, file_path in zip(*columns):
+            yield category, product_name, quantity, size or 'unknown', file_path
+
+def parse_data(file_paths):
+    if isinstance(file_paths, (str, os.PathLike)):
+        file_paths = [file_paths]
+
+    # Collect the blocks into one list per column
+    columns = {name: [] for name in COLUMNS}
+    for block in iter_item_columns(file_paths):
+        for name, values in zip(COLUMNS, block):
+            columns[name].extend(values)
+
+    # Convert the columns into a DataFrame
+    df = pd.DataFrame(columns)
+    if df.empty:
+        # No item lines: nothing to categorise, and the empty columns are not strings
+        df['Section'] = df['Category']
+        return df
+
+    # Clean the DataFrame by filling missing values or adjusting the format
+    # The header line is kept as 'Section'; 'Category' comes from the shared
+    # categorisation rules applied to the section and product name together
+    df['Section'] = df['Category'].fillna('Miscellaneous')
+    df['Category'] = load_categorizer().categorize_series(df['Section'] + ' ' + df['Product Name'])
+    df['Size'] = df['Size'].str.lower().replace('', pd.NA)
 
     return df
 
-# Specify the file path
-file_path = "F:/repogit/XseLLer8/output/extracted.txt"
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parse extracted invoice text into categorised items")
+    parser.add_argument('files', nargs='*',
+                        default=[os.path.join(os.path.dirname(os.path.abspath(__file__)), 'extracted.txt')],
+                        help="extracted text files (default: output/extracted.txt)")
+    parser.add_argument('-o', '--output', default=None, help="write the parsed items to this CSV file")
+    args = parser.parse_args()
 
-# Call the function to parse data
-df = parse_data(file_path)
+    # Call the function to parse data
+    df = parse_data(args.files)
+    print(df.head())
+    if args.output:
+        df.to_csv(args.output, index=False)
+        print(f"Parsed items saved to {args.output}")